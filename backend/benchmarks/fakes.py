@@ -0,0 +1,410 @@
+"""
+Benchmark Fakes - Offline stand-ins for Gmail, Calendar and Gemini.
+
+FakeGmail and FakeCalendar answer the googleapiclient calls the tools
+make (list, get, batch, history, calendarList) from generated data, after
+a configurable delay per request. FakeChatModel is a scripted chat model:
+for a user message it emits the tool calls the request implies, and once
+tool results are in it writes a fixed-length answer.
+
+install_fakes() patches them into the server's import path so the real
+server, agent, router, caches and tools run unchanged.
+"""
+
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from googleapiclient.errors import HttpError
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+SENDERS = ["alice@example.com", "bob@example.com", "team@example.com", "billing@example.com",
+           "noreply@github.com", "manager@example.com", "newsletter@example.org"]
+SUBJECTS = ["Quarterly planning", "Invoice overdue", "Re: design review", "Lunch on Friday?",
+            "Build failed on main", "Offsite agenda", "Weekly digest", "Contract renewal"]
+MEETINGS = ["Standup", "1:1", "Design review", "Customer call", "Planning", "Interview",
+            "Lunch", "Focus time", "All hands", "Retro"]
+
+
+class _Response(dict):
+    """Minimal httplib2-style response for HttpError."""
+
+    def __init__(self, status: int):
+        super().__init__(status=str(status))
+        self.status = status
+        self.reason = "Not Found" if status == 404 else "Error"
+
+
+class _Request:
+    """A prepared API call that sleeps for the injected latency on execute()."""
+
+    def __init__(self, latency: float, handler):
+        self.latency = latency
+        self.handler = handler
+
+    def execute(self, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.handler()
+
+
+class _Batch:
+    """Batch request: one delay for the whole batch, like one HTTP round trip."""
+
+    def __init__(self, latency: float, callback):
+        self.latency = latency
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request: _Request, request_id: str):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        if self.latency:
+            time.sleep(self.latency)
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.handler(), None)
+            except HttpError as error:
+                self.callback(request_id, None, error)
+
+
+class FakeGmail:
+    """Gmail API stand-in with a generated mailbox."""
+
+    def __init__(self, messages: int = 500, unread_ratio: float = 0.2, latency: float = 0.05, seed: int = 0):
+        """
+        Args:
+            messages: Mailbox size
+            unread_ratio: Fraction of messages that are unread
+            latency: Seconds each request (or batch) takes
+            seed: Random seed for the generated mailbox
+        """
+        rng = random.Random(seed)
+        self.latency = latency
+        self.history_id = 1000 + messages
+        now_ms = int(time.time() * 1000)
+        self.mailbox = {}
+        for index in range(messages):
+            message_id = f"m{index:06d}"
+            self.mailbox[message_id] = {
+                "id": message_id,
+                "threadId": f"t{index // 3:06d}",
+                "internalDate": str(now_ms - index * 600_000),
+                "labelIds": ["INBOX"] + (["UNREAD"] if rng.random() < unread_ratio else []),
+                "snippet": " ".join(rng.choice(SUBJECTS).lower().split() * 6)[:150],
+                "payload": {"headers": [
+                    {"name": "From", "value": rng.choice(SENDERS)},
+                    {"name": "Subject", "value": rng.choice(SUBJECTS)},
+                    {"name": "Date", "value": f"{index // 20} hours ago"},
+                    {"name": "To", "value": "bench@example.com"},
+                ]},
+            }
+        # Newest first, as messages().list returns them
+        self.ordered = sorted(self.mailbox.values(), key=lambda m: -int(m["internalDate"]))
+
+    # googleapiclient resource chain: users().messages().list(...) etc.
+    def users(self):
+        return self
+
+    def messages(self):
+        return _GmailMessages(self)
+
+    def history(self):
+        return _GmailHistory(self)
+
+    def labels(self):
+        return _GmailLabels(self)
+
+    def getProfile(self, userId: str):
+        return _Request(self.latency, lambda: {"emailAddress": "bench@example.com", "historyId": str(self.history_id)})
+
+    def new_batch_http_request(self, callback):
+        return _Batch(self.latency, callback)
+
+    def _matching(self, query: str | None) -> list[dict]:
+        messages = self.ordered
+        for term in (query or "").split():
+            if term == "is:unread":
+                messages = [m for m in messages if "UNREAD" in m["labelIds"]]
+            elif term.startswith("from:"):
+                sender = term[5:].lower()
+                messages = [m for m in messages if sender in m["payload"]["headers"][0]["value"]]
+            elif ":" not in term:
+                word = term.lower()
+                messages = [
+                    m for m in messages
+                    if word in m["payload"]["headers"][1]["value"].lower() or word in m["snippet"]
+                ]
+        return messages
+
+
+class _GmailMessages:
+    def __init__(self, gmail: FakeGmail):
+        self.gmail = gmail
+
+    def list(self, userId: str, q: str | None = None, maxResults: int = 100, pageToken: str | None = None, **kwargs):
+        def handler():
+            matching = self.gmail._matching(q)
+            start = int(pageToken or 0)
+            page = matching[start:start + maxResults]
+            result = {"messages": [{"id": m["id"], "threadId": m["threadId"]} for m in page]}
+            if start + maxResults < len(matching):
+                result["nextPageToken"] = str(start + maxResults)
+            return result
+        return _Request(self.gmail.latency, handler)
+
+    def get(self, userId: str, id: str, **kwargs):
+        def handler():
+            if id not in self.gmail.mailbox:
+                raise HttpError(_Response(404), b"Not Found")
+            return dict(self.gmail.mailbox[id])
+        return _Request(self.gmail.latency, handler)
+
+
+class _GmailLabels:
+    def __init__(self, gmail: FakeGmail):
+        self.gmail = gmail
+
+    def list(self, userId: str, **kwargs):
+        # System labels only; the generated mailbox has no user labels
+        labels = [{"id": label, "name": label, "type": "system"} for label in ("INBOX", "UNREAD")]
+        return _Request(self.gmail.latency, lambda: {"labels": labels})
+
+
+class _GmailHistory:
+    def __init__(self, gmail: FakeGmail):
+        self.gmail = gmail
+
+    def list(self, userId: str, startHistoryId: str, pageToken: str | None = None, **kwargs):
+        # The benchmark mailbox does not change
+        return _Request(self.gmail.latency, lambda: {"historyId": str(self.gmail.history_id)})
+
+
+class FakeCalendar:
+    """Calendar API stand-in with generated events on several calendars."""
+
+    def __init__(self, events_per_day: int = 8, days: int = 30, calendars: int = 1, latency: float = 0.05, seed: int = 0):
+        """
+        Args:
+            events_per_day: Events per calendar per day
+            days: Days of events from yesterday onwards
+            calendars: Number of calendars (the first is primary)
+            latency: Seconds each request takes
+            seed: Random seed for the generated events
+        """
+        rng = random.Random(seed)
+        self.latency = latency
+        self.calendar_ids = ["primary"] + [f"team{index}@group.calendar.google.com" for index in range(1, calendars)]
+        self.by_calendar: dict[str, list[dict]] = {}
+        day_start = datetime.now(timezone.utc).replace(hour=8, minute=0, second=0, microsecond=0)
+        for calendar_id in self.calendar_ids:
+            events = []
+            for day in range(-1, days):
+                for index in range(events_per_day):
+                    start = day_start + timedelta(days=day, minutes=index * (600 // max(events_per_day, 1)))
+                    end = start + timedelta(minutes=rng.choice([15, 30, 45, 60]))
+                    event_id = f"{calendar_id[:6]}-{day}-{index}"
+                    events.append({
+                        "id": event_id,
+                        "iCalUID": f"{event_id}@bench",
+                        "etag": f'"{event_id}"',
+                        "status": "confirmed",
+                        "summary": rng.choice(MEETINGS),
+                        "location": rng.choice(["", "Room 1", "Zoom", "Cafe"]),
+                        "description": "Agenda: " + " ".join(rng.choice(MEETINGS) for _ in range(12)),
+                        "start": {"dateTime": start.isoformat().replace("+00:00", "Z")},
+                        "end": {"dateTime": end.isoformat().replace("+00:00", "Z")},
+                    })
+            self.by_calendar[calendar_id] = events
+
+    def events(self):
+        return _CalendarEvents(self)
+
+    def calendarList(self):
+        return _CalendarList(self)
+
+    def calendars(self):
+        return _Calendars(self)
+
+
+class _CalendarEvents:
+    def __init__(self, calendar: FakeCalendar):
+        self.calendar = calendar
+
+    def list(self, calendarId: str, timeMin: str | None = None, timeMax: str | None = None,
+             maxResults: int = 250, pageToken: str | None = None, syncToken: str | None = None, **kwargs):
+        def handler():
+            if syncToken:
+                # The benchmark calendar does not change
+                return {"items": [], "nextSyncToken": syncToken}
+            events = self.calendar.by_calendar.get(calendarId, [])
+            if timeMin or timeMax:
+                low = datetime.fromisoformat(timeMin.replace("Z", "+00:00")) if timeMin else None
+                high = datetime.fromisoformat(timeMax.replace("Z", "+00:00")) if timeMax else None
+                events = [
+                    e for e in events
+                    if (high is None or _when(e["start"]) < high) and (low is None or _when(e["end"]) > low)
+                ]
+            start = int(pageToken or 0)
+            result = {"items": events[start:start + maxResults]}
+            if start + maxResults < len(events):
+                result["nextPageToken"] = str(start + maxResults)
+            else:
+                result["nextSyncToken"] = "bench"
+            return result
+        return _Request(self.calendar.latency, handler)
+
+
+class _CalendarList:
+    def __init__(self, calendar: FakeCalendar):
+        self.calendar = calendar
+
+    def list(self, pageToken: str | None = None, **kwargs):
+        items = [
+            {"id": calendar_id, "summary": calendar_id, "selected": True, "primary": calendar_id == "primary"}
+            for calendar_id in self.calendar.calendar_ids
+        ]
+        return _Request(self.calendar.latency, lambda: {"items": items})
+
+
+class _Calendars:
+    def __init__(self, calendar: FakeCalendar):
+        self.calendar = calendar
+
+    def get(self, calendarId: str, **kwargs):
+        return _Request(self.calendar.latency, lambda: {"id": calendarId, "timeZone": "UTC"})
+
+
+def _when(value: dict) -> datetime:
+    return datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+
+
+# Request keywords -> tool calls the scripted model makes
+TOOL_RULES = [
+    (("tomorrow",), "get_tomorrow_events", {}),
+    (("week",), "get_week_events", {}),
+    (("today", "day", "meeting", "calendar"), "get_today_events", {}),
+    (("email", "inbox", "mail", "unread"), "get_unread_emails", {"max_results": 10}),
+    (("invoice", "billing"), "search_emails", {"query": "invoice"}),
+    (("urgent",), "get_urgent_emails", {"max_results": 5}),
+    (("conflict", "focus", "free time"), "analyze_schedule", {
+        "start_date": date.today().isoformat(),
+        "end_date": (date.today() + timedelta(days=6)).isoformat(),
+    }),
+]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Scripted chat model with a fixed latency per call.
+
+    First call of a turn: one step with every tool call the request's
+    keywords imply (today's events and unread emails if none match).
+    After tool results: an answer of `answer_tokens` words.
+    """
+
+    latency: float = 0.3
+    answer_tokens: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def bind_tools(self, tools: Any, **kwargs):
+        return self
+
+    def _respond(self, messages) -> AIMessage:
+        last = messages[-1]
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        usage = {"input_tokens": input_tokens, "output_tokens": 0, "total_tokens": input_tokens}
+
+        if isinstance(last, HumanMessage):
+            text = str(last.content).lower()
+            calls = [(name, args) for words, name, args in TOOL_RULES if any(w in text for w in words)]
+            calls = calls or [("get_today_events", {}), ("get_unread_emails", {"max_results": 10})]
+            tool_calls = [
+                {"name": name, "args": args, "id": f"call_{index}_{time.monotonic_ns()}"}
+                for index, (name, args) in enumerate(calls)
+            ]
+            usage["output_tokens"] = 20 * len(tool_calls)
+            usage["total_tokens"] += usage["output_tokens"]
+            return AIMessage(content="", tool_calls=tool_calls, usage_metadata=usage)
+
+        tools_used = sum(isinstance(m, ToolMessage) for m in messages)
+        words = ["Here's", "your", "summary", f"from {tools_used} tool results:"]
+        words += [f"item{index}" for index in range(max(self.answer_tokens - len(words), 0))]
+        usage["output_tokens"] = self.answer_tokens
+        usage["total_tokens"] += self.answer_tokens
+        return AIMessage(content=" ".join(words), usage_metadata=usage)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        message = self._respond(messages)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                    for index, call in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata
+            ))
+            return
+        words = message.content.split(" ")
+        for index, word in enumerate(words):
+            last = index == len(words) - 1
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=word + ("" if last else " "),
+                usage_metadata=message.usage_metadata if last else None
+            ))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def install_fakes(gmail: FakeGmail, calendar: FakeCalendar, model_factory):
+    """
+    Route the server's Google clients, OAuth and Gemini model to fakes.
+
+    Args:
+        gmail: Gmail stand-in returned for every Gmail client
+        calendar: Calendar stand-in returned for every Calendar client
+        model_factory: Called with the ChatGoogleGenerativeAI kwargs
+            (callbacks included) to create the chat model
+    """
+    from google.oauth2.credentials import Credentials
+
+    import core.agent
+    import tools.clients
+    import utils.auth
+
+    tools.clients.build_service = lambda api, version, http, **kwargs: gmail if api == "gmail" else calendar
+    core.agent.ChatGoogleGenerativeAI = model_factory
+    utils.auth.authenticate_google = lambda: Credentials(
+        token="benchmark",
+        refresh_token="benchmark",
+        client_id="benchmark",
+        client_secret="benchmark",
+        token_uri="https://oauth2.googleapis.com/token",
+        expiry=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=1)
+    )
@@ -0,0 +1,376 @@
+"""
+Load Benchmark - Latency and throughput of /chat, /emails and /events, offline.
+
+Starts the real server in a subprocess with Gmail, Calendar and Gemini
+replaced by the stand-ins in fakes.py (generated data, injected latency,
+a scripted model that emits tool calls), then drives each endpoint at a
+fixed concurrency and reports per endpoint:
+- p50/p95/p99, mean and max latency
+- throughput and error counts
+and for the server: peak RSS, and the turn paths and tool calls from
+/metrics.
+
+Results are printed as a table or JSON (--json, --output) and can be
+compared against an earlier run (--compare), e.g. from another commit.
+
+Usage:
+    python benchmarks/load.py [--requests 200] [--concurrency 8]
+        [--endpoints chat,emails,events] [--mailbox 500] [--events-per-day 8]
+        [--google-latency 50] [--llm-latency 300] [--cache]
+        [--env KEY=VALUE ...] [--output run.json] [--compare baseline.json]
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+
+# Requests sent to /chat in rotation: direct queries the router answers and
+# requests that need the ReAct loop
+DEFAULT_PROMPTS = [
+    "What meetings do I have today?",
+    "Check my unread emails",
+    "Plan my day and tell me what to focus on",
+    "Do I have any conflicts tomorrow and what should I prepare?",
+    "Summarize my inbox and this week's schedule",
+    "Find the invoice emails and tell me which are urgent",
+]
+
+
+# ----------------------------------------------------------------------
+# Server side (runs in the subprocess)
+# ----------------------------------------------------------------------
+
+def serve(port: int, config: dict):
+    """Install the fakes and run the server on `port`."""
+    sys.path.insert(0, str(BENCHMARKS_DIR))
+    os.environ.update(config["env"])
+
+    from fakes import FakeGmail, FakeCalendar, FakeChatModel, install_fakes
+
+    gmail = FakeGmail(
+        messages=config["mailbox"],
+        unread_ratio=config["unread_ratio"],
+        latency=config["google_latency"] / 1000
+    )
+    calendar = FakeCalendar(
+        events_per_day=config["events_per_day"],
+        calendars=config["calendars"],
+        latency=config["google_latency"] / 1000
+    )
+    install_fakes(
+        gmail,
+        calendar,
+        lambda **kwargs: FakeChatModel(
+            latency=config["llm_latency"] / 1000,
+            answer_tokens=config["answer_tokens"],
+            callbacks=kwargs.get("callbacks")
+        )
+    )
+
+    import uvicorn
+    import server
+    uvicorn.run(server.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# ----------------------------------------------------------------------
+# Load driver
+# ----------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(base_url: str, process: subprocess.Popen, timeout: float) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health/ready", timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Server not ready within {timeout:.0f}s")
+
+
+def _request(base_url: str, endpoint: str, index: int, prompts: list[str], run_id: str) -> tuple[int, bool]:
+    """Send one request; returns (HTTP status, whether the response is an error)."""
+    if endpoint == "chat":
+        # A new conversation per request, so history length stays constant
+        session_id = f"bench-{run_id}-{index}"
+        body = json.dumps({"message": prompts[index % len(prompts)], "session_id": session_id}).encode()
+        request = urllib.request.Request(
+            f"{base_url}/chat", data=body, headers={"Content-Type": "application/json"}
+        )
+    else:
+        request = urllib.request.Request(f"{base_url}/{endpoint}")
+
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            payload = json.loads(response.read())
+            failed = (
+                isinstance(payload, dict) and "error" in payload
+                or endpoint == "chat" and payload.get("response", "").startswith("Error processing request")
+            )
+            return response.status, failed
+    except urllib.error.HTTPError as error:
+        return error.code, True
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return 0, True
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct * len(sorted_values) / 100) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def drive(base_url: str, endpoint: str, total: int, concurrency: int, prompts: list[str]) -> dict:
+    """Send `total` requests from `concurrency` threads and summarize them."""
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    errors = 0
+    lock = threading.Lock()
+    counter = itertools.count()
+    run_id = uuid.uuid4().hex[:8]
+
+    def worker():
+        nonlocal errors
+        while (index := next(counter)) < total:
+            start = time.perf_counter()
+            status, failed = _request(base_url, endpoint, index, prompts, run_id)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                errors += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": total,
+        "errors": errors,
+        "status_codes": statuses,
+        "duration_s": round(wall, 3),
+        "throughput_rps": round(total / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(ordered, 50)),
+            "p95": ms(percentile(ordered, 95)),
+            "p99": ms(percentile(ordered, 99)),
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+            "max": ms(ordered[-1]) if ordered else 0.0,
+        },
+    }
+
+
+def _peak_rss_mb(pid: int) -> float | None:
+    """High-water resident set size of a running process (Linux)."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+    match = re.search(r"^VmHWM:\s+(\d+) kB", status, re.MULTILINE)
+    return round(int(match.group(1)) / 1024, 1) if match else None
+
+
+def _server_metrics(base_url: str) -> dict:
+    """Turn paths and tool calls counted by the server's /metrics."""
+    try:
+        with urllib.request.urlopen(f"{base_url}/metrics", timeout=5) as response:
+            text = response.read().decode()
+    except (urllib.error.URLError, OSError):
+        return {}
+    turns = {m[1]: float(m[2]) for m in re.finditer(r'^assistant_turns_total\{path="(\w+)"\} (\S+)', text, re.M)}
+    tool_calls = sum(float(m[1]) for m in re.finditer(r"^assistant_tool_calls_total\{.*\} (\S+)", text, re.M))
+    return {"turns": turns, "tool_calls": tool_calls}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    """Start the fake-backed server, drive every endpoint and collect results."""
+    env = {
+        "DATA_DIR": tempfile.mkdtemp(prefix="assistant-bench-"),
+        "GEMINI_API_KEY": "benchmark",
+        "FAST_START": "false",
+        "MULTI_ACCOUNT": "false",
+        "TOOL_CACHE": "true" if args.cache else "false",
+        "RESPONSE_CACHE": "memory" if args.cache else "off",
+        "CHAT_MAX_CONCURRENCY": str(max(args.concurrency, 4)),
+        "CHAT_MAX_QUEUE": str(max(args.concurrency * 4, 16)),
+    }
+    for pair in args.env:
+        key, _, value = pair.partition("=")
+        env[key] = value
+
+    config = {
+        "mailbox": args.mailbox,
+        "unread_ratio": args.unread_ratio,
+        "events_per_day": args.events_per_day,
+        "calendars": args.calendars,
+        "google_latency": args.google_latency,
+        "llm_latency": args.llm_latency,
+        "answer_tokens": args.answer_tokens,
+        "env": env,
+    }
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--serve-port", str(port), "--serve-config", json.dumps(config)],
+        cwd=BENCHMARKS_DIR.parent / "src",
+        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+        stdout=None if args.verbose else subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL
+    )
+    try:
+        startup = _wait_ready(base_url, process, args.timeout)
+        endpoints = {}
+        for endpoint in args.endpoints.split(","):
+            # Warm-up requests fill the mirror, event store and client pools
+            drive(base_url, endpoint, args.warmup, 1, DEFAULT_PROMPTS)
+            endpoints[endpoint] = drive(base_url, endpoint, args.requests, args.concurrency, DEFAULT_PROMPTS)
+        server = {"ready_s": round(startup, 3), "peak_rss_mb": _peak_rss_mb(process.pid), **_server_metrics(base_url)}
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    if server.get("peak_rss_mb") is None:
+        # Not Linux: max RSS over waited-for children (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        server["peak_rss_mb"] = round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+    return {
+        "version": 1,
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {key: value for key, value in config.items() if key != "env"} | {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache": args.cache,
+            "env_overrides": args.env,
+        },
+        "endpoints": endpoints,
+        "server": server,
+    }
+
+
+def compare(result: dict, baseline: dict, max_regression: float | None) -> list[str]:
+    """Print changes against a baseline run; returns regressions over the limit."""
+    failures = []
+    print(f"\nvs {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')}):")
+    for endpoint, stats in result["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        changes = []
+        for name in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"][name], stats["latency_ms"][name]
+            delta = (new - old) / old * 100 if old else 0.0
+            changes.append(f"{name} {delta:+.1f}%")
+            if max_regression is not None and name == "p95" and delta > max_regression:
+                failures.append(f"{endpoint}: p95 {old:.1f}ms -> {new:.1f}ms ({delta:+.1f}%)")
+        old_rps, new_rps = before["throughput_rps"], stats["throughput_rps"]
+        changes.append(f"rps {(new_rps - old_rps) / old_rps * 100 if old_rps else 0.0:+.1f}%")
+        print(f"  {endpoint:8} " + "  ".join(changes))
+    old_rss, new_rss = baseline.get("server", {}).get("peak_rss_mb"), result["server"].get("peak_rss_mb")
+    if old_rss and new_rss:
+        print(f"  {'rss':8} {old_rss:.1f}MB -> {new_rss:.1f}MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per endpoint first")
+    parser.add_argument("--endpoints", default="chat,emails,events", help="Comma-separated endpoints to drive")
+    parser.add_argument("--mailbox", type=int, default=500, help="Messages in the fake mailbox")
+    parser.add_argument("--unread-ratio", type=float, default=0.2, help="Fraction of unread messages")
+    parser.add_argument("--events-per-day", type=int, default=8, help="Events per calendar per day")
+    parser.add_argument("--calendars", type=int, default=1, help="Calendars in the fake account")
+    parser.add_argument("--google-latency", type=float, default=50.0, help="Milliseconds per Google API request")
+    parser.add_argument("--llm-latency", type=float, default=300.0, help="Milliseconds per model call")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="Words in each model answer")
+    parser.add_argument("--cache", action="store_true", help="Enable the tool and response caches")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra server setting")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for the server")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    parser.add_argument("--max-regression", type=float, help="Fail if a p95 grew by more than this %%")
+    parser.add_argument("--verbose", action="store_true", help="Show the server's output")
+    parser.add_argument("--serve-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--serve-config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_port:
+        serve(args.serve_port, json.loads(args.serve_config))
+        return
+
+    result = run(args)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2) + "\n")
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{'endpoint':10}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>9}{'errors':>8}")
+        for endpoint, stats in result["endpoints"].items():
+            latency = stats["latency_ms"]
+            print(
+                f"{endpoint:10}{latency['p50']:>8.1f}ms{latency['p95']:>8.1f}ms{latency['p99']:>8.1f}ms"
+                f"{stats['throughput_rps']:>9.1f}{stats['errors']:>8}"
+            )
+        server = result["server"]
+        print(f"server: ready in {server['ready_s']:.2f}s, peak RSS {server['peak_rss_mb']}MB, turns {server.get('turns', {})}")
+
+    failures = []
+    if args.compare:
+        failures = compare(result, json.loads(Path(args.compare).read_text()), args.max_regression)
+        for failure in failures:
+            print(f"[ERROR] Regression: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Startup Benchmark - Guards the server's cold-start time against regressions.
+
+Measures, each in a fresh interpreter:
+- import: time to import server.py (what uvicorn does before serving)
+- live: time from launching uvicorn until /health/live answers
+- services: time to build the Gmail and Calendar clients from the
+  bundled discovery documents (first thread, then a second thread)
+- ready (with --ready): time until /health/ready answers 200, which needs
+  working Google and Gemini credentials
+
+Exits with status 1 if a median exceeds its budget.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--ready] [--json]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import server
+print(time.perf_counter() - start)
+"""
+
+SERVICES_SNIPPET = """
+import threading, time
+from google.auth.credentials import AnonymousCredentials
+from tools.clients import ThreadLocalService
+
+services = [ThreadLocalService(api, version, AnonymousCredentials())
+            for api, version in (("gmail", "v1"), ("calendar", "v3"))]
+start = time.perf_counter()
+for service in services:
+    service.get()
+first = time.perf_counter() - start
+
+timings = []
+def other_thread():
+    start = time.perf_counter()
+    for service in services:
+        service.get()
+    timings.append(time.perf_counter() - start)
+thread = threading.Thread(target=other_thread)
+thread.start()
+thread.join()
+print(first, timings[0])
+"""
+
+
+def _run_snippet(snippet: str) -> list[float]:
+    output = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    # The timings are on the last line; anything before is startup logging
+    return [float(value) for value in output.strip().splitlines()[-1].split()]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float) -> float | None:
+    """Seconds until `url` answers 200, or None on timeout."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def measure_server(ready: bool, timeout: float) -> tuple[float | None, float | None]:
+    """Launch uvicorn and time liveness (and readiness if requested)."""
+    port = _free_port()
+    env = {**os.environ, "FAST_START": "true", "PYTHONUNBUFFERED": "1"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        live = _wait_for(f"http://127.0.0.1:{port}/health/live", timeout)
+        live = None if live is None else time.perf_counter() - start
+        ready_after = None
+        if ready and live is not None:
+            if _wait_for(f"http://127.0.0.1:{port}/health/ready", timeout) is not None:
+                ready_after = time.perf_counter() - start
+        return live, ready_after
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions per measurement")
+    parser.add_argument("--ready", action="store_true", help="Also time readiness (needs credentials)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the server")
+    parser.add_argument("--max-import", type=float, default=1.0, help="Budget for importing server.py")
+    parser.add_argument("--max-live", type=float, default=2.5, help="Budget for /health/live")
+    parser.add_argument("--max-services", type=float, default=0.25, help="Budget for building the clients")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {"import": [], "live": [], "services_first": [], "services_thread": [], "ready": []}
+    for _ in range(args.runs):
+        results["import"].append(_run_snippet(IMPORT_SNIPPET)[0])
+        first, other = _run_snippet(SERVICES_SNIPPET)
+        results["services_first"].append(first)
+        results["services_thread"].append(other)
+        live, ready_after = measure_server(args.ready, args.timeout)
+        if live is not None:
+            results["live"].append(live)
+        if ready_after is not None:
+            results["ready"].append(ready_after)
+
+    summary = {
+        name: {"median": round(statistics.median(values), 4), "max": round(max(values), 4), "runs": len(values)}
+        for name, values in results.items() if values
+    }
+    budgets = {"import": args.max_import, "live": args.max_live, "services_first": args.max_services}
+    failures = [
+        f"{name}: median {summary[name]['median']:.3f}s > budget {budget:.3f}s"
+        for name, budget in budgets.items()
+        if name in summary and summary[name]["median"] > budget
+    ]
+    if not results["live"]:
+        failures.append(f"live: server did not answer /health/live within {args.timeout:.0f}s")
+
+    if args.json:
+        print(json.dumps({"results": summary, "budgets": budgets, "failures": failures}, indent=2))
+    else:
+        for name, stats in summary.items():
+            budget = budgets.get(name)
+            limit = f"  (budget {budget:.2f}s)" if budget else ""
+            print(f"{name:16} median {stats['median']:.3f}s  max {stats['max']:.3f}s{limit}")
+        for failure in failures:
+            print(f"[ERROR] {failure}")
+        if not failures:
+            print("[OK] Startup within budget")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,38 @@ Personal Assistant Agent - LangChain ReAct Agent
 Uses LangGraph for agent control flow with Gmail and Calendar tools.
 """
 
+import hashlib
 import os
+import traceback
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage
 from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import MemorySaver
 
-from tools import get_all_tools, init_google_services
+from tools import get_all_tools, init_google_services, data_fingerprint, run_google_io
+from utils.config import env_bool, env_int
+from utils.metrics import ERRORS
+from .checkpoint import create_checkpointer
+from .history import AssistantState, HistoryManager, make_prompt, SUMMARY_TAG
+from .messages import content_text
 from .prompts import SYSTEM_PROMPT
+from .response_cache import create_response_cache, current_turn
+from .router import IntentRouter
+from .telemetry import LLMMetricsHandler, record_turn
+
+# Conversation used when the caller does not supply a session ID
+DEFAULT_SESSION = "default"
+
+# Progress labels shown to the user while a tool runs
+TOOL_LABELS = {
+    "get_unread_emails": "Checking unread emails",
+    "search_emails": "Searching emails",
+    "get_urgent_emails": "Ranking urgent emails",
+    "get_today_events": "Fetching today's calendar",
+    "get_tomorrow_events": "Fetching tomorrow's calendar",
+    "get_week_events": "Fetching this week's calendar",
+    "get_events_between": "Searching your calendars",
+    "analyze_schedule": "Checking your schedule",
+}
 
 
 class PersonalAssistantAgent:
@@ -23,90 +47,382 @@ class PersonalAssistantAgent:
         Args:
             gemini_api_key: Gemini API key
             google_creds: Google OAuth credentials for Gmail/Calendar
+                (None in multi-account mode, where each request runs
+                with its own account)
         """
         # Initialize Google services for tools
         init_google_services(google_creds)
         
         # Initialize LLM
+        self.model_name = "gemini-2.5-flash"
         self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
+            model=self.model_name,
             google_api_key=gemini_api_key,
-            temperature=0.3
+            temperature=0.3,
+            callbacks=[LLMMetricsHandler(self.model_name)]
         )
         
         # Get LangChain tools
         self.tools = get_all_tools()
         
-        # Create memory for conversation history
-        self.memory = MemorySaver()
+        # Create memory for conversation history (SQLite or bounded
+        # in-memory, see CHECKPOINTER)
+        self.memory = create_checkpointer()
+        
+        # Persist once per turn rather than after every graph step, keeping
+        # checkpoint writes off the LLM/tool critical path
+        self.durability = os.getenv("CHECKPOINT_DURABILITY", "exit")
+        
+        # Store system prompt
+        self.system_prompt = SYSTEM_PROMPT
+        
+        # Keep history within a token budget before each model call
+        self.history = HistoryManager(
+            llm=self.llm if env_bool("HISTORY_SUMMARIZE", True) else None,
+            token_budget=env_int("HISTORY_TOKEN_BUDGET", 8000),
+            tool_output_chars=env_int("HISTORY_TOOL_OUTPUT_CHARS", 1500)
+        )
         
-        # Create ReAct agent with LangGraph (simple config)
+        # Create ReAct agent with LangGraph. The system prompt is added per
+        # model call rather than stored in the thread on every turn.
         self.agent = create_react_agent(
             model=self.llm,
             tools=self.tools,
+            prompt=make_prompt(self.system_prompt),
+            pre_model_hook=self.history.as_hook(),
+            state_schema=AssistantState,
             checkpointer=self.memory
         )
         
-        # Session config for memory
-        self.config = {"configurable": {"thread_id": "default"}}
+        # Answer direct single-tool queries without the ReAct loop
+        self.router = IntentRouter(
+            llm=self.llm,
+            mode=os.getenv("ROUTER_RESPONSE", "template")
+        ) if env_bool("ROUTER", True) else None
         
-        # Store system prompt
-        self.system_prompt = SYSTEM_PROMPT
+        # Reuse answers while the mail and calendar data behind them is
+        # unchanged; a new model or prompt starts a fresh key space
+        self.responses = create_response_cache(
+            data_fingerprint,
+            version=hashlib.sha1((self.model_name + self.system_prompt).encode()).hexdigest()[:12]
+        )
     
-    def process_request(self, user_input: str) -> str:
+    def process_request(self, user_input: str, session_id: str = DEFAULT_SESSION) -> str:
         """
         Process a user request using the ReAct agent.
         
         Args:
             user_input: Natural language request
+            session_id: Conversation to continue
             
         Returns:
             Agent's response as a string
         """
+        route = self._match_route(user_input)
+        if route and (response := self._answer_route(route, user_input, session_id)) is not None:
+            return response
+        
+        cache_key = self._cache_key(user_input, session_id)
+        if cache_key and (response := self._cached_response(cache_key, user_input, session_id)) is not None:
+            return response
+        
         try:
-            # Include system instructions with user message
-            messages = [
-                SystemMessage(content=self.system_prompt),
-                HumanMessage(content=user_input)
-            ]
+            result = self.agent.invoke(
+                {"messages": self._build_messages(user_input)},
+                config=self._session_config(session_id),
+                durability=self.durability
+            )
+            response = self._extract_response(result)
+            record_turn("agent", current_turn(result.get("messages", [])))
+            if cache_key:
+                self._cache_response(cache_key, response, result)
+            return response
+            
+        except Exception as e:
+            return self._report_failure(e)
+    
+    async def aprocess_request(self, user_input: str, session_id: str = DEFAULT_SESSION) -> str:
+        """
+        Async version of process_request.
+        
+        Runs the graph with `ainvoke`, so the LLM call does not block the
+        event loop and tools run in worker threads.
+        
+        Args:
+            user_input: Natural language request
+            session_id: Conversation to continue
             
-            response = self.agent.invoke(
-                {"messages": messages},
-                config=self.config
+        Returns:
+            Agent's response as a string
+        """
+        route = self._match_route(user_input)
+        if route and (response := await self._aanswer_route(route, user_input, session_id)) is not None:
+            return response
+        
+        cache_key = await self._acache_key(user_input, session_id)
+        if cache_key and (response := await self._acached_response(cache_key, user_input, session_id)) is not None:
+            return response
+        
+        try:
+            result = await self.agent.ainvoke(
+                {"messages": self._build_messages(user_input)},
+                config=self._session_config(session_id),
+                durability=self.durability
             )
+            response = self._extract_response(result)
+            record_turn("agent", current_turn(result.get("messages", [])))
+            if cache_key:
+                await run_google_io(self._cache_response, cache_key, response, result)
+            return response
             
-            # Extract the final AI message
-            result_messages = response.get("messages", [])
-            if result_messages:
-                # Find the last AI message (not tool messages)
-                for msg in reversed(result_messages):
-                    if hasattr(msg, 'content') and msg.content:
-                        # Check if it's an AI message
-                        if isinstance(msg, AIMessage):
-                            content = msg.content
-                            if isinstance(content, str) and content.strip():
-                                return content
-                            elif isinstance(content, list):
-                                # Handle structured content
-                                text_parts = [p.get('text', '') for p in content if isinstance(p, dict) and 'text' in p]
-                                if text_parts:
-                                    return ' '.join(text_parts)
-                
-                # Fallback: return last message content
-                last_msg = result_messages[-1]
-                if hasattr(last_msg, 'content') and last_msg.content:
-                    content = last_msg.content
-                    if isinstance(content, str):
-                        return content
-                    return str(content)
+        except Exception as e:
+            return self._report_failure(e)
+    
+    async def astream_request(self, user_input: str, session_id: str = DEFAULT_SESSION):
+        """
+        Stream a user request as it is processed.
+        
+        Args:
+            user_input: Natural language request
+            session_id: Conversation to continue
+        
+        Yields event dicts:
+            {"type": "token", "content": ...}       LLM text as it arrives
+            {"type": "tool_start", "tool": ..., "label": ...}
+            {"type": "tool_end", "tool": ...}
+            {"type": "done", "response": ...}       Final answer
+            {"type": "error", "message": ...}
+        """
+        route = self._match_route(user_input)
+        if route:
+            intent = route[0]
+            yield self._tool_start_event(intent.tool)
+            response = await self._aanswer_route(route, user_input, session_id)
+            yield {"type": "tool_end", "tool": intent.tool}
+            if response is not None:
+                yield {"type": "token", "content": response}
+                yield {"type": "done", "response": response}
+                return
+        
+        cache_key = await self._acache_key(user_input, session_id)
+        if cache_key and (response := await self._acached_response(cache_key, user_input, session_id)) is not None:
+            yield {"type": "token", "content": response}
+            yield {"type": "done", "response": response}
+            return
+        
+        try:
+            final_state = None
+            async for event in self.agent.astream_events(
+                {"messages": self._build_messages(user_input)},
+                config=self._session_config(session_id),
+                version="v2",
+                durability=self.durability
+            ):
+                kind = event["event"]
+                if SUMMARY_TAG in event.get("tags", []):
+                    # History summarization is internal, not part of the answer
+                    continue
+                if kind == "on_chat_model_stream":
+                    text = content_text(event["data"]["chunk"].content)
+                    if text:
+                        yield {"type": "token", "content": text}
+                elif kind == "on_tool_start":
+                    yield self._tool_start_event(event["name"])
+                elif kind == "on_tool_end":
+                    yield {"type": "tool_end", "tool": event["name"]}
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    # End of the top-level graph run
+                    final_state = event["data"].get("output")
             
-            return "I couldn't process your request."
+            response = self._extract_response(final_state or {})
+            record_turn("agent", current_turn((final_state or {}).get("messages", [])))
+            if cache_key and final_state:
+                await run_google_io(self._cache_response, cache_key, response, final_state)
+            yield {"type": "done", "response": response}
             
         except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return f"Error processing request: {str(e)}"
+            yield {"type": "error", "message": self._report_failure(e)}
+    
+    # ------------------------------------------------------------------
+    # Fast path
+    # ------------------------------------------------------------------
+    
+    def _match_route(self, user_input: str):
+        """The router's (intent, args) for a request, or None to use the agent."""
+        if not self.router:
+            return None
+        route = self.router.match(user_input)
+        if route is None:
+            self.router.record(None, user_input)
+        return route
+    
+    def _answer_route(self, route, user_input: str, session_id: str) -> str | None:
+        """Answer a routed request; None if it failed and the agent should run."""
+        intent, args = route
+        try:
+            response = self.router.answer(intent, args, user_input)
+            self._save_turn(user_input, response, session_id)
+        except Exception as e:
+            print(f"[WARN] Fast path for {intent.name} failed, using the agent: {e}")
+            self.router.record(None, user_input)
+            return None
+        self.router.record(intent, user_input)
+        record_turn("router")
+        return response
+    
+    async def _aanswer_route(self, route, user_input: str, session_id: str) -> str | None:
+        """Async version of _answer_route."""
+        intent, args = route
+        try:
+            response = await self.router.aanswer(intent, args, user_input)
+            await self._asave_turn(user_input, response, session_id)
+        except Exception as e:
+            print(f"[WARN] Fast path for {intent.name} failed, using the agent: {e}")
+            self.router.record(None, user_input)
+            return None
+        self.router.record(intent, user_input)
+        record_turn("router")
+        return response
+    
+    # ------------------------------------------------------------------
+    # Response cache
+    # ------------------------------------------------------------------
+    
+    def _cache_key(self, user_input: str, session_id: str) -> str | None:
+        """Response cache key for this turn, or None when caching is off."""
+        if not self.responses:
+            return None
+        try:
+            state = self.agent.get_state(self._session_config(session_id))
+            return self.responses.key(user_input, state.values)
+        except Exception as e:
+            print(f"[WARN] Response cache unavailable: {e}")
+            return None
+    
+    async def _acache_key(self, user_input: str, session_id: str) -> str | None:
+        """Async version of _cache_key."""
+        if not self.responses:
+            return None
+        try:
+            state = await self.agent.aget_state(self._session_config(session_id))
+            return self.responses.key(user_input, state.values)
+        except Exception as e:
+            print(f"[WARN] Response cache unavailable: {e}")
+            return None
+    
+    def _cached_response(self, cache_key: str, user_input: str, session_id: str) -> str | None:
+        """A still-valid cached answer, recorded in the thread as this turn."""
+        try:
+            response = self.responses.get(cache_key)
+            if response is not None:
+                self._save_turn(user_input, response, session_id)
+                print(f"[INFO] Response cache hit for: {user_input[:80]!r}")
+                record_turn("cache")
+            return response
+        except Exception as e:
+            print(f"[WARN] Response cache lookup failed: {e}")
+            return None
+    
+    async def _acached_response(self, cache_key: str, user_input: str, session_id: str) -> str | None:
+        """Async version of _cached_response."""
+        try:
+            response = await run_google_io(self.responses.get, cache_key)
+            if response is not None:
+                await self._asave_turn(user_input, response, session_id)
+                print(f"[INFO] Response cache hit for: {user_input[:80]!r}")
+                record_turn("cache")
+            return response
+        except Exception as e:
+            print(f"[WARN] Response cache lookup failed: {e}")
+            return None
+    
+    def _cache_response(self, cache_key: str, response: str, result: dict):
+        """Remember an agent answer with the tools it depended on."""
+        try:
+            self.responses.put(cache_key, response, current_turn(result.get("messages", [])))
+        except Exception as e:
+            print(f"[WARN] Could not cache response: {e}")
+    
+    # ------------------------------------------------------------------
+    # Conversation thread
+    # ------------------------------------------------------------------
+    
+    def _save_turn(self, user_input: str, response: str, session_id: str):
+        """Record a turn answered outside the graph in the conversation thread."""
+        self.agent.update_state(
+            self._session_config(session_id),
+            {"messages": self._turn_messages(user_input, response)},
+            as_node="agent"
+        )
+    
+    async def _asave_turn(self, user_input: str, response: str, session_id: str):
+        """Async version of _save_turn."""
+        await self.agent.aupdate_state(
+            self._session_config(session_id),
+            {"messages": self._turn_messages(user_input, response)},
+            as_node="agent"
+        )
+    
+    def _turn_messages(self, user_input: str, response: str) -> list:
+        """A turn answered outside the graph, as stored in the thread."""
+        return [HumanMessage(content=user_input), AIMessage(content=response)]
+    
+    def _tool_start_event(self, tool_name: str) -> dict:
+        return {
+            "type": "tool_start",
+            "tool": tool_name,
+            "label": TOOL_LABELS.get(tool_name, f"Running {tool_name}") + "…"
+        }
+    
+    def _session_config(self, session_id: str) -> dict:
+        """Graph config selecting the conversation thread for a session."""
+        return {"configurable": {"thread_id": session_id}}
+    
+    def _build_messages(self, user_input: str) -> list:
+        """New messages for a turn (the system prompt is added by the graph)."""
+        return [HumanMessage(content=user_input)]
+    
+    def _extract_response(self, response: dict) -> str:
+        """Extract the final AI message text from a graph result."""
+        result_messages = response.get("messages", [])
+        if result_messages:
+            # Find the last AI message (not tool messages)
+            for msg in reversed(result_messages):
+                if hasattr(msg, 'content') and msg.content:
+                    # Check if it's an AI message
+                    if isinstance(msg, AIMessage):
+                        text = content_text(msg.content)
+                        if text.strip():
+                            return text
+            
+            # Fallback: return last message content
+            last_msg = result_messages[-1]
+            if hasattr(last_msg, 'content') and last_msg.content:
+                content = last_msg.content
+                if isinstance(content, str):
+                    return content
+                return str(content)
+        
+        return "I couldn't process your request."
+    
+    def _report_failure(self, error: Exception) -> str:
+        """Count and log a failed turn; returns the message for the user."""
+        ERRORS.inc(component="agent")
+        traceback.print_exc()
+        return f"Error processing request: {error}"
+    
+    def reset_conversation(self, session_id: str = DEFAULT_SESSION):
+        """Reset the conversation history and free its memory."""
+        self.memory.delete_thread(session_id)
+    
+    def session_stats(self) -> dict:
+        """Session count and conversation memory usage."""
+        return self.memory.stats()
+    
+    def router_stats(self) -> dict | None:
+        """Fast-path routing counters (None when the router is disabled)."""
+        return self.router.stats() if self.router else None
     
-    def reset_conversation(self):
-        """Reset the conversation history."""
-        self.config = {"configurable": {"thread_id": f"session_{os.urandom(4).hex()}"}}
+    def response_cache_stats(self) -> dict | None:
+        """Response cache counters (None when the cache is disabled)."""
+        return self.responses.stats() if self.responses else None
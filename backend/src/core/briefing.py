@@ -0,0 +1,138 @@
+"""
+Daily Briefing - Deterministic "plan my day" pipeline.
+
+Fetches today's events and unread emails concurrently, fills
+BRIEFING_PROMPT and makes a single LLM call, instead of letting the ReAct
+loop call each tool with a model round trip in between. Results are
+cached per account and day, and can be precomputed on a daily schedule.
+"""
+
+import asyncio
+import re
+import time
+from datetime import date, datetime, timedelta, time as time_of_day
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from tools import get_today_events, get_unread_emails, current_user_id
+from .messages import content_text
+from .prompts import SYSTEM_PROMPT, BRIEFING_PROMPT
+from .telemetry import BRIEFING_TAG
+
+
+class BriefingService:
+    """Generates and caches the daily briefing of each account."""
+
+    def __init__(self, llm, max_age: float = 3600.0, max_emails: int = 20):
+        """
+        Args:
+            llm: Chat model used to write the briefing
+            max_age: Seconds an on-demand briefing is served from cache
+                (a scheduled one is served for the rest of its day)
+            max_emails: Unread emails included in the prompt
+        """
+        self.llm = llm
+        self.max_age = max_age
+        self.max_emails = max_emails
+
+        # (user ID, local date) -> (generated at, scheduled, briefing);
+        # None is the single-user account
+        self._briefings: dict[tuple[str | None, date], tuple[float, bool, dict]] = {}
+        self._locks: dict[str | None, asyncio.Lock] = {}
+
+    def cached(self) -> dict | None:
+        """The current account's briefing for today, if it is still fresh."""
+        entry = self._briefings.get((current_user_id(), date.today()))
+        if entry and (entry[1] or time.monotonic() - entry[0] < self.max_age):
+            return entry[2]
+        return None
+
+    async def get(self, refresh: bool = False, scheduled: bool = False) -> dict:
+        """
+        Return the cached briefing, generating a new one if needed.
+
+        Args:
+            refresh: Generate a new briefing even if one is cached
+            scheduled: Keep the new briefing for the rest of the day
+        """
+        if not refresh and (briefing := self.cached()):
+            return briefing
+
+        async with self._locks.setdefault(current_user_id(), asyncio.Lock()):
+            # A concurrent request may have generated it while we waited
+            if not refresh and (briefing := self.cached()):
+                return briefing
+            return await self.generate(scheduled)
+
+    async def generate(self, scheduled: bool = False) -> dict:
+        """Fetch calendar and email data concurrently, then make one LLM call."""
+        day = date.today()
+        calendar_events, unread_emails = await asyncio.gather(
+            get_today_events.ainvoke({}),
+            get_unread_emails.ainvoke({"max_results": self.max_emails})
+        )
+
+        prompt = BRIEFING_PROMPT.format(
+            calendar_events=calendar_events,
+            unread_emails=unread_emails
+        )
+        result = await self.llm.ainvoke(
+            [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=prompt)],
+            config={"tags": [BRIEFING_TAG]}
+        )
+
+        content = content_text(result.content)
+
+        briefing = {
+            "briefing": content,
+            "generated_at": datetime.now().isoformat(timespec="seconds")
+        }
+        self._briefings[(current_user_id(), day)] = (time.monotonic(), scheduled, briefing)
+        self._evict_stale()
+        return briefing
+
+    def _evict_stale(self):
+        now = time.monotonic()
+        today = date.today()
+        for key in [
+            key for key, (at, scheduled, _) in self._briefings.items()
+            if key[1] != today or (not scheduled and now - at >= self.max_age)
+        ]:
+            del self._briefings[key]
+
+    async def run_schedule(self, at: str):
+        """
+        Precompute the briefing every day at a local time.
+
+        Args:
+            at: Time of day as "HH:MM" (see parse_schedule)
+        """
+        scheduled_time = parse_schedule(at)
+        while True:
+            now = datetime.now()
+            next_run = datetime.combine(now.date(), scheduled_time)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+
+            await asyncio.sleep((next_run - now).total_seconds())
+            try:
+                await self.get(refresh=True, scheduled=True)
+                print(f"[OK] Daily briefing precomputed at {at}")
+            except Exception as e:
+                print(f"[ERROR] Scheduled briefing failed: {e}")
+
+
+def parse_schedule(at: str) -> time_of_day:
+    """
+    Parse a BRIEFING_SCHEDULE time of day.
+
+    Raises:
+        ValueError: If `at` is not a valid "HH:MM"
+    """
+    match = re.fullmatch(r"\s*(\d{1,2}):(\d{2})\s*", at)
+    try:
+        if match:
+            return time_of_day(int(match.group(1)), int(match.group(2)))
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid BRIEFING_SCHEDULE '{at}', expected HH:MM")
@@ -0,0 +1,339 @@
+"""
+Conversation checkpointers.
+
+Two backends, selected with CHECKPOINTER:
+- sqlite (default): durable SQLite file in WAL mode, shared by every
+  uvicorn worker and surviving restarts; idle threads, threads over the
+  count cap and superseded checkpoints are pruned periodically
+- memory: LangGraph's in-memory saver, bounded so that idle and least
+  recently used threads are evicted
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from utils.config import get_data_dir, env_int, env_float
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    In-memory checkpointer with LRU and idle-TTL eviction.
+
+    Threads are evicted when they have been idle longer than `idle_ttl`,
+    or (least recently used first) when there are more than
+    `max_sessions` threads or their serialized state exceeds `max_bytes`.
+    The thread being written is never evicted by its own write.
+    """
+
+    def __init__(self, max_sessions: int = 500, idle_ttl: float = 3600.0, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            max_sessions: Maximum number of conversation threads kept
+            idle_ttl: Seconds without activity before a thread is dropped
+            max_bytes: Cap on the total serialized size of all threads
+        """
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+
+        # thread_id -> last access time, least recently used first
+        self._last_access: OrderedDict[str, float] = OrderedDict()
+        # thread_id -> approximate serialized size in bytes
+        self._sizes: dict[str, int] = {}
+        self._total_bytes = 0
+        self._evicted = 0
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Saver overrides (the async variants delegate to these)
+    # ------------------------------------------------------------------
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if thread_id in self._last_access:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+
+            saved = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            added = len(saved[0][1]) + len(saved[1][1])
+            for channel, version in new_versions.items():
+                added += len(self.blobs[(thread_id, checkpoint_ns, channel, version)][1])
+
+            self._grow(thread_id, added)
+            self._evict(keep=thread_id)
+            return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (
+            thread_id,
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"]
+        )
+        with self._lock:
+            before = _writes_size(self.writes.get(outer_key))
+            super().put_writes(config, writes, task_id, task_path)
+            self._grow(thread_id, _writes_size(self.writes.get(outer_key)) - before)
+            self._evict(keep=thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._last_access.pop(thread_id, None)
+            self._total_bytes -= self._sizes.pop(thread_id, 0)
+
+    # ------------------------------------------------------------------
+    # Accounting and eviction
+    # ------------------------------------------------------------------
+
+    def _touch(self, thread_id: str):
+        self._last_access[thread_id] = time.monotonic()
+        self._last_access.move_to_end(thread_id)
+
+    def _grow(self, thread_id: str, added: int):
+        self._touch(thread_id)
+        self._sizes[thread_id] = self._sizes.get(thread_id, 0) + added
+        self._total_bytes += added
+
+    def _evict(self, keep: str):
+        """Drop idle threads, then LRU threads until within limits."""
+        cutoff = time.monotonic() - self.idle_ttl
+        for thread_id, last_access in list(self._last_access.items()):
+            if last_access >= cutoff:
+                # Ordered by access time, so everything after is newer
+                break
+            if thread_id != keep:
+                self._drop(thread_id)
+
+        while (
+            len(self._last_access) > self.max_sessions
+            or self._total_bytes > self.max_bytes
+        ):
+            victim = next((t for t in self._last_access if t != keep), None)
+            if victim is None:
+                break
+            self._drop(victim)
+
+    def _drop(self, thread_id: str):
+        self.delete_thread(thread_id)
+        self._evicted += 1
+
+    def stats(self) -> dict:
+        """Session count and memory usage, for the health endpoint."""
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._last_access),
+                "bytes": self._total_bytes,
+                "evicted": self._evicted,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "idle_ttl": self.idle_ttl
+            }
+
+
+def _writes_size(writes: dict | None) -> int:
+    if not writes:
+        return 0
+    return sum(len(value[2][1]) for value in writes.values())
+
+
+# Last write per thread (wall clock, so every worker process agrees)
+ACTIVITY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_activity (
+    thread_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS thread_activity_by_time ON thread_activity (last_access);
+"""
+
+
+class SqliteCheckpointSaver(SqliteSaver):
+    """
+    SQLite checkpointer usable from both sync and async graph runs.
+
+    LangGraph's SqliteSaver only implements the sync interface; the async
+    methods here run it in a worker thread so `ainvoke` and streaming work
+    without a second (aiosqlite) connection. WAL mode lets several worker
+    processes read while one writes.
+
+    At most every `prune_interval` seconds a write also prunes the file:
+    threads without a write for `idle_ttl` seconds are deleted, then the
+    least recently written ones beyond `max_sessions`, and every checkpoint
+    older than its thread's latest (the agent only resumes from the latest;
+    its state has no delta channels that would need the ancestors).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_sessions: int = 500,
+        idle_ttl: float = 3600.0,
+        prune_interval: float = 60.0
+    ):
+        """
+        Args:
+            db_path: SQLite file holding the checkpoints
+            max_sessions: Maximum number of conversation threads kept
+            idle_ttl: Seconds without a write before a thread is dropped
+            prune_interval: Minimum seconds between prunes
+        """
+        conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        super().__init__(conn)
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.prune_interval = prune_interval
+        self._last_prune = None
+        self._evicted = 0
+        self._pruned_checkpoints = 0
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(ACTIVITY_SCHEMA)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO thread_activity VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_access = excluded.last_access",
+                (thread_id, time.time())
+            )
+        if self._last_prune is None or time.monotonic() - self._last_prune >= self.prune_interval:
+            self.prune(keep=thread_id)
+        return result
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    def prune(self, keep: str | None = None):
+        """
+        Delete idle and excess threads and superseded checkpoints.
+
+        Args:
+            keep: Thread being written, never deleted by its own write
+        """
+        self._last_prune = time.monotonic()
+        now = time.time()
+        with self.cursor() as cur:
+            # Threads written before activity was tracked start their idle clock now
+            cur.execute(
+                "INSERT OR IGNORE INTO thread_activity SELECT DISTINCT thread_id, ? FROM checkpoints",
+                (now,)
+            )
+            victims = [row[0] for row in cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE last_access < ? AND thread_id IS NOT ?",
+                (now - self.idle_ttl, keep)
+            )]
+            excess = cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0] - len(victims) - self.max_sessions
+            if excess > 0:
+                victims += [row[0] for row in cur.execute(
+                    "SELECT thread_id FROM thread_activity WHERE last_access >= ? AND thread_id IS NOT ? "
+                    "ORDER BY last_access LIMIT ?",
+                    (now - self.idle_ttl, keep, excess)
+                )]
+            for table in ("checkpoints", "writes", "thread_activity"):
+                cur.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in victims])
+
+            # Checkpoint IDs sort by creation time
+            cur.execute(
+                "DELETE FROM checkpoints WHERE EXISTS ("
+                "SELECT 1 FROM checkpoints AS newer WHERE newer.thread_id = checkpoints.thread_id "
+                "AND newer.checkpoint_ns = checkpoints.checkpoint_ns "
+                "AND newer.checkpoint_id > checkpoints.checkpoint_id)"
+            )
+            pruned = cur.rowcount
+            cur.execute(
+                "DELETE FROM writes WHERE NOT EXISTS ("
+                "SELECT 1 FROM checkpoints WHERE checkpoints.thread_id = writes.thread_id "
+                "AND checkpoints.checkpoint_ns = writes.checkpoint_ns "
+                "AND checkpoints.checkpoint_id = writes.checkpoint_id)"
+            )
+        self._evicted += len(victims)
+        self._pruned_checkpoints += pruned
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def stats(self) -> dict:
+        """Session count and database size, for the health endpoint."""
+        self.setup()
+        with self.lock:
+            sessions = self.conn.execute(
+                "SELECT COUNT(DISTINCT thread_id) FROM checkpoints"
+            ).fetchone()[0]
+        size = sum(
+            os.path.getsize(path)
+            for path in (self.db_path, self.db_path + "-wal")
+            if os.path.exists(path)
+        )
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "bytes": size,
+            "evicted": self._evicted,
+            "pruned_checkpoints": self._pruned_checkpoints,
+            "max_sessions": self.max_sessions,
+            "idle_ttl": self.idle_ttl
+        }
+
+
+def create_checkpointer():
+    """Build the checkpointer selected by CHECKPOINTER (sqlite or memory)."""
+    backend = os.getenv("CHECKPOINTER", "sqlite").lower()
+    
+    if backend == "memory":
+        return BoundedMemorySaver(
+            max_sessions=env_int("SESSION_MAX_COUNT", 500),
+            idle_ttl=env_float("SESSION_IDLE_TTL", 3600.0),
+            max_bytes=env_int("SESSION_MAX_MB", 256) * 1024 * 1024
+        )
+    
+    if backend != "sqlite":
+        print(f"[WARN] Unknown CHECKPOINTER '{backend}', using sqlite")
+    
+    db_path = os.getenv("CHECKPOINT_DB", str(get_data_dir() / "checkpoints.db"))
+    return SqliteCheckpointSaver(
+        db_path,
+        max_sessions=env_int("SESSION_MAX_COUNT", 500),
+        idle_ttl=env_float("SESSION_IDLE_TTL", 3600.0)
+    )
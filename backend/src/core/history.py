@@ -0,0 +1,246 @@
+"""
+Conversation history management.
+
+Runs before every model call (as the graph's pre-model hook) to keep the
+prompt within a token budget: older turns are folded into a running
+summary and bulky tool outputs from earlier turns are truncated. The
+system prompt is supplied once per call instead of being stored in the
+thread history.
+"""
+
+import os
+from datetime import datetime
+from typing import NotRequired
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from langchain_core.messages import (
+    SystemMessage, HumanMessage, AIMessage, ToolMessage, RemoveMessage
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langgraph.prebuilt.chat_agent_executor import AgentState
+
+from .messages import content_text
+
+# Tag on the summarizer's LLM calls so they can be filtered from streams
+SUMMARY_TAG = "history_summary"
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and their personal assistant.
+Merge the existing summary with the new messages into one concise summary (at most 200 words).
+Keep facts the assistant may need later: what the user asked for, decisions, commitments, names, dates and times.
+Do not include raw email or calendar listings."""
+
+
+class AssistantState(AgentState):
+    """Agent state plus the running summary of trimmed turns."""
+    summary: NotRequired[str]
+
+
+def local_now() -> datetime:
+    """The current time in USER_TIMEZONE, else in the server's time zone."""
+    configured = os.getenv("USER_TIMEZONE")
+    if configured:
+        try:
+            return datetime.now(ZoneInfo(configured))
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return datetime.now().astimezone()
+
+
+def date_context(now: datetime) -> str:
+    """Prompt section telling the model today's date, weekday and time zone."""
+    zone = getattr(now.tzinfo, "key", None) or now.tzname()
+    return (
+        f"## Current date\n"
+        f"Today is {now:%A, %Y-%m-%d} and the local time is {now:%H:%M} ({zone}). "
+        f"Resolve relative dates such as \"tomorrow\" or \"next week\" against today "
+        f"and pass tools absolute YYYY-MM-DD dates."
+    )
+
+
+def make_prompt(system_prompt: str, now=local_now):
+    """
+    Prompt callable that prepends the system prompt, today's date and the
+    running summary. The date is read on every call, so long-running
+    servers and threads that span midnight stay current.
+    """
+    def prompt(state) -> list:
+        content = f"{system_prompt}\n\n{date_context(now())}"
+        if state.get("summary"):
+            content += f"\n\n## Earlier in this conversation\n{state['summary']}"
+        return [SystemMessage(content=content)] + list(state["messages"])
+    return prompt
+
+
+class HistoryManager:
+    """Keeps the conversation history within a token budget."""
+
+    def __init__(self, llm=None, token_budget: int = 8000, tool_output_chars: int = 1500):
+        """
+        Args:
+            llm: Chat model used to write summaries (None for a plain
+                extractive summary without an extra LLM call)
+            token_budget: Approximate token cap for the stored history
+            tool_output_chars: Older tool outputs longer than this are truncated
+        """
+        self.llm = llm
+        self.token_budget = token_budget
+        self.tool_output_chars = tool_output_chars
+
+    def as_hook(self) -> RunnableLambda:
+        """Runnable for create_react_agent's pre_model_hook."""
+        return RunnableLambda(self.trim, afunc=self.atrim, name="history")
+
+    # ------------------------------------------------------------------
+    # Hook entry points
+    # ------------------------------------------------------------------
+
+    def trim(self, state) -> dict:
+        plan = self._plan(state)
+        if plan is None:
+            return {}
+        kept, overflow = plan
+        summary = None
+        if overflow:
+            summary = self._summarize(state.get("summary", ""), overflow)
+        return self._update(kept, summary)
+
+    async def atrim(self, state) -> dict:
+        plan = self._plan(state)
+        if plan is None:
+            return {}
+        kept, overflow = plan
+        summary = None
+        if overflow:
+            summary = await self._asummarize(state.get("summary", ""), overflow)
+        return self._update(kept, summary)
+
+    # ------------------------------------------------------------------
+    # Windowing
+    # ------------------------------------------------------------------
+
+    def _plan(self, state) -> tuple[list, list] | None:
+        """
+        Decide what to keep.
+
+        Returns (kept messages, overflowed messages to summarize), or None
+        if the history is already within budget and needs no rewrite.
+        """
+        messages = list(state["messages"])
+        changed = False
+
+        # Older threads stored a system prompt on every turn
+        if any(isinstance(m, SystemMessage) for m in messages):
+            messages = [m for m in messages if not isinstance(m, SystemMessage)]
+            changed = True
+
+        turns = _split_turns(messages)
+        if not turns:
+            return ([], []) if changed else None
+
+        # Earlier turns' tool outputs were already used in an answer; keep a preview
+        for turn in turns[:-1]:
+            for index, message in enumerate(turn):
+                if isinstance(message, ToolMessage) and isinstance(message.content, str) \
+                        and len(message.content) > self.tool_output_chars:
+                    turn[index] = _truncate_tool_message(message, self.tool_output_chars)
+                    changed = True
+
+        # Drop the oldest turns until within budget; the current turn stays
+        overflow = []
+        while len(turns) > 1 and count_tokens_approximately(_flatten(turns)) > self.token_budget:
+            overflow.extend(turns.pop(0))
+            changed = True
+
+        if not changed:
+            return None
+        return _flatten(turns), overflow
+
+    def _update(self, kept: list, summary: str | None) -> dict:
+        update = {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)] + kept}
+        if summary is not None:
+            update["summary"] = summary
+        return update
+
+    # ------------------------------------------------------------------
+    # Summaries
+    # ------------------------------------------------------------------
+
+    def _summary_request(self, summary: str, overflow: list) -> list:
+        transcript = "\n".join(_describe(m) for m in overflow if _describe(m))
+        return [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}")
+        ]
+
+    def _summarize(self, summary: str, overflow: list) -> str:
+        if self.llm is None:
+            return _extractive_summary(summary, overflow)
+        try:
+            result = self.llm.invoke(
+                self._summary_request(summary, overflow),
+                config={"tags": [SUMMARY_TAG]}
+            )
+            return content_text(result.content).strip() or _extractive_summary(summary, overflow)
+        except Exception as e:
+            print(f"[WARN] History summarization failed: {e}")
+            return _extractive_summary(summary, overflow)
+
+    async def _asummarize(self, summary: str, overflow: list) -> str:
+        if self.llm is None:
+            return _extractive_summary(summary, overflow)
+        try:
+            result = await self.llm.ainvoke(
+                self._summary_request(summary, overflow),
+                config={"tags": [SUMMARY_TAG]}
+            )
+            return content_text(result.content).strip() or _extractive_summary(summary, overflow)
+        except Exception as e:
+            print(f"[WARN] History summarization failed: {e}")
+            return _extractive_summary(summary, overflow)
+
+
+def _split_turns(messages: list) -> list[list]:
+    """Group messages into turns, each starting at a user message."""
+    turns: list[list] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _flatten(turns: list[list]) -> list:
+    return [message for turn in turns for message in turn]
+
+
+def _truncate_tool_message(message: ToolMessage, limit: int) -> ToolMessage:
+    dropped = len(message.content) - limit
+    return message.model_copy(update={
+        "content": message.content[:limit] + f"\n... [{dropped} more characters omitted]"
+    })
+
+
+def _describe(message) -> str:
+    """One transcript line for the summarizer (tool payloads left out)."""
+    if isinstance(message, HumanMessage):
+        return f"User: {content_text(message.content).strip()}"
+    if isinstance(message, AIMessage):
+        text = content_text(message.content).strip()
+        if text:
+            return f"Assistant: {text}"
+        names = ", ".join(call["name"] for call in message.tool_calls)
+        return f"Assistant called: {names}" if names else ""
+    return ""
+
+
+def _extractive_summary(summary: str, overflow: list, limit: int = 2000) -> str:
+    """Summary without an LLM: user requests and clipped assistant answers."""
+    lines = [summary] if summary else []
+    for message in overflow:
+        line = _describe(message)
+        if line and not line.startswith("Assistant called"):
+            lines.append(line[:300])
+    # Keep the most recent part if it grows too long
+    return "\n".join(lines)[-limit:]
@@ -0,0 +1,28 @@
+"""
+Messages - Plain text of LangChain message content.
+
+Chat models return content either as a string or as a list of parts
+(text parts as {"type": "text", "text": ...}, alongside tool calls and
+other non-text parts). Everything that reads model output as text goes
+through content_text so the parts are flattened the same way everywhere.
+"""
+
+
+def content_text(content) -> str:
+    """
+    Text of a message content, which may be a string or a list of parts.
+
+    Text parts (strings, or dicts with a "text" key) are joined with
+    spaces; other parts are skipped. The result is not stripped, so
+    streamed chunks keep their surrounding whitespace.
+    """
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = [
+            part if isinstance(part, str) else part["text"]
+            for part in content
+            if isinstance(part, str) or (isinstance(part, dict) and "text" in part)
+        ]
+        return " ".join(parts)
+    return ""
@@ -0,0 +1,257 @@
+"""
+Response Cache - Reuse agent answers while the underlying data is unchanged.
+
+Answers are keyed on the account, the normalized user message, a digest of
+the recent conversation and the date. Each entry remembers which tools the answer
+used and a fingerprint of their data (Gmail historyId, calendar event
+etags). A lookup recomputes that fingerprint and only returns the answer
+if it still matches, so a new email or an edited event invalidates it.
+
+Two backends, selected with RESPONSE_CACHE:
+- memory (default): LRU dictionary per process
+- disk: SQLite file shared by every worker and kept across restarts
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from tools import current_user_id
+from utils.config import get_data_dir, env_int, env_float
+from .messages import content_text
+from .router import normalize
+
+# User messages from the conversation so far that are part of the key
+HISTORY_DIGEST_TURNS = 3
+
+
+class MemoryResponseStore:
+    """Least recently used in-memory entries."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: dict):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskResponseStore:
+    """SQLite-backed entries, evicted least recently used first."""
+
+    def __init__(self, db_path: str, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                entry TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_used ON responses (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT entry FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+
+    def put(self, key: str, entry: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, entry, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(entry), time.time())
+            )
+            self._conn.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """Agent answers validated against a fingerprint of their source data."""
+
+    def __init__(self, store, fingerprint, ttl: float = 3600.0, version: str = ""):
+        """
+        Args:
+            store: MemoryResponseStore or DiskResponseStore
+            fingerprint: Function mapping tool names to a data fingerprint
+                (None when their data cannot be fingerprinted)
+            ttl: Seconds an answer is kept even if the data is unchanged
+            version: Mixed into every key; change it to drop old answers
+                (e.g. when the system prompt or model changes)
+        """
+        self.store = store
+        self.fingerprint = fingerprint
+        self.ttl = ttl
+        self.version = version
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def key(self, user_input: str, state: dict) -> str:
+        """Cache key for a message given the thread's state before this turn.
+
+        Includes the current account, so one user's answers are never
+        served to another.
+        """
+        messages = state.get("messages", [])
+        recent = [
+            normalize(content_text(m.content)) for m in messages if isinstance(m, HumanMessage)
+        ][-HISTORY_DIGEST_TURNS:]
+        material = json.dumps([
+            self.version,
+            current_user_id(),
+            date.today().isoformat(),
+            normalize(user_input),
+            recent,
+            state.get("summary", "")
+        ])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """The cached answer if it is within its TTL and its data is unchanged."""
+        entry = self.store.get(key)
+        if entry is None:
+            self._count("misses")
+            return None
+
+        if time.time() - entry["created"] > self.ttl:
+            self.store.delete(key)
+            self._count("misses")
+            return None
+
+        try:
+            current = self.fingerprint(entry["tools"])
+        except Exception as e:
+            print(f"[WARN] Could not fingerprint {entry['tools']}: {e}")
+            current = None
+
+        if current is None or current != entry["fingerprint"]:
+            self.store.delete(key)
+            self._count("invalidations")
+            return None
+
+        self._count("hits")
+        return entry["response"]
+
+    def put(self, key: str, response: str, turn: list):
+        """
+        Cache an answer.
+
+        Args:
+            key: Key from `key()`
+            response: Final answer text
+            turn: Messages produced during the turn, used to find the tools
+                the answer depended on
+        """
+        tools = sorted({m.name for m in turn if isinstance(m, ToolMessage)})
+        if any(_is_error(m) for m in turn if isinstance(m, ToolMessage)):
+            # A failed tool call should be retried, not remembered
+            return
+
+        fingerprint = self.fingerprint(tools) if tools else ""
+        if fingerprint is None:
+            return
+
+        self.store.put(key, {
+            "response": response,
+            "tools": tools,
+            "fingerprint": fingerprint,
+            "created": time.time()
+        })
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        """Hit, miss and invalidation counters, for the health endpoint."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.invalidations
+            return {
+                "backend": type(self.store).__name__,
+                "entries": len(self.store),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def current_turn(messages: list) -> list:
+    """Messages after the last user message (the turn just completed)."""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return messages[index + 1:]
+    return list(messages)
+
+
+def create_response_cache(fingerprint, version: str = "") -> ResponseCache | None:
+    """Build the cache selected by RESPONSE_CACHE (memory, disk or off)."""
+    backend = os.getenv("RESPONSE_CACHE", "memory").lower()
+    if backend in ("off", "false", "0", "none"):
+        return None
+
+    if backend == "disk":
+        db_path = os.getenv("RESPONSE_CACHE_DB", str(get_data_dir() / "responses.db"))
+        store = DiskResponseStore(db_path, max_entries=env_int("RESPONSE_CACHE_SIZE", 2048))
+    else:
+        if backend != "memory":
+            print(f"[WARN] Unknown RESPONSE_CACHE '{backend}', using memory")
+        store = MemoryResponseStore(max_entries=env_int("RESPONSE_CACHE_SIZE", 256))
+
+    return ResponseCache(
+        store,
+        fingerprint,
+        ttl=env_float("RESPONSE_CACHE_TTL", 3600.0),
+        version=version
+    )
+
+
+def _is_error(message: ToolMessage) -> bool:
+    return isinstance(message.content, str) and message.content.startswith('{"error"')
@@ -0,0 +1,212 @@
+"""
+Intent Router - Fast path for direct data queries.
+
+Requests such as "What meetings do I have tomorrow?" map to exactly one
+tool. The router recognizes them with a few rules, calls the data function
+directly and renders the answer from a template (or with one formatting
+LLM call), skipping the ReAct loop and its two or more model round trips.
+Anything that needs reasoning, or matches more than one intent, falls
+through to the full agent.
+"""
+
+import re
+import threading
+
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from tools import (
+    fetch_unread_emails, fetch_search_results,
+    fetch_today_events, fetch_tomorrow_events, fetch_week_events,
+    run_google_io
+)
+from tools.formatting import render_records
+from .messages import content_text
+from .prompts import SYSTEM_PROMPT
+from .telemetry import ROUTER_TAG
+
+_CALENDAR = r"\b(meetings?|events?|calendar|schedule|agenda|appointments?)\b"
+_EMAIL = r"\b(e-?mails?|inbox|mail|messages)\b"
+
+# Words that signal the user wants reasoning, not a plain listing
+_NEEDS_AGENT = re.compile(
+    r"\b(plan|prioriti[sz]e|suggest|recommend|conflicts?|overlap\w*|free|busy|urgent|"
+    r"important|summari[sz]e|draft|reply|respond|why|should|focus|prepare|"
+    r"and|or|but|then|also|except|before|after|between)\b"
+)
+
+FORMAT_PROMPT = """Answer the user's request using only the data below.
+Be brief and format for easy scanning.
+
+Request: {request}
+
+Data:
+{data}"""
+
+
+def _render_events(title: str, empty: str):
+    def render(events: list[dict]) -> str:
+        if not events:
+            return empty
+        lines = []
+        for event in events:
+            line = f"- **{event['time']}** — {event['summary']}"
+            if event.get("location"):
+                line += f" ({event['location']})"
+            lines.append(line)
+        return f"{title}\n\n" + "\n".join(lines)
+    return render
+
+
+def _render_emails(title: str, empty: str):
+    def render(emails: list[dict]) -> str:
+        emails = [email for email in emails if "error" not in email]
+        if not emails:
+            return empty
+        lines = []
+        for email in emails:
+            lines.append(f"- **{email.get('subject') or '(no subject)'}** — {email.get('from', '')}")
+            if email.get("snippet"):
+                lines.append(f"  {email['snippet'][:160]}")
+        return title.format(count=len(emails)) + "\n\n" + "\n".join(lines)
+    return render
+
+
+class Intent:
+    """A direct query answered by one data function."""
+
+    def __init__(self, name: str, pattern: str, tool: str, fetch, render, args=None, fields=None):
+        """
+        Args:
+            name: Intent name, used in logs and stats
+            pattern: Regex matched against the normalized request
+            tool: Name of the equivalent agent tool
+            fetch: Data function returning records
+            render: Template turning records into the reply
+            args: Optional function mapping the regex match to fetch kwargs
+            fields: Record fields given to the formatting LLM call
+        """
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.tool = tool
+        self.fetch = fetch
+        self.render = render
+        self.args = args or (lambda match: {})
+        self.fields = fields or ["time", "summary", "location"]
+
+
+INTENTS = [
+    Intent(
+        "tomorrow_events", _CALENDAR + r".*\btomorrow\b|\btomorrow'?s?\b.*" + _CALENDAR,
+        "get_tomorrow_events", fetch_tomorrow_events,
+        _render_events("Here's your calendar for tomorrow:", "You have no events scheduled for tomorrow.")
+    ),
+    Intent(
+        "today_events", _CALENDAR + r".*\b(today|this morning|this afternoon|tonight)\b|\btoday'?s?\b.*" + _CALENDAR,
+        "get_today_events", fetch_today_events,
+        _render_events("Here's your calendar for today:", "You have no events scheduled for today.")
+    ),
+    Intent(
+        "week_events", _CALENDAR + r".*\b(this week|next 7 days|next seven days)\b|\bthis week'?s?\b.*" + _CALENDAR,
+        "get_week_events", fetch_week_events,
+        _render_events("Here's your calendar for the next 7 days:", "You have no events scheduled for this week.")
+    ),
+    Intent(
+        "unread_emails", r"\b(unread|new)\b.*" + _EMAIL + r"|\bcheck\b.*\b(e-?mails?|inbox|mail)\b",
+        "get_unread_emails", fetch_unread_emails,
+        _render_emails("Your latest unread emails ({count}):", "You have no unread emails."),
+        fields=["from", "subject", "date", "snippet"]
+    ),
+    Intent(
+        "emails_from", r"\b(e-?mails?|mail|messages)\b from (?P<sender>[\w.+-]+(@[\w-]+(\.[\w-]+)+)?)$",
+        "search_emails", fetch_search_results,
+        _render_emails("Found {count} emails:", "No matching emails found."),
+        args=lambda match: {"query": f"from:{match['sender']}"},
+        fields=["from", "subject", "date", "snippet"]
+    ),
+]
+
+
+def normalize(text: str) -> str:
+    """Lowercase, with punctuation (other than email address characters) removed."""
+    text = re.sub(r"[^\w\s@.'+-]", " ", text.lower())
+    return " ".join(text.split()).strip(" .")
+
+
+class IntentRouter:
+    """Answers single-tool requests directly; everything else goes to the agent."""
+
+    def __init__(self, llm=None, mode: str = "template"):
+        """
+        Args:
+            llm: Chat model for the formatting call (used when mode is "llm")
+            mode: "template" renders replies locally; "llm" makes one
+                formatting call with the tool data
+        """
+        self.llm = llm
+        self.mode = mode
+        self.routed: dict[str, int] = {}
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def match(self, user_input: str) -> tuple[Intent, dict] | None:
+        """The single intent a request maps to, with its fetch kwargs, or None."""
+        text = normalize(user_input)
+        if not text or _NEEDS_AGENT.search(text):
+            return None
+
+        matches = [(intent, m) for intent in INTENTS if (m := intent.pattern.search(text))]
+        if len(matches) != 1:
+            return None
+        intent, m = matches[0]
+        return intent, intent.args(m)
+
+    def answer(self, intent: Intent, args: dict, user_input: str) -> str:
+        """Fetch the intent's data and render the reply."""
+        records = intent.fetch(**args)
+        if self.mode == "llm" and self.llm is not None:
+            result = self.llm.invoke(self._format_request(intent, records, user_input), config={"tags": [ROUTER_TAG]})
+            return content_text(result.content)
+        return intent.render(records)
+
+    async def aanswer(self, intent: Intent, args: dict, user_input: str) -> str:
+        """Async version of answer."""
+        records = await run_google_io(intent.fetch, **args)
+        if self.mode == "llm" and self.llm is not None:
+            result = await self.llm.ainvoke(
+                self._format_request(intent, records, user_input),
+                config={"tags": [ROUTER_TAG]}
+            )
+            return content_text(result.content)
+        return intent.render(records)
+
+    def _format_request(self, intent: Intent, records: list[dict], user_input: str) -> list:
+        data = render_records(intent.tool, records, intent.fields, empty_message="No results")
+        return [
+            SystemMessage(content=SYSTEM_PROMPT),
+            HumanMessage(content=FORMAT_PROMPT.format(request=user_input, data=data))
+        ]
+
+    def record(self, intent: Intent | None, user_input: str):
+        """Count and log a routing decision."""
+        with self._lock:
+            if intent is None:
+                self.fallbacks += 1
+            else:
+                self.routed[intent.name] = self.routed.get(intent.name, 0) + 1
+            total = self.fallbacks + sum(self.routed.values())
+            hit_rate = (total - self.fallbacks) / total
+
+        decision = f"fast path -> {intent.tool}" if intent else "agent"
+        print(f"[INFO] Router: {decision} (hit rate {hit_rate:.0%}) for: {user_input[:80]!r}")
+
+    def stats(self) -> dict:
+        """Routing counters, for the health endpoint."""
+        with self._lock:
+            routed = sum(self.routed.values())
+            total = routed + self.fallbacks
+            return {
+                "mode": self.mode,
+                "routed": dict(self.routed),
+                "fallbacks": self.fallbacks,
+                "hit_rate": round(routed / total, 3) if total else 0.0
+            }
@@ -0,0 +1,81 @@
+"""
+Telemetry - LLM call metrics and per-turn counts.
+
+LLMMetricsHandler is attached to the chat model as a callback, so every
+model call (ReAct steps, history summaries, router formatting, briefings)
+is timed and its token usage counted, whichever code path made it.
+"""
+
+import threading
+import time
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, ToolMessage
+
+from utils.metrics import (
+    LLM_DURATION, LLM_TOKENS, ERRORS, TURNS, TURN_LLM_CALLS, TURN_TOOL_CALLS, record_timing
+)
+from .history import SUMMARY_TAG
+
+# Run tags that identify why the model was called
+ROUTER_TAG = "router_format"
+BRIEFING_TAG = "briefing"
+PURPOSE_TAGS = {SUMMARY_TAG: "summary", ROUTER_TAG: "router", BRIEFING_TAG: "briefing"}
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Records latency, token usage and errors of each model call."""
+
+    # Called in the caller's context, so the request's timing breakdown is
+    # updated even for async calls
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._started: dict[UUID, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, tags=None, **kwargs):
+        purpose = next((PURPOSE_TAGS[tag] for tag in tags or [] if tag in PURPOSE_TAGS), "agent")
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), purpose)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        purpose = self._finish(run_id)
+        if purpose is None:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(usage.get("input_tokens", 0), model=self.model, direction="input")
+                    LLM_TOKENS.inc(usage.get("output_tokens", 0), model=self.model, direction="output")
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        if self._finish(run_id) is not None:
+            ERRORS.inc(component="llm")
+
+    def _finish(self, run_id: UUID) -> str | None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return None
+        elapsed = time.perf_counter() - started[0]
+        LLM_DURATION.observe(elapsed, model=self.model, purpose=started[1])
+        record_timing("llm", elapsed)
+        return started[1]
+
+
+def record_turn(path: str, turn: list | None = None):
+    """
+    Count a chat turn.
+
+    Args:
+        path: How it was answered: "router", "cache" or "agent"
+        turn: For agent turns, the messages the turn produced
+    """
+    TURNS.inc(path=path)
+    if turn is not None:
+        TURN_LLM_CALLS.observe(sum(isinstance(m, AIMessage) for m in turn))
+        TURN_TOOL_CALLS.observe(sum(isinstance(m, ToolMessage) for m in turn))
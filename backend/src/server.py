@@ -4,66 +4,304 @@ FastAPI Server - HTTP API for the Personal Assistant Agent
 
 import os
 import sys
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+import json
+import time
+import asyncio
+import uuid
+from contextlib import asynccontextmanager, AsyncExitStack, nullcontext
+from typing import TYPE_CHECKING
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from googleapiclient.errors import HttpError
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 # Add src to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from core.agent import PersonalAssistantAgent
-from utils.auth import authenticate_google
+from utils.concurrency import ConcurrencyLimiter, QueueFullError, QueueTimeoutError
+from utils.config import env_bool, env_int, env_float
+from utils.metrics import HTTP_DURATION, ERRORS, render_metrics, start_request_timings
+
+# LangChain, LangGraph and the Google clients are imported by initialize(),
+# off the startup path, so the server is live within a fraction of a second
+if TYPE_CHECKING:
+    from core.agent import PersonalAssistantAgent
+    from core.briefing import BriefingService
+    from tools import AccountRegistry, GoogleAccount, PushManager
+    from utils.auth import CredentialManager
 
 # Load .env from backend directory
 load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env"))
 
-# Global agent instance
-agent: PersonalAssistantAgent = None
+# Global agent instance (set once initialization finishes)
+agent: "PersonalAssistantAgent" = None
+
+# Admission control for /chat (created on startup)
+chat_limiter: ConcurrencyLimiter = None
+
+# Daily briefing pipeline (created with the agent)
+briefing: "BriefingService" = None
+
+# Keeps the Google OAuth token fresh (created on startup)
+credential_manager: "CredentialManager" = None
+
+# Per-user Google accounts (multi-account mode only)
+accounts: "AccountRegistry" = None
+
+# Gmail/Calendar change notifications (PUSH_NOTIFICATIONS only)
+push: "PushManager" = None
+
+# Initialization progress, reported by /health
+startup = {
+    "phase": "starting",
+    "started_at": time.monotonic(),
+    "ready_after": None,
+    "error": None
+}
+
+
+# Cookie carrying the conversation ID when the client does not send one
+SESSION_COOKIE = "assistant_session"
 
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: str | None = Field(default=None, max_length=128)
 
 
 class ChatResponse(BaseModel):
     response: str
+    session_id: str
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Initialize agent on startup."""
-    global agent
-    
-    print("[INFO] Starting Personal Assistant Server...")
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that closes an exit stack (e.g. holding a limiter
+    slot) once the response ends, however it ends: finished, failed, the
+    client disconnected, or the body was never iterated.
+    """
     
-    # Authenticate with Google
-    google_creds = authenticate_google()
-    if not google_creds:
-        print("[ERROR] Failed to authenticate with Google")
-        raise RuntimeError("Google authentication failed")
+    def __init__(self, content, stack: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.stack = stack
     
-    print("[OK] Google authentication successful")
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.stack.aclose()
+
+
+class ResetRequest(BaseModel):
+    session_id: str | None = Field(default=None, max_length=128)
+
+
+def resolve_session(http_request: Request, session_id: str | None) -> str:
+    """Session from the request body, then the cookie, else a new one."""
+    return session_id or http_request.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex
+
+
+def set_session_cookie(response: Response, session_id: str):
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+
+
+def request_user(http_request: Request) -> str | None:
+    """
+    User ID from the ACCOUNT_HEADER in multi-account mode, else None.
     
-    # Get Gemini API key
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    if not gemini_api_key:
-        print("[ERROR] GEMINI_API_KEY not found in .env")
-        raise RuntimeError("GEMINI_API_KEY not configured")
+    The header must be set by an authenticating proxy in front of the
+    server; it is trusted as-is.
+    """
+    if not env_bool("MULTI_ACCOUNT", False):
+        return None
+    user_id = http_request.headers.get(os.getenv("ACCOUNT_HEADER", "X-User-Id"), "").strip()
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Missing user ID header")
+    return user_id
+
+
+async def resolve_account(http_request: Request) -> "GoogleAccount | None":
+    """The request's Google account (None in single-user mode)."""
+    user_id = request_user(http_request)
+    if user_id is None:
+        return None
     
-    # Initialize agent
-    agent = PersonalAssistantAgent(
+    from tools import UnknownAccountError, run_google_io
+    try:
+        account = await run_google_io(accounts.get, user_id)
+    except UnknownAccountError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if push:
+        push.ensure_watched(account)
+    return account
+
+
+def account_scope(account: "GoogleAccount | None"):
+    """Context in which tools use the request's account."""
+    if account is None:
+        return nullcontext()
+    from tools import use_account
+    return use_account(account)
+
+
+def agent_thread(account: "GoogleAccount | None", session_id: str) -> str:
+    """Agent thread ID: sessions are namespaced per user."""
+    return f"{account.user_id}:{session_id}" if account else session_id
+
+
+# Tasks cancelled on shutdown
+background_tasks: list[asyncio.Task] = []
+
+
+def _build_agent(gemini_api_key: str, google_creds) -> "PersonalAssistantAgent":
+    """Import and construct the agent (runs in a worker thread)."""
+    from core.agent import PersonalAssistantAgent
+    return PersonalAssistantAgent(
         gemini_api_key=gemini_api_key,
         google_creds=google_creds
     )
+
+
+async def maintain_accounts(registry: "AccountRegistry", interval: float = 60.0):
+    """Refresh tokens that are about to expire and evict idle accounts."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(registry.refresh_due)
+            await asyncio.to_thread(registry.evict_idle)
+        except Exception as e:
+            print(f"[WARN] Account maintenance failed: {e}")
+
+
+async def initialize():
+    """
+    Authenticate, build the agent graph and start background jobs.
+    
+    In fast-start mode this runs as a background task after the server is
+    already accepting connections; /health reports it as not ready until
+    it finishes.
+    """
+    global agent, briefing, credential_manager, accounts, push
+    
+    try:
+        startup["phase"] = "authenticating"
+        if env_bool("MULTI_ACCOUNT", False):
+            # Each request brings its own account, loaded from the token store
+            from tools import create_account_registry
+            accounts = create_account_registry()
+            google_creds = None
+            background_tasks.append(asyncio.create_task(maintain_accounts(accounts)))
+            print(f"[OK] Multi-account mode (tokens in {accounts.token_store.directory})")
+        else:
+            from utils.auth import authenticate_google, CredentialManager
+            google_creds = await asyncio.to_thread(authenticate_google)
+            if not google_creds:
+                print("[ERROR] Failed to authenticate with Google")
+                raise RuntimeError("Google authentication failed")
+            
+            print("[OK] Google authentication successful")
+            
+            # Refresh the token in the background before it expires, rather
+            # than inside whichever API request notices first
+            credential_manager = CredentialManager(
+                google_creds,
+                refresh_margin=env_float("TOKEN_REFRESH_MARGIN", 600.0)
+            )
+            google_creds = credential_manager.credentials
+            background_tasks.append(asyncio.create_task(credential_manager.run()))
+        
+        # Get Gemini API key
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if not gemini_api_key:
+            print("[ERROR] GEMINI_API_KEY not found in .env")
+            raise RuntimeError("GEMINI_API_KEY not configured")
+        
+        # Initialize agent
+        startup["phase"] = "building agent"
+        new_agent = await asyncio.to_thread(_build_agent, gemini_api_key, google_creds)
+        
+        print("[OK] Agent initialized")
+        
+        from core.briefing import BriefingService, parse_schedule
+        briefing = BriefingService(
+            new_agent.llm,
+            max_age=env_float("BRIEFING_MAX_AGE", 3600.0)
+        )
+        if os.getenv("BRIEFING_SCHEDULE") and accounts:
+            print("[WARN] BRIEFING_SCHEDULE is ignored in multi-account mode")
+        elif os.getenv("BRIEFING_SCHEDULE"):
+            # Fail at startup rather than in a background task nobody watches
+            parse_schedule(os.getenv("BRIEFING_SCHEDULE"))
+            background_tasks.append(
+                asyncio.create_task(briefing.run_schedule(os.getenv("BRIEFING_SCHEDULE")))
+            )
+            print(f"[OK] Daily briefing scheduled at {os.getenv('BRIEFING_SCHEDULE')}")
+        
+        from tools.schedule import ScheduleConfigError, working_days, working_hours
+        try:
+            working_hours()
+            working_days()
+        except ScheduleConfigError as e:
+            print(f"[WARN] analyze_schedule will fail until this is fixed: {e}")
+        
+        from tools import create_push_manager, current_account, run_google_io
+        push = create_push_manager(accounts)
+        if push:
+            # Accounts are watched on first use in multi-account mode
+            if not accounts:
+                background_tasks.append(asyncio.create_task(run_google_io(push.watch, current_account())))
+            background_tasks.append(asyncio.create_task(push.run()))
+            print(f"[OK] Push notifications on ({push.mode}: {', '.join(push.sources)})")
+        
+        agent = new_agent
+        startup["phase"] = "ready"
+        startup["ready_after"] = round(time.monotonic() - startup["started_at"], 3)
+        print(f"[OK] Agent ready after {startup['ready_after']:.2f}s")
+        
+    except Exception as e:
+        startup["phase"] = "failed"
+        startup["error"] = str(e)
+        raise
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the server, initializing the agent in the background in fast-start mode."""
+    global chat_limiter
+    
+    print("[INFO] Starting Personal Assistant Server...")
+    
+    chat_limiter = ConcurrencyLimiter(
+        max_concurrency=env_int("CHAT_MAX_CONCURRENCY", 4),
+        max_queue=env_int("CHAT_MAX_QUEUE", 16),
+        queue_timeout=env_float("CHAT_QUEUE_TIMEOUT", 30.0)
+    )
     
-    print("[OK] Agent initialized")
-    print("[OK] Server ready at http://localhost:8000")
+    if env_bool("FAST_START", True):
+        task = asyncio.create_task(initialize())
+        task.add_done_callback(_report_startup_failure)
+        background_tasks.append(task)
+        print("[OK] Server live at http://localhost:8000 (agent starting in background)")
+    else:
+        await initialize()
+        print("[OK] Server ready at http://localhost:8000")
     
     yield
     
     print("[INFO] Shutting down...")
+    for task in background_tasks:
+        task.cancel()
+    if push:
+        # Otherwise Google keeps notifying until the channels expire
+        from tools import run_google_io
+        await run_google_io(push.stop_all)
+
+
+def _report_startup_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        print(f"[ERROR] Agent initialization failed: {task.exception()}")
 
 
 app = FastAPI(
@@ -80,69 +318,295 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Time every request and, with TIMING_HEADER, return a Server-Timing
+    breakdown of the time spent in LLM calls, tools and Google API requests.
+    
+    Streaming responses are measured until their headers are sent.
+    """
+    timings = start_request_timings()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        HTTP_DURATION.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status
+        )
+        if status >= 500:
+            ERRORS.inc(component="http")
+    
+    if env_bool("TIMING_HEADER", False):
+        response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
+
+def _startup_status() -> dict:
+    status = dict(startup)
+    del status["started_at"]
+    if agent is None and startup["error"] is None:
+        status["elapsed"] = round(time.monotonic() - startup["started_at"], 3)
+    return status
+
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy", "agent_ready": agent is not None}
+    """
+    Health check endpoint.
+    
+    `status` is liveness (the process is serving requests); `ready` tells
+    whether the agent has finished initializing and can take chat traffic.
+    """
+    tool_cache = None
+    if agent:
+        from tools import tool_cache_stats
+        tool_cache = tool_cache_stats()
+    
+    return {
+        "status": "healthy",
+        "ready": agent is not None,
+        "agent_ready": agent is not None,
+        "startup": _startup_status(),
+        "chat": chat_limiter.stats() if chat_limiter else None,
+        "sessions": agent.session_stats() if agent else None,
+        "router": agent.router_stats() if agent else None,
+        "response_cache": agent.response_cache_stats() if agent else None,
+        "credentials": credential_manager.stats() if credential_manager else None,
+        "accounts": accounts.stats() if accounts else None,
+        "push": push.stats() if push else None,
+        "tool_cache": tool_cache
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: latency histograms and counters."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: 200 as long as the process is serving requests."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: 200 once the agent is initialized, 503 before."""
+    if agent is None:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "not ready", "startup": _startup_status()},
+            headers={"Retry-After": "2"}
+        )
+    return {"status": "ready", "startup": _startup_status()}
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request, http_response: Response):
     """
     Process a chat message and return the agent's response.
+    
+    The conversation is chosen by `session_id` in the body or the session
+    cookie; a new session is started when neither is present.
+    """
+    if not agent:
+        raise HTTPException(status_code=503, detail="Agent not initialized", headers={"Retry-After": "2"})
+    
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    session_id = resolve_session(http_request, request.session_id)
+    account = await resolve_account(http_request)
+    
+    try:
+        async with chat_limiter.slot():
+            with account_scope(account):
+                response = await agent.aprocess_request(request.message, agent_thread(account, session_id))
+        set_session_cookie(http_response, session_id)
+        return ChatResponse(response=response, session_id=session_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except QueueTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Process a chat message and stream progress as Server-Sent Events.
+    
+    Each event is a JSON object: `token` events carry LLM text as it is
+    generated, `tool_start`/`tool_end` report tool progress, and a final
+    `done` event carries the complete response.
     """
     if not agent:
-        raise HTTPException(status_code=503, detail="Agent not initialized")
+        raise HTTPException(status_code=503, detail="Agent not initialized", headers={"Retry-After": "2"})
     
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
+    session_id = resolve_session(http_request, request.session_id)
+    account = await resolve_account(http_request)
+    
+    # Take the slot before responding so overload still maps to 429/503;
+    # the response releases it when it ends, even if the stream never starts.
+    stack = AsyncExitStack()
+    try:
+        await stack.enter_async_context(chat_limiter.slot())
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except QueueTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
+    async def event_stream():
+        with account_scope(account):
+            async for event in agent.astream_request(request.message, agent_thread(account, session_id)):
+                if event["type"] == "done":
+                    event["session_id"] = session_id
+                yield f"data: {json.dumps(event)}\n\n"
+    
+    try:
+        response = ReleasingStreamingResponse(
+            event_stream(),
+            stack,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        set_session_cookie(response, session_id)
+    except BaseException:
+        await stack.aclose()
+        raise
+    return response
+
+
+@app.get("/briefing")
+async def get_briefing(http_request: Request, refresh: bool = False):
+    """
+    Return today's briefing (calendar + unread emails, one LLM call).
+    
+    Served from cache when fresh; pass refresh=true to regenerate.
+    """
+    if not briefing:
+        raise HTTPException(status_code=503, detail="Agent not initialized", headers={"Retry-After": "2"})
+    
+    account = await resolve_account(http_request)
+    with account_scope(account):
+        if not refresh and (cached := briefing.cached()):
+            return {**cached, "cached": True}
+    
     try:
-        response = agent.process_request(request.message)
-        return ChatResponse(response=response)
+        async with chat_limiter.slot():
+            with account_scope(account):
+                result = await briefing.get(refresh=refresh)
+        return {**result, "cached": False}
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except QueueTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/emails")
-async def get_emails():
+async def get_emails(http_request: Request, refresh: bool = False):
     """Return raw unread emails from Gmail (bypass agent)."""
     if not agent:
-        raise HTTPException(status_code=503, detail="Agent not initialized")
+        raise HTTPException(status_code=503, detail="Agent not initialized", headers={"Retry-After": "2"})
     
+    account = await resolve_account(http_request)
     try:
-        from tools import get_unread_emails
-        import json
-        raw = get_unread_emails.invoke({"max_results": 10})
-        return json.loads(raw)
+        from tools import current_user_id, fetch_unread_emails, invalidate_tool_cache, run_google_io
+        with account_scope(account):
+            if refresh:
+                # Only this account's results; other users keep theirs
+                invalidate_tool_cache("fetch_unread_emails", current_user_id())
+            return await run_google_io(fetch_unread_emails, 10)
+    except HttpError as e:
+        return {"error": str(e)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/events")
-async def get_events():
+async def get_events(http_request: Request, refresh: bool = False):
     """Return raw today's calendar events (bypass agent)."""
     if not agent:
-        raise HTTPException(status_code=503, detail="Agent not initialized")
+        raise HTTPException(status_code=503, detail="Agent not initialized", headers={"Retry-After": "2"})
     
+    account = await resolve_account(http_request)
     try:
-        from tools import get_today_events
-        import json
-        raw = get_today_events.invoke({})
-        return json.loads(raw)
+        from tools import current_user_id, fetch_today_events, invalidate_tool_cache, run_google_io
+        with account_scope(account):
+            if refresh:
+                invalidate_tool_cache("fetch_today_events", current_user_id())
+            events = await run_google_io(fetch_today_events)
+        return events or {"message": "No events scheduled for today"}
+    except HttpError as e:
+        return {"error": str(e)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/webhooks/gmail", status_code=204)
+async def gmail_webhook(http_request: Request, token: str = ""):
+    """
+    Gmail change notification, pushed by the Pub/Sub subscription of
+    GMAIL_PUBSUB_TOPIC (configured with ?token=PUSH_TOKEN).
+    
+    Answers 204 for anything that was understood, so Pub/Sub does not
+    redeliver it.
+    """
+    if push is None:
+        raise HTTPException(status_code=404, detail="Push notifications are disabled")
+    try:
+        payload = await http_request.json()
+        push.handle_gmail(token, payload)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(status_code=204)
+
+
+@app.post("/webhooks/calendar")
+async def calendar_webhook(http_request: Request):
+    """Calendar change notification, from a channel opened with events.watch."""
+    if push is None:
+        raise HTTPException(status_code=404, detail="Push notifications are disabled")
+    headers = http_request.headers
+    try:
+        push.handle_calendar(
+            headers.get("X-Goog-Channel-ID", ""),
+            headers.get("X-Goog-Channel-Token", ""),
+            headers.get("X-Goog-Resource-State", "")
+        )
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    return Response(status_code=200)
+
+
 @app.post("/reset")
-async def reset_conversation():
-    """Reset the conversation history."""
+async def reset_conversation(http_request: Request, request: ResetRequest | None = None):
+    """Reset the conversation history for a session."""
+    session_id = resolve_session(http_request, request.session_id if request else None)
+    user_id = request_user(http_request)
     if agent:
-        agent.reset_conversation()
-    return {"status": "conversation reset"}
+        agent.reset_conversation(f"{user_id}:{session_id}" if user_id else session_id)
+    return {"status": "conversation reset", "session_id": session_id}
 
 
 if __name__ == "__main__":
@@ -2,14 +2,68 @@
 Tools Package - Clean exports for all LangChain tools.
 """
 
-from .gmail import get_unread_emails, search_emails, init_gmail_service
-from .calendar import get_today_events, get_week_events, get_tomorrow_events, init_calendar_service
+from .gmail import (
+    get_unread_emails, search_emails, get_urgent_emails,
+    fetch_unread_emails, fetch_search_results, fetch_urgent_emails, mailbox_fingerprint
+)
+from .calendar import (
+    get_today_events, get_week_events, get_tomorrow_events, get_events_between,
+    analyze_schedule, fetch_today_events, fetch_week_events, fetch_tomorrow_events,
+    fetch_events_between, fetch_schedule_analysis, calendar_fingerprint
+)
+from .accounts import (
+    GoogleAccount, AccountRegistry, UnknownAccountError,
+    create_account_registry, set_default_account, current_account, current_user_id, use_account
+)
+from .clients import run_google_io
+from .cache import configure_tool_cache, invalidate_tool_cache, tool_cache_stats
+from .push import PushManager, create_push_manager
 
 
-def init_google_services(credentials):
-    """Initialize all Google API services with credentials."""
-    init_gmail_service(credentials)
-    init_calendar_service(credentials)
+def init_google_services(credentials=None):
+    """
+    Initialize the Google API services.
+    
+    Args:
+        credentials: Google OAuth credentials for single-user mode; in
+            multi-account mode (None) accounts are built per request
+    """
+    configure_tool_cache()
+    if credentials is not None:
+        set_default_account(GoogleAccount(None, credentials))
+
+
+# Data source each tool reads, for fingerprinting cached answers
+TOOL_SOURCES = {
+    "get_unread_emails": "gmail",
+    "search_emails": "gmail",
+    "get_urgent_emails": "gmail",
+    "get_today_events": "calendar",
+    "get_week_events": "calendar",
+    "get_tomorrow_events": "calendar",
+}
+
+_FINGERPRINTS = {
+    "gmail": mailbox_fingerprint,
+    "calendar": calendar_fingerprint,
+}
+
+
+def data_fingerprint(tool_names) -> str | None:
+    """
+    Fingerprint of the data behind a set of tools.
+    
+    Args:
+        tool_names: Tools an answer was based on
+        
+    Returns:
+        A string that changes whenever any of their data sources change,
+        or None if a tool's data cannot be fingerprinted
+    """
+    if any(name not in TOOL_SOURCES for name in tool_names):
+        return None
+    sources = sorted({TOOL_SOURCES[name] for name in tool_names})
+    return ";".join(f"{source}={_FINGERPRINTS[source]()}" for source in sources)
 
 
 def get_all_tools():
@@ -18,10 +72,13 @@ def get_all_tools():
         # Gmail tools
         get_unread_emails,
         search_emails,
+        get_urgent_emails,
         # Calendar tools
         get_today_events,
         get_week_events,
-        get_tomorrow_events
+        get_tomorrow_events,
+        get_events_between,
+        analyze_schedule
     ]
 
 
@@ -30,11 +87,35 @@ __all__ = [
     # Initialization
     "init_google_services",
     "get_all_tools",
+    # Accounts
+    "GoogleAccount",
+    "AccountRegistry",
+    "UnknownAccountError",
+    "create_account_registry",
+    "current_user_id",
+    "use_account",
+    # Caching
+    "invalidate_tool_cache",
+    "tool_cache_stats",
+    # Raw records (for the REST endpoints)
+    "run_google_io",
+    "fetch_unread_emails",
+    "fetch_search_results",
+    "fetch_urgent_emails",
+    "fetch_today_events",
+    "fetch_week_events",
+    "fetch_tomorrow_events",
+    "fetch_events_between",
+    "fetch_schedule_analysis",
+    "data_fingerprint",
     # Gmail
     "get_unread_emails",
     "search_emails",
+    "get_urgent_emails",
     # Calendar
     "get_today_events",
     "get_week_events",
-    "get_tomorrow_events"
+    "get_tomorrow_events",
+    "get_events_between",
+    "analyze_schedule"
 ]
@@ -0,0 +1,282 @@
+"""
+Accounts - Per-user Google API clients.
+
+A GoogleAccount bundles one user's Gmail and Calendar clients with their
+local mirror and event store. Tools find the account for the request in
+progress through a context variable, so the same tool functions and the
+same agent graph can serve many users.
+
+In single-user mode the account built at startup is the default. In
+multi-account mode an AccountRegistry loads each user's token from a
+TokenStore on first use and keeps built accounts in an LRU cache with
+idle eviction.
+"""
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable
+
+from utils.config import get_data_dir, env_bool, env_int, env_float
+
+
+class GoogleAccount:
+    """Google API clients and local caches for one user."""
+
+    def __init__(self, user_id: str | None, credentials, credential_manager=None):
+        """
+        Args:
+            user_id: Account identifier (None for the single-user default)
+            credentials: Google OAuth credentials for this user
+            credential_manager: Optional CredentialManager that refreshes
+                and persists `credentials`
+        """
+        from .gmail import create_gmail_clients
+        from .calendar import create_calendar_clients
+
+        self.user_id = user_id
+        self.credentials = credentials
+        self.credential_manager = credential_manager
+        self.gmail, self.mirror = create_gmail_clients(credentials, storage_name(user_id), user_id)
+        self.calendar, self.event_store = create_calendar_clients(credentials, user_id)
+        self.last_used = time.monotonic()
+
+
+def storage_name(user_id: str | None) -> str | None:
+    """Unique file name stem for a user's local state (None stays None)."""
+    if user_id is None:
+        return None
+    from utils.auth import user_file_stem
+    return user_file_stem(user_id)
+
+
+# ----------------------------------------------------------------------
+# Current account
+# ----------------------------------------------------------------------
+
+_default_account: GoogleAccount | None = None
+_current_account: contextvars.ContextVar[GoogleAccount | None] = contextvars.ContextVar(
+    "current_account", default=None
+)
+
+
+def set_default_account(account: GoogleAccount | None):
+    """Account used when no per-request account is set (single-user mode)."""
+    global _default_account
+    _default_account = account
+
+
+def current_account() -> GoogleAccount | None:
+    """The account of the request in progress, else the default account."""
+    return _current_account.get() or _default_account
+
+
+def current_user_id() -> str | None:
+    """ID of the current account (None for the default account)."""
+    account = current_account()
+    return account.user_id if account else None
+
+
+@contextmanager
+def use_account(account: GoogleAccount):
+    """Run tools against `account` within the block."""
+    account.last_used = time.monotonic()
+    token = _current_account.set(account)
+    try:
+        yield account
+    finally:
+        _current_account.reset(token)
+
+
+# ----------------------------------------------------------------------
+# Multi-account registry
+# ----------------------------------------------------------------------
+
+class UnknownAccountError(LookupError):
+    """No stored token for the requested user."""
+
+
+class AccountRegistry:
+    """
+    Builds accounts from a token store and caches them.
+
+    Accounts idle for longer than `idle_ttl` are evicted, as are the least
+    recently used ones once there are more than `max_accounts`. Concurrent
+    first requests for the same user build the account only once.
+    Components holding per-account state (e.g. push watches) register an
+    eviction hook to release it.
+    """
+
+    def __init__(self, token_store, max_accounts: int = 256, idle_ttl: float = 1800.0, refresh_margin: float = 600.0):
+        """
+        Args:
+            token_store: TokenStore holding each user's OAuth token
+            max_accounts: Maximum number of accounts kept built
+            idle_ttl: Seconds without use before an account is evicted
+            refresh_margin: Refresh a token this many seconds before expiry
+        """
+        self.token_store = token_store
+        self.max_accounts = max_accounts
+        self.idle_ttl = idle_ttl
+        self.refresh_margin = refresh_margin
+
+        self._accounts: OrderedDict[str, GoogleAccount] = OrderedDict()
+        self._building: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._eviction_hooks: list[Callable[[GoogleAccount], None]] = []
+
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def get(self, user_id: str) -> GoogleAccount:
+        """
+        The built account for a user, creating it on first use.
+
+        Raises:
+            UnknownAccountError: If the token store has no token for the user
+        """
+        with self._lock:
+            account = self._accounts.get(user_id)
+            if account is not None:
+                self._accounts.move_to_end(user_id)
+                self.hits += 1
+            else:
+                build_lock = self._building.setdefault(user_id, threading.Lock())
+
+        if account is None:
+            try:
+                with build_lock:
+                    with self._lock:
+                        account = self._accounts.get(user_id)
+                    if account is None:
+                        account = self._build(user_id)
+            finally:
+                with self._lock:
+                    # Waiters already hold the lock object; later misses make a new one
+                    if self._building.get(user_id) is build_lock:
+                        del self._building[user_id]
+
+        account.last_used = time.monotonic()
+        manager = account.credential_manager
+        if manager and manager.needs_refresh():
+            # Refresh before the request's API calls rather than inside one
+            manager.refresh()
+        return account
+
+    def peek(self, user_id: str) -> GoogleAccount | None:
+        """
+        The built account for a user, or None if it is not cached.
+
+        Unlike get, never builds an account and does not count as use, so
+        background work (e.g. push notifications) does not keep idle
+        accounts alive.
+        """
+        with self._lock:
+            return self._accounts.get(user_id)
+
+    def on_evict(self, hook: Callable[[GoogleAccount], None]):
+        """
+        Call `hook(account)` for every account the registry evicts.
+
+        Hooks run in the evicting thread, outside the registry lock, and
+        may block.
+        """
+        self._eviction_hooks.append(hook)
+
+    def _build(self, user_id: str) -> GoogleAccount:
+        from utils.auth import CredentialManager
+
+        credentials = self.token_store.load(user_id)
+        if credentials is None:
+            raise UnknownAccountError(f"No Google account connected for user '{user_id}'")
+
+        manager = CredentialManager(
+            credentials,
+            token_file=self.token_store.path(user_id),
+            refresh_margin=self.refresh_margin
+        )
+        account = GoogleAccount(user_id, manager.credentials, manager)
+
+        with self._lock:
+            self._accounts[user_id] = account
+            self.builds += 1
+            evicted = self._evict(keep=user_id)
+        print(f"[INFO] Built Google clients for account '{user_id}'")
+        self._evicted(evicted)
+        return account
+
+    def _evict(self, keep: str) -> list[GoogleAccount]:
+        """
+        Remove idle, then least recently used accounts. Caller holds the lock
+        and passes the result to _evicted once it has released it.
+
+        Requests still running with an evicted account keep using it; its
+        clients and mirror connection are released once they finish.
+        """
+        evicted = []
+        cutoff = time.monotonic() - self.idle_ttl
+        for user_id, account in list(self._accounts.items()):
+            if user_id != keep and account.last_used < cutoff:
+                evicted.append(self._accounts.pop(user_id))
+        while len(self._accounts) > self.max_accounts:
+            victim = next((u for u in self._accounts if u != keep), None)
+            if victim is None:
+                break
+            evicted.append(self._accounts.pop(victim))
+        self.evictions += len(evicted)
+        return evicted
+
+    def _evicted(self, accounts: list[GoogleAccount]):
+        """Run the eviction hooks for accounts just evicted."""
+        for account in accounts:
+            for hook in self._eviction_hooks:
+                try:
+                    hook(account)
+                except Exception as e:
+                    print(f"[WARN] Eviction hook failed for account '{account.user_id}': {e}")
+
+    def evict_idle(self):
+        """Drop accounts that have been idle longer than idle_ttl (blocking: runs the eviction hooks)."""
+        with self._lock:
+            evicted = self._evict(keep="")
+        self._evicted(evicted)
+
+    def refresh_due(self):
+        """Refresh tokens of cached accounts that are close to expiring."""
+        with self._lock:
+            managers = [a.credential_manager for a in self._accounts.values() if a.credential_manager]
+        for manager in managers:
+            try:
+                manager.refresh()
+            except Exception:
+                # Counted in the manager's failures; retried on next use
+                pass
+
+    def stats(self) -> dict:
+        """Cache counters, for the health endpoint."""
+        with self._lock:
+            return {
+                "accounts": len(self._accounts),
+                "max_accounts": self.max_accounts,
+                "idle_ttl": self.idle_ttl,
+                "hits": self.hits,
+                "builds": self.builds,
+                "evictions": self.evictions
+            }
+
+
+def create_account_registry() -> AccountRegistry | None:
+    """Registry for multi-account mode (MULTI_ACCOUNT), else None."""
+    if not env_bool("MULTI_ACCOUNT", False):
+        return None
+
+    from utils.auth import TokenStore
+    return AccountRegistry(
+        TokenStore(get_data_dir() / "tokens"),
+        max_accounts=env_int("ACCOUNT_CACHE_SIZE", 256),
+        idle_ttl=env_float("ACCOUNT_IDLE_TTL", 1800.0),
+        refresh_margin=env_float("TOKEN_REFRESH_MARGIN", 600.0)
+    )
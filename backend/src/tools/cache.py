@@ -0,0 +1,193 @@
+"""
+Tool Cache - Shared TTL cache for tool results.
+
+Results are keyed by tool name, account and arguments, expire after a per-tool
+TTL and are evicted least recently used first. Concurrent calls with the
+same key are coalesced so only one reaches the Google API. Callers get
+their own copy of a cached result, so they can change it freely.
+"""
+
+import copy
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from utils.config import env_bool, env_int
+from .accounts import current_user_id
+
+# Marks an invalidation across all accounts (None is the default account)
+ALL_USERS = object()
+
+
+class _Flight:
+    """A computation in progress that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class ToolCache:
+    """Size-bounded TTL cache with single-flight deduplication."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+
+        # key -> (expires_at, value), least recently used first
+        self._entries: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+        self._inflight: dict[tuple, _Flight] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(
+        self,
+        key: tuple,
+        ttl: float,
+        compute: Callable[[], str],
+        cacheable: Callable[[str], bool] = lambda value: True
+    ) -> str:
+        """
+        Return the cached value for key, or compute it.
+
+        If another thread is already computing the same key, wait for its
+        result instead of starting a second computation.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                generation = self._generation
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                # Skip storing if the cache was invalidated mid-flight
+                if flight.error is None and generation == self._generation and cacheable(flight.result):
+                    self._entries[key] = (time.monotonic() + ttl, flight.result)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+
+    def invalidate(self, tool_name: str | None = None, user_id=ALL_USERS):
+        """Drop cached results for one tool (or every tool), optionally for one user."""
+        with self._lock:
+            self._generation += 1
+            if tool_name is None and user_id is ALL_USERS:
+                self._entries.clear()
+                return
+            for key in [
+                k for k in self._entries
+                if (tool_name is None or k[0] == tool_name) and (user_id is ALL_USERS or k[1] == user_id)
+            ]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        """Hit/miss counters, for the health endpoint."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0
+            }
+
+
+_cache = ToolCache()
+
+
+def configure_tool_cache():
+    """Apply TOOL_CACHE_SIZE (called once settings are loaded)."""
+    _cache.max_entries = env_int("TOOL_CACHE_SIZE", 256)
+
+
+def _is_cacheable(result) -> bool:
+    """
+    Whether a result holds no failures, which should be retried rather
+    than cached: tools report them as a '{"error": ...}' string, fetch
+    functions as {"error": ...} entries (e.g. a message that failed to
+    load from a batch) anywhere in their lists and dicts.
+    """
+    if isinstance(result, str):
+        return not result.startswith('{"error"')
+    if isinstance(result, dict):
+        return "error" not in result and all(_is_cacheable(value) for value in result.values())
+    if isinstance(result, (list, tuple)):
+        return all(_is_cacheable(item) for item in result)
+    return True
+
+
+def cached(ttl: float):
+    """
+    Cache a function's result for `ttl` seconds, per account and arguments.
+
+    Applied to the fetch_* functions the tools, router and endpoints share;
+    each call returns a deep copy of the cached result. Disabled when
+    TOOL_CACHE is false.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not env_bool("TOOL_CACHE", True):
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__name__, current_user_id(), tuple(sorted(bound.arguments.items())))
+            return copy.deepcopy(_cache.get_or_compute(
+                key, ttl, lambda: func(*args, **kwargs), _is_cacheable
+            ))
+
+        return wrapper
+    return decorator
+
+
+def invalidate_tool_cache(tool_name: str | None = None, user_id=ALL_USERS):
+    """
+    Drop cached results for one tool, or all tools when no name is given.
+
+    Args:
+        tool_name: Cached function name, e.g. "fetch_unread_emails"
+        user_id: Only drop this account's results (None is the default account)
+    """
+    _cache.invalidate(tool_name, user_id)
+
+
+def tool_cache_stats() -> dict:
+    """Hit and miss counters for the tool cache."""
+    return _cache.stats()
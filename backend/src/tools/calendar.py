@@ -4,171 +4,584 @@ Calendar Tools - Google Calendar tools for the agent.
 
 from langchain_core.tools import tool
 from googleapiclient.errors import HttpError
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import functools
+import hashlib
+import heapq
+import itertools
 import json
+import os
+import threading
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-# Global service (set during initialization)
-_calendar_service = None
+from utils.config import env_bool, env_int, env_float
+from .accounts import current_account
+from .cache import cached
+from .clients import ThreadLocalService, async_tool
+from .formatting import render_records
+from .event_store import EventStore, parse_event_time
+from .schedule import ScheduleConfigError, busy_intervals, find_conflicts, free_slots, working_windows
 
+# Longest range analyze_schedule accepts, in days
+MAX_ANALYSIS_DAYS = 31
 
-def init_calendar_service(credentials):
-    """Initialize Google Calendar API service with credentials."""
-    global _calendar_service
-    from googleapiclient.discovery import build
-    _calendar_service = build("calendar", "v3", credentials=credentials)
+# Events per page for range queries; small pages let a limited query stop early
+RANGE_PAGE_SIZE = 100
 
+# Pool that fetches the first page of every calendar at once (separate from
+# the Google I/O pool, whose workers block on it)
+_fanout_executor: ThreadPoolExecutor | None = None
+_fanout_lock = threading.Lock()
 
-@tool
-def get_today_events() -> str:
+
+def create_calendar_clients(credentials, quota_user: str | None = None) -> tuple[ThreadLocalService, EventStore | None]:
     """
-    Get all calendar events for today.
+    Calendar API service and local event store for one account.
     
+    Args:
+        credentials: Google OAuth credentials
+        quota_user: Account the requests are rate limited as
+        
     Returns:
-        JSON string containing today's events with time, summary, and location
+        (service, store); store is None when CALENDAR_STORE is off
     """
-    if not _calendar_service:
-        return json.dumps({"error": "Calendar service not initialized"})
+    # One client per thread: httplib2 transports are not thread-safe
+    service = ThreadLocalService("calendar", "v3", credentials, quota_user)
+    
+    store = None
+    if env_bool("CALENDAR_STORE", True):
+        store = EventStore(
+            service,
+            horizon_days=env_int("CALENDAR_HORIZON_DAYS", 30),
+            max_age=env_float("CALENDAR_MAX_AGE", 60.0)
+        )
+    return service, store
+
+
+def _service():
+    """Calendar service of the current account, or None if not initialized."""
+    account = current_account()
+    return account.calendar if account else None
+
+
+def _list_events(start: datetime, end: datetime) -> list[dict]:
+    """
+    Raw events overlapping [start, end), ordered by start time.
+    
+    Served from the event store when it is enabled and syncs cleanly,
+    otherwise fetched live from the Calendar API.
+    """
+    account = current_account()
+    store = account.event_store if account else None
+    if store:
+        try:
+            store.ensure_fresh(start, end)
+            return store.events_between(start, end)
+        except Exception as e:
+            print(f"[WARN] Calendar store sync failed, using live Calendar: {e}")
+    
+    # Follow nextPageToken so busy days are not cut off at the first page
+    return list(_iter_pages(functools.partial(_fetch_page, _service(), "primary", start, end, 250)))
+
+
+def _fetch_page(
+    service,
+    calendar_id: str,
+    start: datetime,
+    end: datetime,
+    page_size: int,
+    page_token: str | None = None
+) -> dict:
+    """One page of a calendar's events in [start, end), ordered by start time."""
+    return service.events().list(
+        calendarId=calendar_id,
+        timeMin=start.isoformat(),
+        timeMax=end.isoformat(),
+        singleEvents=True,
+        orderBy="startTime",
+        maxResults=page_size,
+        pageToken=page_token
+    ).execute()
+
+
+def _iter_pages(fetch_page, first_page: dict | None = None):
+    """
+    Yield events page by page, requesting the next page only when the
+    consumer gets past the current one.
+    """
+    page = first_page if first_page is not None else fetch_page()
+    while True:
+        for event in page.get("items", []):
+            if event.get("status") != "cancelled":
+                yield event
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return
+        page = fetch_page(page_token=page_token)
+
+
+def _fanout_pool() -> ThreadPoolExecutor:
+    global _fanout_executor
+    with _fanout_lock:
+        if _fanout_executor is None:
+            _fanout_executor = ThreadPoolExecutor(
+                max_workers=env_int("CALENDAR_FANOUT_THREADS", 4),
+                thread_name_prefix="calendar-fanout"
+            )
+        return _fanout_executor
+
+
+@cached(ttl=3600)
+def fetch_calendar_list() -> list[dict]:
+    """
+    Calendars to query: CALENDAR_IDS if set, otherwise every calendar the
+    user has selected in Google Calendar (own, shared and subscribed).
+    
+    Raises:
+        HttpError: If the Calendar API call fails
+    """
+    configured = os.getenv("CALENDAR_IDS", "")
+    if configured:
+        return [{"id": cid.strip(), "summary": cid.strip()} for cid in configured.split(",") if cid.strip()]
+    
+    calendars = []
+    page_token = None
+    while True:
+        result = _service().calendarList().list(pageToken=page_token).execute()
+        for entry in result.get("items", []):
+            if (entry.get("selected") or entry.get("primary")) and not entry.get("hidden"):
+                calendars.append({
+                    "id": entry["id"],
+                    "summary": "primary" if entry.get("primary") else entry.get("summary", entry["id"])
+                })
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return calendars
+
+
+def iter_events_between(start: datetime, end: datetime, calendars: list[dict]):
+    """
+    Events from several calendars in [start, end), merged by start time.
+    
+    The first page of every calendar is requested concurrently; later
+    pages are fetched lazily as the k-way merge reaches them, so a caller
+    that stops early never pulls pages it does not need.
+    
+    Yields:
+        (calendar summary, raw event) pairs in start-time order
+    """
+    # Bound to the current account's service: the pages are fetched on the
+    # fan-out pool, outside this request's context
+    service = _service()
+    fetchers = [
+        functools.partial(_fetch_page, service, calendar["id"], start, end, RANGE_PAGE_SIZE)
+        for calendar in calendars
+    ]
+    first_pages = [_fanout_pool().submit(fetch) for fetch in fetchers]
+    
+    streams = []
+    for calendar, fetch, future in zip(calendars, fetchers, first_pages):
+        try:
+            first_page = future.result()
+        except HttpError as error:
+            # One unreadable shared calendar should not hide the others
+            print(f"[WARN] Skipping calendar {calendar['summary']}: {error}")
+            continue
+        streams.append(_keyed_events(calendar["summary"], _iter_pages(fetch, first_page)))
+    
+    seen = set()
+    for event_start, calendar_name, event in heapq.merge(*streams, key=lambda item: item[0]):
+        # An invitation shows up on both the organizer's and the user's calendar
+        identity = (event.get("iCalUID", event.get("id")), event_start)
+        if identity in seen:
+            continue
+        seen.add(identity)
+        yield calendar_name, event
+
+
+def _keyed_events(calendar_name: str, events):
+    """(start time, calendar, event) triples for the merge."""
+    for event in events:
+        yield parse_event_time(event.get("start", {})), calendar_name, event
+
+
+def _parse_date_bound(value: str, end: bool = False) -> datetime:
+    """A YYYY-MM-DD date (end dates inclusive) or ISO datetime, in UTC."""
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end and len(value.strip()) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+@cached(ttl=60)
+def fetch_events_between(start_date: str, end_date: str, max_results: int = 50) -> dict:
+    """
+    Events from all calendars in a date range, in start-time order.
     
+    Returns:
+        {"events": [...], "has_more": bool}; has_more is set when the range
+        holds more than max_results events
+        
+    Raises:
+        ValueError: If the dates cannot be parsed or are out of order
+        HttpError: If the Calendar API call fails
+    """
+    start = _parse_date_bound(start_date)
+    end = _parse_date_bound(end_date, end=True)
+    if end <= start:
+        raise ValueError("end_date must not be before start_date")
+    
+    merged = iter_events_between(start, end, fetch_calendar_list())
+    # One extra event tells us whether the range was cut off
+    found = list(itertools.islice(merged, max_results + 1))
+    merged.close()
+    
+    calendar_names = [name for name, _ in found[:max_results]]
+    events = _parse_events([event for _, event in found[:max_results]], "%a %b %d, %I:%M %p", show_date=True)
+    for record, name in zip(events, calendar_names):
+        record["calendar"] = name
+    
+    return {"events": events, "has_more": len(found) > max_results}
+
+
+def calendar_fingerprint() -> str:
+    """
+    Digest of the event IDs and etags from today through the next 7 days.
+    
+    Changes whenever an event the calendar tools can return is added,
+    edited or removed.
+    """
+    now = datetime.now(timezone.utc)
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    digest = hashlib.sha1()
+    for event in _list_events(start_of_day, now + timedelta(days=8)):
+        digest.update(f"{event.get('id')}:{event.get('etag')};".encode())
+    return digest.hexdigest()
+
+
+# Fields shown to the model; descriptions are clipped to a short preview
+EVENT_FIELDS = ["time", "summary", "location"]
+EVENT_FIELD_LIMITS = {"time": 40, "summary": 120, "location": 80, "description": 160}
+
+
+def _parse_events(
+    events: list[dict],
+    time_format: str,
+    show_date: bool = False,
+    include_description: bool = False
+) -> list[dict]:
+    """Summary, formatted start time and location for each raw event."""
+    parsed_events = []
+    
+    for event in events:
+        start = event.get("start", {})
+        start_time = start.get("dateTime", start.get("date", ""))
+        
+        if "dateTime" in start:
+            dt = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
+            formatted_time = dt.strftime(time_format)
+        elif show_date:
+            formatted_time = start_time + " (All day)"
+        else:
+            formatted_time = "All day"
+        
+        parsed = {
+            "summary": event.get("summary", "No title"),
+            "time": formatted_time,
+            "location": event.get("location", "")
+        }
+        if include_description:
+            parsed["description"] = event.get("description", "")
+        parsed_events.append(parsed)
+    
+    return parsed_events
+
+
+@cached(ttl=86400)
+def fetch_time_zone() -> str:
+    """
+    The user's time zone: USER_TIMEZONE, else the primary calendar's.
+    
+    Raises:
+        HttpError: If the Calendar API call fails
+    """
+    configured = os.getenv("USER_TIMEZONE")
+    if configured:
+        return configured
+    calendar = _service().calendars().get(calendarId="primary").execute()
+    return calendar.get("timeZone", "UTC")
+
+
+def _user_zone():
     try:
-        now = datetime.utcnow()
-        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_day = start_of_day + timedelta(days=1)
+        return ZoneInfo(fetch_time_zone())
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        print(f"[WARN] Unknown time zone, using UTC: {e}")
+        return timezone.utc
+
+
+def _busy_events(start: datetime, end: datetime) -> list[dict]:
+    """
+    Raw events in [start, end) from every calendar fetch_events_between
+    covers: the primary calendar through the event store, the others live.
+    """
+    events = _list_events(start, end)
+    others = [c for c in fetch_calendar_list() if "primary" not in (c["id"], c["summary"])]
+    if others:
+        # An invitation shows up on both the organizer's and the user's calendar
+        seen = {(e.get("iCalUID", e.get("id")), parse_event_time(e.get("start", {}))) for e in events}
+        for _, event in iter_events_between(start, end, others):
+            identity = (event.get("iCalUID", event.get("id")), parse_event_time(event.get("start", {})))
+            if identity not in seen:
+                seen.add(identity)
+                events.append(event)
+    return events
+
+
+@cached(ttl=60)
+def fetch_schedule_analysis(start_date: str, end_date: str = "", min_free_minutes: int = 30) -> list[dict]:
+    """
+    Conflicts and free working-hour slots in a date range, computed from
+    the event intervals of all calendars (see fetch_calendar_list).
+    
+    Days are taken in the user's time zone; free slots lie within
+    WORKING_HOURS on WORKING_DAYS and after the current time.
+    
+    Returns:
+        Conflict records (earliest first), then free-slot records, each with
+        type, day, start, end, minutes and detail
         
-        events_result = _calendar_service.events().list(
-            calendarId="primary",
-            timeMin=start_of_day.isoformat() + "Z",
-            timeMax=end_of_day.isoformat() + "Z",
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute()
+    Raises:
+        ValueError: If the dates cannot be parsed, are out of order or span
+            more than MAX_ANALYSIS_DAYS
+        ScheduleConfigError: If WORKING_HOURS or WORKING_DAYS is malformed
+        HttpError: If the Calendar API call fails
+    """
+    first_day = datetime.strptime(start_date.strip(), "%Y-%m-%d").date()
+    last_day = datetime.strptime(end_date.strip(), "%Y-%m-%d").date() if end_date.strip() else first_day
+    if last_day < first_day:
+        raise ValueError("end_date must not be before start_date")
+    if (last_day - first_day).days >= MAX_ANALYSIS_DAYS:
+        raise ValueError(f"ranges are limited to {MAX_ANALYSIS_DAYS} days")
+    
+    zone = _user_zone()
+    range_start = datetime.combine(first_day, datetime.min.time(), zone)
+    range_end = datetime.combine(last_day + timedelta(days=1), datetime.min.time(), zone)
+    intervals = busy_intervals(_busy_events(range_start.astimezone(timezone.utc), range_end.astimezone(timezone.utc)))
+    
+    def record(kind: str, start: datetime, end: datetime, detail: str = "") -> dict:
+        start, end = start.astimezone(zone), end.astimezone(zone)
+        return {
+            "type": kind,
+            "day": start.strftime("%a %b %d"),
+            "start": start.strftime("%I:%M %p"),
+            "end": end.strftime("%I:%M %p"),
+            "minutes": int((end - start).total_seconds() // 60),
+            "detail": detail
+        }
+    
+    records = [
+        record("conflict", overlap_start, overlap_end, f"{earlier.summary} / {later.summary}")
+        for earlier, later, overlap_start, overlap_end in find_conflicts(intervals)
+        if overlap_start < range_end and overlap_end > range_start
+    ]
+    windows = working_windows(first_day, last_day, zone, not_before=datetime.now(timezone.utc))
+    records.extend(
+        record("free", start, end)
+        for start, end in free_slots(intervals, windows, timedelta(minutes=max(min_free_minutes, 1)))
+    )
+    return records
+
+
+@cached(ttl=60)
+def fetch_today_events() -> list[dict]:
+    """
+    Today's events with time, summary, location and description.
+    
+    Raises:
+        HttpError: If the Calendar API call fails
+    """
+    now = datetime.now(timezone.utc)
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_day = start_of_day + timedelta(days=1)
+    
+    return _parse_events(_list_events(start_of_day, end_of_day), "%I:%M %p", include_description=True)
+
+
+@cached(ttl=60)
+def fetch_week_events() -> list[dict]:
+    """
+    Events in the next 7 days.
+    
+    Raises:
+        HttpError: If the Calendar API call fails
+    """
+    now = datetime.now(timezone.utc)
+    end_of_week = now + timedelta(days=7)
+    
+    return _parse_events(_list_events(now, end_of_week), "%a %b %d, %I:%M %p", show_date=True)
+
+
+@cached(ttl=60)
+def fetch_tomorrow_events() -> list[dict]:
+    """
+    Tomorrow's events.
+    
+    Raises:
+        HttpError: If the Calendar API call fails
+    """
+    now = datetime.now(timezone.utc)
+    start_of_tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_tomorrow = start_of_tomorrow + timedelta(days=1)
+    
+    return _parse_events(_list_events(start_of_tomorrow, end_of_tomorrow), "%I:%M %p")
+
+
+@async_tool
+@tool
+def get_events_between(start_date: str, end_date: str, max_results: int = 50) -> str:
+    """
+    Get calendar events in a date range from all of the user's calendars,
+    including shared and team calendars.
+    
+    Args:
+        start_date: First day of the range, as YYYY-MM-DD
+        end_date: Last day of the range (inclusive), as YYYY-MM-DD
+        max_results: Maximum number of events to return (default 50)
         
-        events = events_result.get("items", [])
-        parsed_events = []
+    Returns:
+        Compact listing of events with time, summary, location and calendar
+    """
+    if not _service():
+        return json.dumps({"error": "Calendar service not initialized"})
+    
+    try:
+        result = fetch_events_between(start_date, end_date, max_results)
+        return render_records(
+            "get_events_between",
+            result["events"],
+            EVENT_FIELDS + ["calendar"],
+            EVENT_FIELD_LIMITS,
+            empty_message=f"No events between {start_date} and {end_date}",
+            has_more=result["has_more"]
+        )
         
-        for event in events:
-            start = event.get("start", {})
-            start_time = start.get("dateTime", start.get("date", ""))
-            
-            if "dateTime" in start:
-                dt = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
-                formatted_time = dt.strftime("%I:%M %p")
-            else:
-                formatted_time = "All day"
-            
-            parsed_events.append({
-                "summary": event.get("summary", "No title"),
-                "time": formatted_time,
-                "location": event.get("location", ""),
-                "description": event.get("description", "")
-            })
+    except ValueError as error:
+        return json.dumps({"error": f"Invalid date range: {error}"})
+    except HttpError as error:
+        return json.dumps({"error": str(error)})
+
+
+@async_tool
+@tool
+def analyze_schedule(start_date: str, end_date: str = "", min_free_minutes: int = 30) -> str:
+    """
+    Find scheduling conflicts (overlapping meetings) and free slots within
+    working hours. Use this instead of reading event listings to answer
+    questions about conflicts, availability or when to schedule focus time.
+    
+    Args:
+        start_date: First day to analyze, as YYYY-MM-DD
+        end_date: Last day (inclusive), as YYYY-MM-DD; defaults to start_date
+        min_free_minutes: Shortest free slot to report (default 30)
         
-        if not parsed_events:
-            return json.dumps({"message": "No events scheduled for today"})
+    Returns:
+        Compact listing of conflicts, then free slots, with day, start,
+        end, length in minutes and the conflicting events
+    """
+    if not _service():
+        return json.dumps({"error": "Calendar service not initialized"})
+    
+    try:
+        return render_records(
+            "analyze_schedule",
+            fetch_schedule_analysis(start_date, end_date, min_free_minutes),
+            ["type", "day", "start", "end", "minutes", "detail"],
+            {"detail": 160},
+            empty_message=f"No conflicts and no free slots of {min_free_minutes}+ minutes in working hours"
+        )
         
-        return json.dumps(parsed_events, indent=2)
+    except ScheduleConfigError as error:
+        return json.dumps({"error": f"Server configuration error: {error}"})
+    except ValueError as error:
+        return json.dumps({"error": f"Invalid date range: {error}"})
+    except HttpError as error:
+        return json.dumps({"error": str(error)})
+
+
+@async_tool
+@tool
+def get_today_events() -> str:
+    """
+    Get all calendar events for today.
+    
+    Returns:
+        Compact listing of today's events with time, summary, location and description
+    """
+    if not _service():
+        return json.dumps({"error": "Calendar service not initialized"})
+    
+    try:
+        return render_records(
+            "get_today_events",
+            fetch_today_events(),
+            EVENT_FIELDS + ["description"],
+            EVENT_FIELD_LIMITS,
+            empty_message="No events scheduled for today"
+        )
         
     except HttpError as error:
         return json.dumps({"error": str(error)})
 
 
+@async_tool
 @tool
 def get_week_events() -> str:
     """
     Get all calendar events for the next 7 days.
     
     Returns:
-        JSON string containing this week's events
+        Compact listing of this week's events
     """
-    if not _calendar_service:
+    if not _service():
         return json.dumps({"error": "Calendar service not initialized"})
     
     try:
-        now = datetime.utcnow()
-        end_of_week = now + timedelta(days=7)
-        
-        events_result = _calendar_service.events().list(
-            calendarId="primary",
-            timeMin=now.isoformat() + "Z",
-            timeMax=end_of_week.isoformat() + "Z",
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute()
-        
-        events = events_result.get("items", [])
-        parsed_events = []
-        
-        for event in events:
-            start = event.get("start", {})
-            start_time = start.get("dateTime", start.get("date", ""))
-            
-            if "dateTime" in start:
-                dt = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
-                formatted_time = dt.strftime("%a %b %d, %I:%M %p")
-            else:
-                formatted_time = start_time + " (All day)"
-            
-            parsed_events.append({
-                "summary": event.get("summary", "No title"),
-                "time": formatted_time,
-                "location": event.get("location", "")
-            })
-        
-        if not parsed_events:
-            return json.dumps({"message": "No events scheduled for this week"})
-        
-        return json.dumps(parsed_events, indent=2)
+        return render_records(
+            "get_week_events",
+            fetch_week_events(),
+            EVENT_FIELDS,
+            EVENT_FIELD_LIMITS,
+            empty_message="No events scheduled for this week"
+        )
         
     except HttpError as error:
         return json.dumps({"error": str(error)})
 
 
+@async_tool
 @tool
 def get_tomorrow_events() -> str:
     """
     Get all calendar events for tomorrow.
     
     Returns:
-        JSON string containing tomorrow's events
+        Compact listing of tomorrow's events
     """
-    if not _calendar_service:
+    if not _service():
         return json.dumps({"error": "Calendar service not initialized"})
     
     try:
-        now = datetime.utcnow()
-        start_of_tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_tomorrow = start_of_tomorrow + timedelta(days=1)
-        
-        events_result = _calendar_service.events().list(
-            calendarId="primary",
-            timeMin=start_of_tomorrow.isoformat() + "Z",
-            timeMax=end_of_tomorrow.isoformat() + "Z",
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute()
-        
-        events = events_result.get("items", [])
-        parsed_events = []
-        
-        for event in events:
-            start = event.get("start", {})
-            start_time = start.get("dateTime", start.get("date", ""))
-            
-            if "dateTime" in start:
-                dt = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
-                formatted_time = dt.strftime("%I:%M %p")
-            else:
-                formatted_time = "All day"
-            
-            parsed_events.append({
-                "summary": event.get("summary", "No title"),
-                "time": formatted_time,
-                "location": event.get("location", "")
-            })
-        
-        if not parsed_events:
-            return json.dumps({"message": "No events scheduled for tomorrow"})
-        
-        return json.dumps(parsed_events, indent=2)
+        return render_records(
+            "get_tomorrow_events",
+            fetch_tomorrow_events(),
+            EVENT_FIELDS,
+            EVENT_FIELD_LIMITS,
+            empty_message="No events scheduled for tomorrow"
+        )
         
     except HttpError as error:
         return json.dumps({"error": str(error)})
@@ -0,0 +1,169 @@
+"""
+Google API Clients - Thread-safe service access and async tool execution.
+
+googleapiclient services share an httplib2 transport that is not
+thread-safe, so each worker thread gets its own authorized service. The
+services are built from the discovery documents bundled with
+googleapiclient, read once per process, so no thread ever fetches a
+discovery document. Each build parses its own copy: building a service
+adds keys to the parsed document, so it cannot be shared between threads.
+Tool coroutines run the blocking client code on a bounded pool of these
+threads, which lets parallel tool calls from one model step overlap.
+
+Every API request is rate limited and retried (see quota), and every API
+request and tool call is timed (see utils.metrics).
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.http import HttpRequest
+from langchain_core.tools import StructuredTool
+
+from utils.config import env_int
+from utils.metrics import observe_tool
+from . import quota
+
+
+@functools.lru_cache(maxsize=None)
+def discovery_document(api: str, version: str) -> str | None:
+    """Static discovery document (JSON text) for an API, or None if not bundled."""
+    return discovery_cache.get_static_doc(api, version) or None
+
+
+class ManagedHttpRequest(HttpRequest):
+    """
+    API request sent through the quota layer: it waits for its owner's
+    quota, is retried on rate limits and transient errors, and is timed
+    under its method ID.
+    """
+
+    def __init__(self, *args, quota_user: str | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.quota_user = quota_user
+
+    def execute(self, http=None, num_retries=0):
+        # Retries are handled by quota.call (num_retries is ignored)
+        return quota.call(
+            self.methodId or "unknown",
+            functools.partial(super().execute, http=http),
+            self.quota_user,
+            idempotent=self.method == "GET"
+        )
+
+
+def build_service(api: str, version: str, http, quota_user: str | None = None):
+    """
+    Build a service from the bundled discovery document when available.
+
+    Args:
+        quota_user: Account whose rate-limit quota the service's requests use
+    """
+    request_builder = functools.partial(ManagedHttpRequest, quota_user=quota_user)
+    document = discovery_document(api, version)
+    if document is None:
+        return build(api, version, http=http, cache_discovery=False, requestBuilder=request_builder)
+    return build_from_document(document, http=http, requestBuilder=request_builder)
+
+
+class ThreadLocalService:
+    """
+    Proxy to a googleapiclient service, built once per thread.
+
+    Attribute access (e.g. `service.users()`) is forwarded to the calling
+    thread's own service, so existing call sites work unchanged.
+    """
+
+    def __init__(self, api: str, version: str, credentials, quota_user: str | None = None):
+        """
+        Args:
+            api: API name, e.g. "gmail"
+            version: API version, e.g. "v1"
+            credentials: Google OAuth credentials shared by all threads
+            quota_user: Account the requests are rate limited as (None for
+                the single-user default)
+        """
+        self.api = api
+        self.version = version
+        self.credentials = credentials
+        self.quota_user = quota_user
+        self._local = threading.local()
+
+    def get(self):
+        """This thread's service, built on first use."""
+        service = getattr(self._local, "service", None)
+        if service is None:
+            http = AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=60))
+            service = build_service(self.api, self.version, http, quota_user=self.quota_user)
+            self._local.service = service
+        return service
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _google_executor() -> ThreadPoolExecutor:
+    """Thread pool for Google API calls (GOOGLE_IO_THREADS workers)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=env_int("GOOGLE_IO_THREADS", 8),
+                thread_name_prefix="google-io"
+            )
+        return _executor
+
+
+async def run_google_io(func, *args, **kwargs):
+    """Run blocking Google client code on the I/O pool, keeping context vars."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _google_executor(),
+        functools.partial(ctx.run, func, *args, **kwargs)
+    )
+
+
+def async_tool(tool: StructuredTool) -> StructuredTool:
+    """
+    Give a sync tool a native coroutine that runs on the Google I/O pool.
+
+    Apply above @tool. `ainvoke` (used by the graph's tool node under
+    `ainvoke`/streaming) then awaits the pool instead of the default
+    executor, so several tool calls run concurrently. Both the sync and
+    async forms are timed.
+    """
+    func = tool.func
+    name = tool.name
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            # Tools report failures as {"error": ...} rather than raising
+            error = result is None or (isinstance(result, str) and result.startswith('{"error"'))
+            observe_tool(name, time.perf_counter() - started, error)
+
+    async def coroutine(*args, **kwargs):
+        return await run_google_io(timed, *args, **kwargs)
+
+    tool.func = timed
+
+    tool.coroutine = coroutine
+    return tool
@@ -0,0 +1,188 @@
+"""
+Event Store - In-memory copy of the primary calendar.
+
+One full sync fills the store, after which Calendar `syncToken`
+incremental syncs pull only changed events. Range queries are answered
+from an interval index instead of calling `events().list`.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+from googleapiclient.errors import HttpError
+
+
+def parse_event_time(value: dict) -> datetime | None:
+    """Convert an event start/end ({"dateTime"} or {"date"}) to an aware UTC datetime."""
+    if "dateTime" in value:
+        return datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")).astimezone(timezone.utc)
+    if "date" in value:
+        return datetime.fromisoformat(value["date"]).replace(tzinfo=timezone.utc)
+    return None
+
+
+class IntervalIndex:
+    """
+    Events sorted by start time.
+
+    Overlap queries binary-search the start times; the longest event
+    duration bounds how far back an overlapping event can start.
+    """
+
+    def __init__(self, events: list[dict]):
+        entries = []
+        for event in events:
+            start = parse_event_time(event.get("start", {}))
+            end = parse_event_time(event.get("end", {})) or start
+            if start is None:
+                continue
+            entries.append((start.timestamp(), end.timestamp(), event))
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+
+        self._starts = [entry[0] for entry in entries]
+        self._entries = entries
+        self._max_duration = max((end - start for start, end, _ in entries), default=0.0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def overlapping(self, start: datetime, end: datetime) -> list[dict]:
+        """Events that overlap [start, end), ordered by start time."""
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        lo = bisect_left(self._starts, start_ts - self._max_duration)
+        hi = bisect_left(self._starts, end_ts)
+        return [
+            event for event_start, event_end, event in self._entries[lo:hi]
+            # Zero-length events count if they start inside the range
+            if event_end > start_ts or (event_end == event_start >= start_ts)
+        ]
+
+
+class EventStore:
+    """Incrementally synced store of primary calendar events."""
+
+    def __init__(
+        self,
+        service,
+        calendar_id: str = "primary",
+        horizon_days: int = 30,
+        max_age: float = 60.0
+    ):
+        """
+        Args:
+            service: Google Calendar API service
+            calendar_id: Calendar to mirror
+            horizon_days: Days ahead covered by a full sync
+            max_age: Seconds after a sync before the store is considered stale
+        """
+        self.service = service
+        self.calendar_id = calendar_id
+        self.horizon_days = horizon_days
+        self.max_age = max_age
+        self.last_sync = 0.0
+
+        self._events: dict[str, dict] = {}
+        self._index = IntervalIndex([])
+        self._sync_token: str | None = None
+        self._window: tuple[datetime, datetime] | None = None
+        self._lock = threading.RLock()
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """Whether [start, end) lies inside the synced window."""
+        return self._window is not None and self._window[0] <= start and end <= self._window[1]
+
+    def is_fresh(self) -> bool:
+        """Whether the store has synced within max_age seconds."""
+        return self._sync_token is not None and time.monotonic() - self.last_sync < self.max_age
+
+    def ensure_fresh(self, start: datetime, end: datetime):
+        """Sync if stale; resync if [start, end) falls outside the window."""
+        if self.is_fresh() and self.covers(start, end):
+            return
+        with self._lock:
+            if not self.covers(start, end):
+                self.full_sync(start, end)
+            elif not self.is_fresh():
+                self.sync()
+
+    def sync(self):
+        """Apply changes since the last sync token, or run a full sync."""
+        with self._lock:
+            if self._sync_token is None:
+                self.full_sync()
+                return
+
+            try:
+                self._sync_incremental()
+            except HttpError as error:
+                # 410 Gone: the sync token is no longer valid
+                if error.resp.status == 410:
+                    print("[INFO] Calendar sync token expired, running full sync")
+                    self.full_sync()
+                else:
+                    raise
+
+    def full_sync(self, start: datetime | None = None, end: datetime | None = None):
+        """
+        Reload every event from the start of yesterday through horizon_days
+        ahead, widened to include [start, end) when given.
+        """
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            window_start = (now - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            window_end = now + timedelta(days=self.horizon_days)
+            if start is not None:
+                window_start = min(window_start, start)
+            if end is not None:
+                window_end = max(window_end, end)
+
+            events = {}
+            sync_token = self._fetch_pages(
+                events,
+                timeMin=window_start.isoformat(),
+                timeMax=window_end.isoformat()
+            )
+
+            self._events = events
+            self._sync_token = sync_token
+            self._window = (window_start, window_end)
+            self._rebuild()
+            print(f"[OK] Calendar store synced with {len(self._events)} events")
+
+    def _sync_incremental(self):
+        events = dict(self._events)
+        self._sync_token = self._fetch_pages(events, syncToken=self._sync_token)
+        self._events = events
+        self._rebuild()
+
+    def _fetch_pages(self, events: dict[str, dict], **params) -> str | None:
+        """Page through events().list, applying each event to `events`."""
+        page_token = None
+        while True:
+            result = self.service.events().list(
+                calendarId=self.calendar_id,
+                singleEvents=True,
+                maxResults=2500,
+                pageToken=page_token,
+                **params
+            ).execute()
+
+            for event in result.get("items", []):
+                if event.get("status") == "cancelled":
+                    events.pop(event["id"], None)
+                else:
+                    events[event["id"]] = event
+
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return result.get("nextSyncToken")
+
+    def _rebuild(self):
+        self._index = IntervalIndex(list(self._events.values()))
+        self.last_sync = time.monotonic()
+
+    def events_between(self, start: datetime, end: datetime) -> list[dict]:
+        """Raw events overlapping [start, end), ordered by start time."""
+        return self._index.overlapping(start, end)
@@ -0,0 +1,123 @@
+"""
+Tool Output Formatting - Compact, token-budgeted serialization of records.
+
+Tool results go straight into the model's context on every ReAct step, so
+they are rendered without indentation, long fields are clipped and each
+tool's output is capped at a token budget, ending with an "N more items
+omitted" marker when records had to be dropped.
+
+Formats (TOOL_OUTPUT_FORMAT):
+- table (default): a `field|field` header line followed by one row per record
+- json: minified JSON list (wrapped as {"items", "note"} when truncated)
+- pretty: indented JSON without limits (the original output)
+"""
+
+import json
+import os
+
+from utils.config import env_int
+
+# Roughly four characters per token, as in count_tokens_approximately
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a string."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def token_budget(tool_name: str) -> int:
+    """
+    Token budget for one tool's output.
+
+    TOOL_OUTPUT_TOKENS_<TOOL_NAME> overrides the global TOOL_OUTPUT_TOKENS.
+    """
+    default = env_int("TOOL_OUTPUT_TOKENS", 1500)
+    return env_int(f"TOOL_OUTPUT_TOKENS_{tool_name.upper()}", default)
+
+
+def clip(value, limit: int) -> str:
+    """Single-line string form of a field, cut to `limit` characters."""
+    text = " ".join(str(value).split())
+    if len(text) > limit:
+        text = text[:max(limit - 1, 0)].rstrip() + "…"
+    return text
+
+
+def render_records(
+    tool_name: str,
+    records: list[dict],
+    fields: list[str],
+    field_limits: dict[str, int] | None = None,
+    empty_message: str | None = None,
+    has_more: bool = False
+) -> str:
+    """
+    Serialize tool records for the model.
+
+    Args:
+        tool_name: Tool the output belongs to (selects the token budget)
+        records: Records to render, most relevant first
+        fields: Fields to include, in column order
+        field_limits: Per-field character caps (others use TOOL_FIELD_CHARS)
+        empty_message: Returned as {"message": ...} when there are no records
+        has_more: The source had more records than were passed in
+
+    Returns:
+        The rendered records, possibly followed by an omission marker
+    """
+    if not records and empty_message:
+        return json.dumps({"message": empty_message})
+
+    output_format = os.getenv("TOOL_OUTPUT_FORMAT", "table").lower()
+    if output_format == "pretty":
+        return json.dumps([{f: r.get(f, "") for f in fields} for r in records], indent=2)
+
+    default_limit = env_int("TOOL_FIELD_CHARS", 200)
+    limits = field_limits or {}
+    budget = token_budget(tool_name)
+
+    if output_format == "json":
+        rows = [
+            json.dumps(
+                {f: clip(r[f], limits.get(f, default_limit)) for f in fields if r.get(f)},
+                ensure_ascii=False, separators=(",", ":")
+            )
+            for r in records
+        ]
+        header, separator, opening, closing = "", ",", "[", "]"
+    else:
+        rows = [
+            "|".join(clip(r.get(f, ""), limits.get(f, default_limit)).replace("|", "/") for f in fields)
+            for r in records
+        ]
+        header, separator, opening, closing = "|".join(fields), "\n", "", ""
+
+    # Keep whole rows while within budget; always keep at least one
+    kept = []
+    used = estimate_tokens(header + opening + closing)
+    for row in rows:
+        cost = estimate_tokens(row) + 1
+        if kept and used + cost > budget:
+            break
+        kept.append(row)
+        used += cost
+
+    omitted = len(rows) - len(kept)
+    marker = None
+    if omitted:
+        marker = f"{omitted}{'+' if has_more else ''} more items omitted"
+    elif has_more:
+        marker = "more items omitted"
+
+    if output_format == "json":
+        body = opening + separator.join(kept) + closing
+        if marker:
+            note = json.dumps(marker)
+            body = f'{{"items":{body},"note":{note}}}'
+        return body
+
+    lines = [header] + kept
+    if marker:
+        lines.append(f"[{marker}]")
+    return "\n".join(lines)
@@ -4,19 +4,279 @@ Gmail Tools - Email-related tools for the agent.
 
 from langchain_core.tools import tool
 from googleapiclient.errors import HttpError
+import functools
 import json
 
-# Global service (set during initialization)
-_gmail_service = None
+from utils.config import get_data_dir, env_bool, env_int, env_float
+from utils.metrics import EMAIL_SEARCHES
+from . import quota, urgency
+from .accounts import current_account
+from .cache import cached
+from .clients import ThreadLocalService, async_tool
+from .formatting import render_records
+from .gmail_query import translate
+from .mailbox import MailboxMirror, parse_email
 
+# Unread messages considered when ranking by urgency (newest first)
+URGENCY_CANDIDATES = 300
+# Without the mirror, candidates are fetched live, so fewer of them
+LIVE_URGENCY_CANDIDATES = 50
 
-def init_gmail_service(credentials):
-    """Initialize Gmail API service with credentials."""
-    global _gmail_service
-    from googleapiclient.discovery import build
-    _gmail_service = build("gmail", "v1", credentials=credentials)
+# Gmail accepts up to 100 calls per batch but recommends at most 50;
+# larger batches tend to trip per-user rate limits.
+BATCH_SIZE = 50
 
 
+def create_gmail_clients(
+    credentials, storage_name: str | None = None, quota_user: str | None = None
+) -> tuple[ThreadLocalService, MailboxMirror | None]:
+    """
+    Gmail API service and local mirror for one account.
+    
+    Args:
+        credentials: Google OAuth credentials
+        storage_name: Suffix for the account's mirror file (None for the
+            single-user mailbox.db)
+        quota_user: Account the requests are rate limited as
+        
+    Returns:
+        (service, mirror); mirror is None when MAILBOX_MIRROR is off
+    """
+    # One client per thread: httplib2 transports are not thread-safe
+    service = ThreadLocalService("gmail", "v1", credentials, quota_user)
+    
+    mirror = None
+    if env_bool("MAILBOX_MIRROR", True):
+        file_name = f"mailbox-{storage_name}.db" if storage_name else "mailbox.db"
+        mirror = MailboxMirror(
+            get_data_dir() / file_name,
+            service,
+            functools.partial(_batch_get_messages, service=service),
+            seed_limit=env_int("MAILBOX_SEED_LIMIT", 500),
+            max_age=env_float("MAILBOX_MAX_AGE", 30.0)
+        )
+    return service, mirror
+
+
+def _service():
+    """Gmail service of the current account, or None if not initialized."""
+    account = current_account()
+    return account.gmail if account else None
+
+
+def _current_mirror() -> MailboxMirror | None:
+    account = current_account()
+    return account.mirror if account else None
+
+
+def _batch_get_messages(message_ids: list[str], service=None) -> list[dict]:
+    """
+    Fetch metadata for several messages using Gmail batch requests.
+    
+    Instead of one HTTP round trip per message, the `messages().get` calls
+    are grouped into batches of at most BATCH_SIZE, so latency scales with
+    the number of batches rather than the number of messages.
+    
+    Args:
+        message_ids: Gmail message IDs, in the order results should be returned
+        service: Gmail service to use (defaults to the current account's)
+        
+    Returns:
+        Raw metadata messages in the same order as `message_ids`. A message
+        that failed to load is returned as {"id": ..., "error": ...}.
+    """
+    service = service or _service()
+    results: list[dict | None] = [None] * len(message_ids)
+    
+    for offset in range(0, len(message_ids), BATCH_SIZE):
+        requests = {
+            str(index): service.users().messages().get(
+                userId="me",
+                id=message_ids[index],
+                format="metadata",
+                metadataHeaders=["From", "To", "Cc", "Subject", "Date"]
+            )
+            for index in range(offset, min(offset + BATCH_SIZE, len(message_ids)))
+        }
+        # One HTTP round trip per batch, charged 5 units per message;
+        # rate-limited parts are resent after backing off
+        responses = quota.execute_batch(service, "gmail.users.messages.batchGet", requests)
+        for request_id, (response, exception) in responses.items():
+            index = int(request_id)
+            if exception is not None:
+                results[index] = {"id": message_ids[index], "error": str(exception)}
+            else:
+                results[index] = response
+    
+    return results
+
+
+def _fetch_message_metadata(message_ids: list[str]) -> list[dict]:
+    """
+    Parsed emails for the given IDs, in order.
+    
+    Messages already in the mirror are served locally; only the rest are
+    fetched (in batches) and then added to the mirror.
+    """
+    mirror = _current_mirror()
+    known = mirror.get_many(message_ids) if mirror else {}
+    missing = [message_id for message_id in message_ids if message_id not in known]
+    
+    fetched = {}
+    if missing:
+        messages = _batch_get_messages(missing)
+        if mirror:
+            mirror.add_messages(messages)
+        for message in messages:
+            fetched[message["id"]] = message if "error" in message else parse_email(message)
+    
+    return [known.get(message_id) or fetched[message_id] for message_id in message_ids]
+
+
+def _fresh_mirror() -> MailboxMirror | None:
+    """The mirror if it is enabled and up to date, syncing it when stale."""
+    mirror = _current_mirror()
+    if not mirror:
+        return None
+    try:
+        mirror.ensure_fresh()
+        return mirror
+    except Exception as e:
+        print(f"[WARN] Mailbox mirror sync failed, using live Gmail: {e}")
+        return None
+
+
+def mailbox_fingerprint() -> str:
+    """
+    Current Gmail historyId, which advances on every mailbox change.
+    
+    Read from the mirror when it is fresh, otherwise from the profile.
+    """
+    mirror = _fresh_mirror()
+    if mirror:
+        return mirror.history_id
+    profile = _service().users().getProfile(userId="me").execute()
+    return str(profile["historyId"])
+
+
+# Fields shown to the model; snippets are clipped harder than headers
+EMAIL_FIELDS = ["from", "subject", "date", "snippet"]
+EMAIL_FIELD_LIMITS = {"from": 80, "subject": 120, "date": 40, "snippet": 160}
+
+
+def _render_emails(tool_name: str, emails: list[dict]) -> str:
+    records = [
+        {"subject": f"(could not load message: {email['error']})"} if "error" in email else email
+        for email in emails
+    ]
+    return render_records(tool_name, records, EMAIL_FIELDS, EMAIL_FIELD_LIMITS)
+
+
+@cached(ttl=30)
+def fetch_unread_emails(max_results: int = 10) -> list[dict]:
+    """
+    Parsed unread emails, newest first.
+    
+    Served from the mirror when it is fresh, otherwise listed live.
+    
+    Raises:
+        HttpError: If the Gmail API call fails
+    """
+    mirror = _fresh_mirror()
+    if mirror:
+        return mirror.unread(max_results)
+    
+    results = _service().users().messages().list(
+        userId="me",
+        q="is:unread",
+        maxResults=max_results
+    ).execute()
+    
+    message_ids = [msg["id"] for msg in results.get("messages", [])]
+    return _fetch_message_metadata(message_ids)
+
+
+@cached(ttl=60)
+def fetch_search_results(query: str, max_results: int = 10) -> list[dict]:
+    """
+    Parsed emails matching a Gmail query, newest first.
+    
+    Answered from the mirror's search index when the query's operators
+    translate and the mirror holds every match; otherwise Gmail evaluates
+    the query.
+    
+    Raises:
+        HttpError: If the Gmail API call fails
+    """
+    mirror = _fresh_mirror()
+    if mirror and env_bool("LOCAL_EMAIL_SEARCH", True):
+        local_query = translate(query)
+        emails = mirror.search(local_query, max_results) if local_query else None
+        if emails is not None:
+            EMAIL_SEARCHES.inc(source="local")
+            return emails
+    EMAIL_SEARCHES.inc(source="gmail")
+    
+    # Metadata for the hits comes from the mirror where possible, so only
+    # unseen messages are fetched.
+    results = _service().users().messages().list(
+        userId="me",
+        q=query,
+        maxResults=max_results
+    ).execute()
+    
+    message_ids = [msg["id"] for msg in results.get("messages", [])]
+    return _fetch_message_metadata(message_ids)
+
+
+@cached(ttl=30)
+def fetch_urgent_emails(max_results: int = 5) -> list[dict]:
+    """
+    The most urgent unread emails, ranked locally (see tools.urgency).
+    
+    Candidates and their stored text scores come from the mirror when it
+    is fresh; otherwise recent unread messages are fetched and scored
+    without sender history or reply state.
+    
+    Returns:
+        Parsed emails with "score" and "why", highest score first
+        
+    Raises:
+        HttpError: If the Gmail API call fails
+    """
+    mirror = _fresh_mirror()
+    if mirror:
+        candidates = mirror.urgency_candidates(URGENCY_CANDIDATES)
+        return urgency.rank(
+            candidates,
+            max_results,
+            mirror.sent_counts(),
+            mirror.reply_times({candidate["thread_id"] for candidate in candidates})
+        )
+    
+    results = _service().users().messages().list(
+        userId="me",
+        q="is:unread",
+        maxResults=LIVE_URGENCY_CANDIDATES
+    ).execute()
+    candidates = []
+    for message in _batch_get_messages([msg["id"] for msg in results.get("messages", [])]):
+        if "error" in message:
+            continue
+        email = parse_email(message)
+        score, reasons = urgency.text_score(email["from"], email["subject"], email["snippet"])
+        email.update(
+            labels=message.get("labelIds", []),
+            thread_id=message.get("threadId"),
+            internal_date=int(message.get("internalDate", 0)),
+            text_score=score,
+            text_reasons=reasons
+        )
+        candidates.append(email)
+    return urgency.rank(candidates, max_results, {}, {})
+
+
+@async_tool
 @tool
 def get_unread_emails(max_results: int = 10) -> str:
     """
@@ -26,55 +286,19 @@ def get_unread_emails(max_results: int = 10) -> str:
         max_results: Maximum number of emails to fetch (default 10)
         
     Returns:
-        JSON string containing list of unread emails with sender, subject, and snippet
+        Compact listing of unread emails with sender, subject, date and snippet
     """
-    if not _gmail_service:
+    if not _service():
         return json.dumps({"error": "Gmail service not initialized"})
     
     try:
-        results = _gmail_service.users().messages().list(
-            userId="me",
-            q="is:unread",
-            maxResults=max_results
-        ).execute()
-        
-        messages = results.get("messages", [])
-        emails = []
-        
-        for msg in messages:
-            message = _gmail_service.users().messages().get(
-                userId="me",
-                id=msg["id"],
-                format="metadata",
-                metadataHeaders=["From", "Subject", "Date"]
-            ).execute()
-            
-            headers = message.get("payload", {}).get("headers", [])
-            email_data = {
-                "snippet": message.get("snippet", ""),
-                "from": "",
-                "subject": "",
-                "date": ""
-            }
-            
-            for header in headers:
-                name = header.get("name", "").lower()
-                value = header.get("value", "")
-                if name == "from":
-                    email_data["from"] = value
-                elif name == "subject":
-                    email_data["subject"] = value
-                elif name == "date":
-                    email_data["date"] = value
-            
-            emails.append(email_data)
-        
-        return json.dumps(emails, indent=2)
+        return _render_emails("get_unread_emails", fetch_unread_emails(max_results))
         
     except HttpError as error:
         return json.dumps({"error": str(error)})
 
 
+@async_tool
 @tool
 def search_emails(query: str, max_results: int = 10) -> str:
     """
@@ -85,50 +309,43 @@ def search_emails(query: str, max_results: int = 10) -> str:
         max_results: Maximum number of results (default 10)
         
     Returns:
-        JSON string containing matching emails
+        Compact listing of matching emails
     """
-    if not _gmail_service:
+    if not _service():
         return json.dumps({"error": "Gmail service not initialized"})
     
     try:
-        results = _gmail_service.users().messages().list(
-            userId="me",
-            q=query,
-            maxResults=max_results
-        ).execute()
+        return _render_emails("search_emails", fetch_search_results(query, max_results))
         
-        messages = results.get("messages", [])
-        emails = []
-        
-        for msg in messages:
-            message = _gmail_service.users().messages().get(
-                userId="me",
-                id=msg["id"],
-                format="metadata",
-                metadataHeaders=["From", "Subject", "Date"]
-            ).execute()
-            
-            headers = message.get("payload", {}).get("headers", [])
-            email_data = {
-                "snippet": message.get("snippet", ""),
-                "from": "",
-                "subject": "",
-                "date": ""
-            }
-            
-            for header in headers:
-                name = header.get("name", "").lower()
-                value = header.get("value", "")
-                if name == "from":
-                    email_data["from"] = value
-                elif name == "subject":
-                    email_data["subject"] = value
-                elif name == "date":
-                    email_data["date"] = value
-            
-            emails.append(email_data)
+    except HttpError as error:
+        return json.dumps({"error": str(error)})
+
+
+@async_tool
+@tool
+def get_urgent_emails(max_results: int = 5) -> str:
+    """
+    Get the most urgent unread emails, already ranked by a local scorer
+    (deadlines, urgent wording, VIP and frequent senders, recency, replies).
+    Prefer this over reading all unread emails to find what is urgent.
+    
+    Args:
+        max_results: Number of top emails to return (default 5)
         
-        return json.dumps(emails, indent=2)
+    Returns:
+        Compact listing of the top emails with score and the reasons for it
+    """
+    if not _service():
+        return json.dumps({"error": "Gmail service not initialized"})
+    
+    try:
+        return render_records(
+            "get_urgent_emails",
+            fetch_urgent_emails(max_results),
+            ["score", "why"] + EMAIL_FIELDS,
+            EMAIL_FIELD_LIMITS,
+            empty_message="You have no unread emails"
+        )
         
     except HttpError as error:
         return json.dumps({"error": str(error)})
@@ -0,0 +1,166 @@
+"""
+Gmail Query - Translate Gmail search queries for the mailbox mirror.
+
+Covers the operators the agent uses most: from:, to:, subject:, is:,
+label:/in:/category:, after:/before: and newer_than:/older_than:.
+Anything else (OR, grouping, negation, has:attachment, in:anywhere, ...)
+makes `translate` return None and the query goes to Gmail.
+
+So do plain words and "quoted phrases": Gmail matches them anywhere in
+the body, which the mirror does not store, so a local answer could miss
+messages.
+"""
+
+import re
+import time
+from datetime import datetime
+
+# term = optional "-", optional "operator:", then a quoted phrase or a word
+TERM_PATTERN = re.compile(r'(-?)(?:([A-Za-z_]+):)?("[^"]*"|\S+)')
+
+# FTS columns the text operators search
+TEXT_OPERATORS = {"from": "sender", "to": "recipients", "subject": "subject"}
+
+# is:/in:/label: values that name system labels
+SYSTEM_LABELS = {
+    "inbox": "INBOX",
+    "sent": "SENT",
+    "draft": "DRAFT",
+    "drafts": "DRAFT",
+    "starred": "STARRED",
+    "important": "IMPORTANT",
+    "unread": "UNREAD",
+}
+CATEGORY_LABELS = {
+    "primary": "CATEGORY_PERSONAL",
+    "personal": "CATEGORY_PERSONAL",
+    "social": "CATEGORY_SOCIAL",
+    "promotions": "CATEGORY_PROMOTIONS",
+    "updates": "CATEGORY_UPDATES",
+    "forums": "CATEGORY_FORUMS",
+}
+
+DAY_MS = 86_400_000
+AGE_UNITS_MS = {"d": DAY_MS, "m": 30 * DAY_MS, "y": 365 * DAY_MS}
+
+
+class LocalQuery:
+    """A Gmail query in terms the mirror can evaluate."""
+
+    def __init__(self):
+        # FTS5 expressions, all of which must match
+        self.match: list[str] = []
+        # System label IDs, and user label names as written in queries
+        self.labels: list[str] = []
+        self.user_labels: list[str] = []
+        self.unread: bool | None = None
+        # internalDate bounds in epoch milliseconds: after <= date < before
+        self.after: int | None = None
+        self.before: int | None = None
+
+    def match_expression(self) -> str | None:
+        return " AND ".join(self.match) if self.match else None
+
+
+def translate(query: str, now: float | None = None) -> LocalQuery | None:
+    """
+    Translate a Gmail search query.
+
+    Args:
+        query: Gmail search query, e.g. 'from:boss subject:"q3 report" is:unread'
+        now: Current time in epoch seconds, for newer_than:/older_than:
+
+    Returns:
+        The translated query, or None if it uses something the mirror
+        cannot answer
+    """
+    now = time.time() if now is None else now
+    local = LocalQuery()
+    for negated, operator, value in TERM_PATTERN.findall(query):
+        if value == "AND" and not operator:
+            continue
+        if negated or value in ("OR", "|") or any(c in value for c in "(){}"):
+            return None
+        phrase = value[1:-1] if value.startswith('"') else value
+        if not phrase:
+            continue
+        operator = operator.lower()
+        if not _apply(local, operator, phrase, now):
+            return None
+    return local
+
+
+def _apply(local: LocalQuery, operator: str, value: str, now: float) -> bool:
+    """Add one term to `local`; False if the term is not supported."""
+    if not operator:
+        # Free text: Gmail also searches the body
+        return False
+    if operator in TEXT_OPERATORS:
+        local.match.append(f"{TEXT_OPERATORS[operator]} : {_fts_phrase(value)}")
+    elif operator == "is":
+        name = value.lower()
+        if name in ("unread", "read"):
+            local.unread = name == "unread"
+        elif name in ("starred", "important"):
+            local.labels.append(SYSTEM_LABELS[name])
+        else:
+            return False
+    elif operator in ("in", "label"):
+        name = value.lower()
+        if name in SYSTEM_LABELS:
+            local.labels.append(SYSTEM_LABELS[name])
+        elif operator == "label" and name not in ("spam", "trash"):
+            # Gmail writes user label names with spaces and slashes as dashes
+            local.user_labels.append(label_query_name(name))
+        else:
+            # in:spam, in:trash, in:anywhere, in:chats, ...
+            return False
+    elif operator == "category":
+        if value.lower() not in CATEGORY_LABELS:
+            return False
+        local.labels.append(CATEGORY_LABELS[value.lower()])
+    elif operator in ("after", "before", "newer", "older"):
+        timestamp = _parse_date(value)
+        if timestamp is None:
+            return False
+        _bound(local, operator in ("after", "newer"), timestamp)
+    elif operator in ("newer_than", "older_than"):
+        match = re.fullmatch(r"(\d+)([dmy])", value.lower())
+        if not match:
+            return False
+        timestamp = int(now * 1000) - int(match.group(1)) * AGE_UNITS_MS[match.group(2)]
+        _bound(local, operator == "newer_than", timestamp)
+    else:
+        return False
+    return True
+
+
+def label_query_name(name: str) -> str:
+    """A label name as Gmail queries write it: lower case, spaces and slashes as dashes."""
+    return re.sub(r"[\s/]+", "-", name.lower())
+
+
+def _bound(local: LocalQuery, lower: bool, timestamp: int):
+    if lower:
+        local.after = max(local.after or timestamp, timestamp)
+    else:
+        local.before = min(local.before or timestamp, timestamp)
+
+
+def _parse_date(value: str) -> int | None:
+    """after:/before: value in epoch ms: a date (local midnight) or epoch seconds."""
+    if value.isdigit() and len(value) > 8:
+        return int(value) * 1000
+    match = re.fullmatch(r"(\d{4})[/-](\d{1,2})[/-](\d{1,2})", value)
+    if not match:
+        return None
+    try:
+        return int(datetime(*map(int, match.groups())).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+def _fts_phrase(value: str) -> str:
+    # A quoted FTS5 string is matched as a phrase of its tokens, so
+    # "boss@company.com" finds the tokens boss, company, com in order
+    return '"' + value.replace('"', '""') + '"'
@@ -0,0 +1,553 @@
+"""
+Mailbox Mirror - Local SQLite copy of Gmail message metadata.
+
+The mirror is seeded once with recent and unread messages, then kept
+current with `history.list` starting from the last seen historyId, so
+only changes cross the network.
+
+Headers and snippets are indexed with SQLite FTS5, so searches that the
+mirror can answer completely (see `search`) never reach Gmail. Each
+message's content urgency score is computed once, when it is stored.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from googleapiclient.errors import HttpError
+
+from . import urgency
+from .gmail_query import LocalQuery, label_query_name
+
+
+# Bump when the tables change; older mirrors are dropped and reseeded
+SCHEMA_VERSION = "3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    internal_date INTEGER,
+    sender TEXT,
+    recipients TEXT,
+    subject TEXT,
+    date TEXT,
+    snippet TEXT,
+    label_ids TEXT,
+    unread INTEGER,
+    urgency REAL,
+    urgency_reasons TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_unread ON messages (unread, internal_date);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages (internal_date);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Full-text index over the searchable columns, kept in step by triggers.
+# It reads the text from `messages` by rowid; rows are updated in place
+# (never REPLACEd) so their rowids stay put.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    sender, recipients, subject, snippet,
+    content='messages', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, sender, recipients, subject, snippet)
+    VALUES (new.rowid, new.sender, new.recipients, new.subject, new.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, sender, recipients, subject, snippet)
+    VALUES ('delete', old.rowid, old.sender, old.recipients, old.subject, old.snippet);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update
+AFTER UPDATE OF sender, recipients, subject, snippet ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, sender, recipients, subject, snippet)
+    VALUES ('delete', old.rowid, old.sender, old.recipients, old.subject, old.snippet);
+    INSERT INTO messages_fts (rowid, sender, recipients, subject, snippet)
+    VALUES (new.rowid, new.sender, new.recipients, new.subject, new.snippet);
+END;
+"""
+
+RESET = """
+DROP TABLE IF EXISTS messages_fts;
+DROP TABLE IF EXISTS messages;
+DELETE FROM state;
+"""
+
+# Labels Gmail leaves out of list/search results unless asked for
+HIDDEN_LABELS = ("SPAM", "TRASH")
+
+
+class MailboxMirror:
+    """Persistent, incrementally synced Gmail metadata store."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        service,
+        fetch_messages: Callable[[list[str]], list[dict]],
+        seed_limit: int = 500,
+        max_age: float = 30.0
+    ):
+        """
+        Open (or create) the mirror database.
+
+        Args:
+            db_path: SQLite file to store metadata in
+            service: Gmail API service
+            fetch_messages: Batched fetch returning raw metadata messages
+                in request order ({"id", "error"} for failures)
+            seed_limit: Number of recent and unread messages to seed with
+            max_age: Seconds after a sync before the mirror is considered stale
+        """
+        self.service = service
+        self.fetch_messages = fetch_messages
+        self.seed_limit = seed_limit
+        self.max_age = max_age
+        self.last_sync = 0.0
+
+        self._lock = threading.RLock()
+        # WAL and a busy timeout let several server workers share the file
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        if self._get_state("schema_version") != SCHEMA_VERSION:
+            self._conn.executescript(RESET)
+        self._conn.executescript(SCHEMA)
+        self.searchable = True
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5: every search goes to Gmail
+            print(f"[WARN] Mailbox search index unavailable: {e}")
+            self.searchable = False
+        self._conn.execute(
+            "INSERT OR REPLACE INTO state VALUES ('schema_version', ?)", (SCHEMA_VERSION,)
+        )
+        self._conn.commit()
+
+        self._history_id = self._get_state("history_id")
+        self._label_ids: dict[str, str] | None = None
+        # (history_id, messages sent per recipient address)
+        self._sent_counts: tuple[str | None, dict[str, int]] = (None, {})
+
+    # ------------------------------------------------------------------
+    # Sync
+    # ------------------------------------------------------------------
+
+    @property
+    def history_id(self) -> str | None:
+        """Last Gmail historyId the mirror is consistent with."""
+        return self._history_id
+
+    def is_fresh(self) -> bool:
+        """Whether the mirror has synced within max_age seconds."""
+        return self.history_id is not None and time.monotonic() - self.last_sync < self.max_age
+
+    def ensure_fresh(self):
+        """Sync if the mirror is stale. Raises HttpError if Gmail is unreachable."""
+        if self.is_fresh():
+            return
+        with self._lock:
+            # Another thread may have synced while we waited for the lock
+            if not self.is_fresh():
+                self.sync()
+
+    def sync(self):
+        """Apply changes since the last historyId, or seed the mirror if empty."""
+        with self._lock:
+            if self.history_id is None:
+                self.full_resync()
+                return
+
+            try:
+                self._sync_history()
+            except HttpError as error:
+                # History IDs expire after about a week; Gmail answers 404
+                if error.resp.status == 404:
+                    print("[INFO] Gmail history expired, resyncing mailbox mirror")
+                    self.full_resync()
+                else:
+                    raise
+
+    def full_resync(self):
+        """Replace the mirror contents with a fresh seed from Gmail."""
+        with self._lock:
+            # Take the historyId first so changes made while seeding are
+            # picked up by the next incremental sync.
+            profile = self.service.users().getProfile(userId="me").execute()
+            history_id = profile["historyId"]
+
+            recent_ids = self._list_ids(None)
+            unread_ids = self._list_ids("is:unread")
+            recent = set(recent_ids)
+            message_ids = recent_ids + [m for m in unread_ids if m not in recent]
+
+            messages = [m for m in self.fetch_messages(message_ids) if "error" not in m]
+
+            # Every message newer than the oldest recent one is mirrored
+            # (all of them if the mailbox is smaller than the seed), and
+            # history keeps it that way; searches rely on this boundary
+            if len(recent_ids) < self.seed_limit:
+                complete_since = 0
+            else:
+                complete_since = min(
+                    (int(m.get("internalDate", 0)) for m in messages if m["id"] in recent), default=0
+                )
+
+            with self._conn:
+                self._conn.execute("DELETE FROM messages")
+                self._upsert(messages)
+                self._set_state("complete_since", complete_since)
+                self._set_state("unread_complete", int(len(unread_ids) < self.seed_limit))
+                self._set_history_id(history_id)
+            self._label_ids = None
+
+            self.last_sync = time.monotonic()
+            print(f"[OK] Mailbox mirror seeded with {len(messages)} messages")
+
+    def _list_ids(self, query: str | None) -> list[str]:
+        """List up to seed_limit message IDs matching a query."""
+        message_ids = []
+        page_token = None
+        while len(message_ids) < self.seed_limit:
+            results = self.service.users().messages().list(
+                userId="me",
+                q=query,
+                maxResults=min(500, self.seed_limit - len(message_ids)),
+                pageToken=page_token
+            ).execute()
+            message_ids.extend(msg["id"] for msg in results.get("messages", []))
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                break
+        return message_ids
+
+    def _sync_history(self):
+        """Fetch history records since history_id and apply them."""
+        added: set[str] = set()
+        deleted: set[str] = set()
+        labels: dict[str, list[str]] = {}
+
+        page_token = None
+        history_id = self.history_id
+        while True:
+            results = self.service.users().history().list(
+                userId="me",
+                startHistoryId=self.history_id,
+                pageToken=page_token
+            ).execute()
+
+            for record in results.get("history", []):
+                for item in record.get("messagesAdded", []):
+                    added.add(item["message"]["id"])
+                    deleted.discard(item["message"]["id"])
+                for item in record.get("messagesDeleted", []):
+                    added.discard(item["message"]["id"])
+                    labels.pop(item["message"]["id"], None)
+                    deleted.add(item["message"]["id"])
+                for item in record.get("labelsAdded", []) + record.get("labelsRemoved", []):
+                    message = item["message"]
+                    if message["id"] not in deleted:
+                        labels[message["id"]] = message.get("labelIds", [])
+
+            history_id = results.get("historyId", history_id)
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                break
+
+        # Label changes on messages we never mirrored (e.g. an old message
+        # marked unread) need their full metadata.
+        known = self._known_ids(labels)
+        for message_id in labels:
+            if message_id not in known and message_id not in deleted:
+                added.add(message_id)
+
+        fetched = self.fetch_messages(sorted(added)) if added else []
+
+        with self._conn:
+            for message_id in deleted:
+                self._conn.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+            for message_id, label_ids in labels.items():
+                if message_id in added:
+                    continue
+                self._conn.execute(
+                    "UPDATE messages SET label_ids = ?, unread = ? WHERE id = ?",
+                    (_join_labels(label_ids), "UNREAD" in label_ids, message_id)
+                )
+            for message in fetched:
+                if "error" in message:
+                    # Usually a 404: the message was deleted after the history record
+                    self._conn.execute("DELETE FROM messages WHERE id = ?", (message["id"],))
+            self._upsert([m for m in fetched if "error" not in m])
+            self._set_history_id(history_id)
+
+        self.last_sync = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _upsert(self, messages: list[dict]):
+        """Insert or update raw metadata messages."""
+        rows = []
+        for message in messages:
+            email = parse_email(message)
+            label_ids = message.get("labelIds", [])
+            score, reasons = urgency.text_score(email["from"], email["subject"], email["snippet"])
+            rows.append((
+                message["id"],
+                message.get("threadId"),
+                int(message.get("internalDate", 0)),
+                email["from"],
+                _recipients(message),
+                email["subject"],
+                email["date"],
+                message.get("snippet", ""),
+                _join_labels(label_ids),
+                "UNREAD" in label_ids,
+                score,
+                reasons
+            ))
+        # An upsert rather than INSERT OR REPLACE keeps each row's rowid,
+        # which the full-text index refers to
+        self._conn.executemany(
+            "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET thread_id = excluded.thread_id, "
+            "internal_date = excluded.internal_date, sender = excluded.sender, "
+            "recipients = excluded.recipients, subject = excluded.subject, date = excluded.date, "
+            "snippet = excluded.snippet, label_ids = excluded.label_ids, unread = excluded.unread, "
+            "urgency = excluded.urgency, urgency_reasons = excluded.urgency_reasons",
+            rows
+        )
+
+    def _get_state(self, key: str) -> str | None:
+        row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, str(value)))
+
+    def _set_history_id(self, history_id: str):
+        self._set_state("history_id", history_id)
+        self._history_id = str(history_id)
+
+    def _known_ids(self, message_ids) -> set[str]:
+        message_ids = list(message_ids)
+        if not message_ids:
+            return set()
+        placeholders = ",".join("?" * len(message_ids))
+        rows = self._conn.execute(
+            f"SELECT id FROM messages WHERE id IN ({placeholders})", message_ids
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def add_messages(self, messages: list[dict]):
+        """Store raw metadata messages fetched outside of a sync."""
+        with self._lock, self._conn:
+            self._upsert([m for m in messages if "error" not in m])
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def unread(self, max_results: int) -> list[dict]:
+        """Newest unread messages, excluding spam and trash."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, sender, subject, date, snippet FROM messages "
+                "WHERE unread = 1 AND " + _visible_clause() +
+                " ORDER BY internal_date DESC LIMIT ?",
+                (max_results,)
+            ).fetchall()
+        return [_row_to_email(row) for row in rows]
+
+    def get_many(self, message_ids: list[str]) -> dict[str, dict]:
+        """Mirrored emails by ID; IDs not in the mirror are left out."""
+        if not message_ids:
+            return {}
+        placeholders = ",".join("?" * len(message_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, sender, subject, date, snippet FROM messages "
+                f"WHERE id IN ({placeholders})",
+                message_ids
+            ).fetchall()
+        return {row[0]: _row_to_email(row) for row in rows}
+
+    def search(self, query: LocalQuery, max_results: int) -> list[dict] | None:
+        """
+        Newest emails matching a translated query, excluding spam and trash.
+
+        Only messages newer than the seed boundary are known to be all
+        mirrored, so the answer is complete (and returned) when:
+        - `max_results` hits were found, all within that range;
+        - the query's after: bound lies within it; or
+        - the query is limited to unread mail, which is mirrored in full.
+
+        Returns:
+            Matching emails, newest first, or None if Gmail has to be asked
+        """
+        if not self.searchable:
+            return None
+        clauses = [_visible_clause()]
+        params: list = []
+        match = query.match_expression()
+        if match:
+            clauses.append("rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+            params.append(match)
+        if query.unread is not None:
+            clauses.append("unread = ?")
+            params.append(int(query.unread))
+        if query.after is not None:
+            clauses.append("internal_date >= ?")
+            params.append(query.after)
+        if query.before is not None:
+            clauses.append("internal_date < ?")
+            params.append(query.before)
+
+        with self._lock:
+            try:
+                label_ids = query.labels + [self._user_label_id(name) for name in query.user_labels]
+            except HttpError as e:
+                print(f"[WARN] Could not list Gmail labels, using live search: {e}")
+                return None
+            if None in label_ids:
+                return None
+            for label_id in label_ids:
+                clauses.append("label_ids LIKE ?")
+                params.append(f"% {label_id} %")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, sender, subject, date, snippet, internal_date FROM messages "
+                    "WHERE " + " AND ".join(clauses) + " ORDER BY internal_date DESC LIMIT ?",
+                    params + [max_results]
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                # e.g. a term FTS5 cannot parse
+                print(f"[WARN] Local email search failed, using live Gmail: {e}")
+                return None
+            complete_since = int(self._get_state("complete_since") or 0)
+            unread_complete = self._get_state("unread_complete") == "1"
+
+        complete = (
+            (len(rows) == max_results and rows[-1][5] >= complete_since)
+            or (query.after is not None and query.after >= complete_since)
+            or (query.unread is True and unread_complete)
+        )
+        if not complete:
+            return None
+        return [_row_to_email(row[:5]) for row in rows]
+
+    def urgency_candidates(self, limit: int) -> list[dict]:
+        """
+        Newest unread messages (excluding spam and trash) with what
+        urgency.rank needs: labels, thread, date and the stored text score.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, sender, subject, date, snippet, label_ids, thread_id, internal_date, "
+                "urgency, urgency_reasons FROM messages WHERE unread = 1 AND " + _visible_clause() +
+                " ORDER BY internal_date DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        candidates = []
+        for row in rows:
+            email = _row_to_email(row[:5])
+            email.update(
+                labels=row[5].split(),
+                thread_id=row[6],
+                internal_date=row[7],
+                text_score=row[8] or 0.0,
+                text_reasons=row[9] or ""
+            )
+            candidates.append(email)
+        return candidates
+
+    def sent_counts(self) -> dict[str, int]:
+        """Messages the user sent per recipient address, recomputed after each sync."""
+        with self._lock:
+            history_id, cached_counts = self._sent_counts
+            if history_id == self.history_id:
+                return cached_counts
+            counts: dict[str, int] = {}
+            for (recipients,) in self._conn.execute(
+                "SELECT recipients FROM messages WHERE label_ids LIKE '% SENT %'"
+            ):
+                for address in urgency.recipient_addresses(recipients or ""):
+                    counts[address] = counts.get(address, 0) + 1
+            self._sent_counts = (self.history_id, counts)
+            return counts
+
+    def reply_times(self, thread_ids) -> dict[str, int]:
+        """Time (ms) of the user's latest sent message in each of the threads."""
+        thread_ids = [thread_id for thread_id in thread_ids if thread_id]
+        if not thread_ids:
+            return {}
+        placeholders = ",".join("?" * len(thread_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, MAX(internal_date) FROM messages "
+                f"WHERE label_ids LIKE '% SENT %' AND thread_id IN ({placeholders}) GROUP BY thread_id",
+                thread_ids
+            ).fetchall()
+        return dict(rows)
+
+    def _user_label_id(self, name: str) -> str | None:
+        """ID of a user label by its query name; labels are listed once per seed."""
+        if self._label_ids is None:
+            labels = self.service.users().labels().list(userId="me").execute()
+            self._label_ids = {
+                label_query_name(entry["name"]): entry["id"] for entry in labels.get("labels", [])
+            }
+        return self._label_ids.get(name)
+
+
+def parse_email(message: dict) -> dict:
+    """Extract ID, sender, subject, date and snippet from a metadata message."""
+    email = {
+        "id": message.get("id", ""),
+        "snippet": message.get("snippet", ""),
+        "from": "",
+        "subject": "",
+        "date": ""
+    }
+    for header in message.get("payload", {}).get("headers", []):
+        name = header.get("name", "").lower()
+        if name in ("from", "subject", "date"):
+            email[name] = header.get("value", "")
+    return email
+
+
+def _recipients(message: dict) -> str:
+    """To and Cc headers of a metadata message."""
+    return ", ".join(
+        header.get("value", "")
+        for header in message.get("payload", {}).get("headers", [])
+        if header.get("name", "").lower() in ("to", "cc")
+    )
+
+
+def _join_labels(label_ids: list[str]) -> str:
+    # Surrounding spaces let LIKE '% LABEL %' match whole label names
+    return " " + " ".join(label_ids) + " "
+
+
+def _visible_clause() -> str:
+    return " AND ".join(f"label_ids NOT LIKE '% {label} %'" for label in HIDDEN_LABELS)
+
+
+def _row_to_email(row) -> dict:
+    message_id, sender, subject, date, snippet = row
+    return {
+        "id": message_id,
+        "snippet": snippet,
+        "from": sender,
+        "subject": subject,
+        "date": date
+    }
@@ -0,0 +1,528 @@
+"""
+Push - Change notifications from Gmail watch and Calendar channels.
+
+Instead of polling, each account asks Google to notify the server when
+its mailbox or primary calendar changes:
+- Gmail `users.watch` publishes to a Cloud Pub/Sub topic
+  (GMAIL_PUBSUB_TOPIC) whose push subscription POSTs to
+  /webhooks/gmail?token=PUSH_TOKEN.
+- Calendar `events.watch` opens a channel that POSTs to
+  /webhooks/calendar, with the channel's ID and token in X-Goog-* headers.
+
+A notification triggers an incremental sync of that account's mailbox
+mirror (history.list) or event store (syncToken) and drops its cached
+tool results. Notifications arriving while a sync runs are coalesced
+into one follow-up sync. While a watch is live the mirror and store poll
+only every PUSH_FALLBACK_MAX_AGE seconds, as a safety net for lost
+notifications.
+
+Watches expire (Gmail's after 7 days, channels when Google says), so
+they are renewed ahead of time, and channels are stopped on shutdown.
+The Gmail watch is left running: there is only one per account, and the
+next start replaces it.
+
+Watches and channel tokens live in this process, so push requires a
+single server worker (WEB_CONCURRENCY=1).
+
+With PUSH_MODE=local nothing is registered with Google: watches are only
+recorded, in DATA_DIR/push-local.json, for utils.notifier to send
+Google-shaped notifications to the webhooks.
+"""
+
+import asyncio
+import base64
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+import uuid
+from typing import Callable
+
+from utils.config import get_data_dir, env_bool, env_int, env_float
+from utils.metrics import PUSH_NOTIFICATIONS
+from .accounts import GoogleAccount, current_account
+from .cache import invalidate_tool_cache
+from .clients import run_google_io
+
+# Cached functions whose results a change to each source invalidates
+CACHED_BY_SOURCE = {
+    "gmail": ("fetch_unread_emails", "fetch_search_results", "fetch_urgent_emails"),
+    "calendar": (
+        "fetch_today_events", "fetch_week_events", "fetch_tomorrow_events",
+        "fetch_events_between", "fetch_schedule_analysis"
+    ),
+}
+
+# Gmail watches last 7 days; Google recommends renewing them daily
+GMAIL_WATCH_SECONDS = 7 * 86400
+
+
+class Watch:
+    """One registered Gmail watch or Calendar channel."""
+
+    def __init__(
+        self,
+        source: str,
+        user_id: str | None,
+        expiration: float,
+        channel_id: str | None = None,
+        token: str | None = None,
+        resource_id: str | None = None,
+        email: str | None = None
+    ):
+        self.source = source
+        self.user_id = user_id
+        self.expiration = expiration
+        self.channel_id = channel_id
+        self.token = token
+        self.resource_id = resource_id
+        self.email = email
+        self.started = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "user_id": self.user_id,
+            "expiration": self.expiration,
+            "channel_id": self.channel_id,
+            "token": self.token,
+            "resource_id": self.resource_id,
+            "email": self.email,
+        }
+
+
+class PushManager:
+    """Registers, renews and dispatches Gmail and Calendar notifications."""
+
+    def __init__(
+        self,
+        account_lookup: Callable[[str | None], GoogleAccount | None],
+        mode: str = "google",
+        base_url: str = "",
+        pubsub_topic: str = "",
+        push_token: str = "",
+        channel_ttl: float = 7 * 86400,
+        renew_margin: float = 3600.0,
+        renew_interval: float = 86400.0,
+        fallback_max_age: float = 600.0
+    ):
+        """
+        Args:
+            account_lookup: Built account for a user ID, or None if it has
+                been evicted or removed; must not build accounts or mark
+                them as used
+            mode: "google" to register watches with Google, "local" to only
+                record them for utils.notifier
+            base_url: Public HTTPS URL of this server, for Calendar channels
+            pubsub_topic: Pub/Sub topic Gmail publishes to
+                (projects/<project>/topics/<topic>)
+            push_token: Secret the Pub/Sub push subscription sends as ?token=
+            channel_ttl: Requested Calendar channel lifetime in seconds
+            renew_margin: Renew a watch this long before it expires
+            renew_interval: Renew a watch at least this often
+            fallback_max_age: Mirror/store max_age while a watch is live
+        """
+        self.account_lookup = account_lookup
+        self.mode = mode
+        self.base_url = base_url.rstrip("/")
+        self.pubsub_topic = pubsub_topic
+        self.push_token = push_token
+        self.channel_ttl = channel_ttl
+        self.renew_margin = renew_margin
+        self.renew_interval = renew_interval
+        self.fallback_max_age = fallback_max_age
+
+        self._watches: dict[tuple[str, str | None], Watch] = {}
+        self._starting: set[str | None] = set()
+        self._lock = threading.Lock()
+        # (source, user_id) -> running refresh; keys re-notified meanwhile,
+        # with the newest historyId reported for them
+        self._refreshing: dict[tuple[str, str | None], asyncio.Task] = {}
+        self._dirty: dict[tuple[str, str | None], str | None] = {}
+
+        self.renewals = 0
+        self.failures = 0
+
+    @property
+    def sources(self) -> list[str]:
+        """Sources that can be watched with this configuration."""
+        if self.mode == "local":
+            return ["gmail", "calendar"]
+        sources = []
+        if self.pubsub_topic:
+            sources.append("gmail")
+        if self.base_url.startswith("https://"):
+            sources.append("calendar")
+        return sources
+
+    # ------------------------------------------------------------------
+    # Watch lifecycle
+    # ------------------------------------------------------------------
+
+    def watch(self, account: GoogleAccount):
+        """Start any missing watches for an account (blocking)."""
+        for source in self.sources:
+            with self._lock:
+                if (source, account.user_id) in self._watches:
+                    continue
+            try:
+                self._start(source, account)
+            except Exception as e:
+                self.failures += 1
+                print(f"[WARN] Could not watch {source} for {account.user_id or 'default account'}: {e}")
+
+    def ensure_watched(self, account: GoogleAccount):
+        """Start watching an account in the background, once (non-blocking)."""
+        with self._lock:
+            watched = [source for source in self.sources if (source, account.user_id) in self._watches]
+            if account.user_id in self._starting or len(watched) == len(self.sources):
+                # The account's caches may be new if it was rebuilt while
+                # its watches were being released
+                for source in watched:
+                    self._relax(account, source)
+                return
+            self._starting.add(account.user_id)
+
+        async def start():
+            try:
+                await run_google_io(self.watch, account)
+            finally:
+                with self._lock:
+                    self._starting.discard(account.user_id)
+
+        asyncio.get_running_loop().create_task(start())
+
+    def _start(self, source: str, account: GoogleAccount) -> Watch:
+        """Register a new watch and replace (then stop) the previous one."""
+        if source == "gmail":
+            watch = self._start_gmail(account)
+        else:
+            watch = self._start_calendar(account)
+
+        with self._lock:
+            previous = self._watches.get((source, account.user_id))
+            self._watches[(source, account.user_id)] = watch
+        self._relax(account, source)
+        # A renewed Gmail watch replaces the old one; channels are separate
+        if previous is not None and source == "calendar":
+            self._stop(previous, account)
+        self._save_local()
+        return watch
+
+    def _relax(self, account: GoogleAccount, source: str):
+        """Poll a watched source only every fallback_max_age seconds."""
+        cache = account.mirror if source == "gmail" else account.event_store
+        if cache is not None and not hasattr(cache, "polling_max_age"):
+            cache.polling_max_age = cache.max_age
+            cache.max_age = max(cache.max_age, self.fallback_max_age)
+
+    def _start_gmail(self, account: GoogleAccount) -> Watch:
+        profile = account.gmail.users().getProfile(userId="me").execute()
+        expiration = time.time() + GMAIL_WATCH_SECONDS
+        if self.mode != "local":
+            response = account.gmail.users().watch(
+                userId="me",
+                body={"topicName": self.pubsub_topic}
+            ).execute()
+            expiration = int(response["expiration"]) / 1000
+        return Watch("gmail", account.user_id, expiration, email=profile["emailAddress"].lower())
+
+    def _start_calendar(self, account: GoogleAccount) -> Watch:
+        channel_id = uuid.uuid4().hex
+        token = secrets.token_urlsafe(24)
+        resource_id = f"local-{channel_id}"
+        expiration = time.time() + self.channel_ttl
+        if self.mode != "local":
+            response = account.calendar.events().watch(
+                calendarId="primary",
+                body={
+                    "id": channel_id,
+                    "type": "web_hook",
+                    "address": f"{self.base_url}/webhooks/calendar",
+                    "token": token,
+                    "params": {"ttl": str(int(self.channel_ttl))}
+                }
+            ).execute()
+            resource_id = response["resourceId"]
+            expiration = int(response["expiration"]) / 1000
+        return Watch("calendar", account.user_id, expiration, channel_id, token, resource_id)
+
+    def _stop(self, watch: Watch, account: GoogleAccount | None):
+        """Ask Google to stop sending a Calendar channel's notifications."""
+        # users.stop would end the account's only Gmail watch, which the
+        # next start (or another process) relies on; it is replaced instead
+        if self.mode == "local" or account is None or watch.source != "calendar":
+            return
+        try:
+            account.calendar.channels().stop(
+                body={"id": watch.channel_id, "resourceId": watch.resource_id}
+            ).execute()
+        except Exception as e:
+            print(f"[WARN] Could not stop {watch.source} notifications: {e}")
+
+    def _forget(self, watch: Watch, account: GoogleAccount | None):
+        """Drop a watch and go back to polling at the normal rate."""
+        with self._lock:
+            if self._watches.get((watch.source, watch.user_id)) is watch:
+                del self._watches[(watch.source, watch.user_id)]
+        if account is not None:
+            cache = account.mirror if watch.source == "gmail" else account.event_store
+            if cache is not None and hasattr(cache, "polling_max_age"):
+                cache.max_age = cache.polling_max_age
+                del cache.polling_max_age
+        self._save_local()
+
+    def release(self, account: GoogleAccount):
+        """
+        Stop an account's Calendar channel and forget its watches, e.g. when
+        the account registry evicts it (blocking). The account is watched
+        again on its next use.
+        """
+        with self._lock:
+            watches = [w for w in self._watches.values() if w.user_id == account.user_id]
+        for watch in watches:
+            self._stop(watch, account)
+            self._forget(watch, account)
+
+    def renew_due(self):
+        """Renew watches that expire within renew_margin or are older than renew_interval (blocking)."""
+        now = time.time()
+        with self._lock:
+            due = [
+                watch for watch in self._watches.values()
+                if watch.expiration - self.renew_margin <= now or watch.started + self.renew_interval <= now
+            ]
+        for watch in due:
+            account = self.account_lookup(watch.user_id)
+            if account is None:
+                # The account was evicted or removed; its watch lapses on its own
+                self._forget(watch, None)
+                continue
+            try:
+                self._start(watch.source, account)
+                self.renewals += 1
+            except Exception as e:
+                self.failures += 1
+                print(f"[WARN] Could not renew {watch.source} watch: {e}")
+                if watch.expiration <= time.time():
+                    self._forget(watch, account)
+
+    def stop_all(self):
+        """Stop every Calendar channel and forget all watches, e.g. on shutdown (blocking)."""
+        with self._lock:
+            watches = list(self._watches.values())
+        for watch in watches:
+            account = self.account_lookup(watch.user_id)
+            self._stop(watch, account)
+            self._forget(watch, account)
+
+    async def run(self, interval: float = 300.0):
+        """Background loop that renews watches before they expire."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_google_io(self.renew_due)
+            except Exception as e:
+                print(f"[WARN] Watch renewal failed: {e}")
+
+    def _save_local(self):
+        """Record watches (and the Pub/Sub token) for utils.notifier in local mode."""
+        if self.mode != "local":
+            return
+        with self._lock:
+            state = {
+                "push_token": self.push_token,
+                "watches": [watch.to_dict() for watch in self._watches.values()]
+            }
+        path = get_data_dir() / "push-local.json"
+        temp = path.with_suffix(".tmp")
+        temp.write_text(json.dumps(state, indent=2))
+        os.replace(temp, path)
+
+    # ------------------------------------------------------------------
+    # Notifications
+    # ------------------------------------------------------------------
+
+    def handle_gmail(self, token: str, payload: dict) -> bool:
+        """
+        Handle a Pub/Sub push of a Gmail change.
+
+        Args:
+            token: The ?token= the subscription was configured with
+            payload: Push body: {"message": {"data": base64 JSON
+                {"emailAddress", "historyId"}, ...}, "subscription"}
+
+        Returns:
+            Whether a refresh was scheduled
+
+        Raises:
+            PermissionError: If the token does not match PUSH_TOKEN
+            ValueError: If the payload is malformed
+        """
+        if not self.push_token or not hmac.compare_digest(token or "", self.push_token):
+            PUSH_NOTIFICATIONS.inc(source="gmail", outcome="rejected")
+            raise PermissionError("Invalid push token")
+        try:
+            data = json.loads(base64.b64decode(payload["message"]["data"]))
+            email = data["emailAddress"].lower()
+        except (KeyError, TypeError, ValueError) as e:
+            PUSH_NOTIFICATIONS.inc(source="gmail", outcome="invalid")
+            raise ValueError(f"Malformed Gmail notification: {e}") from None
+
+        with self._lock:
+            watch = next(
+                (w for w in self._watches.values() if w.source == "gmail" and w.email == email), None
+            )
+        if watch is None:
+            PUSH_NOTIFICATIONS.inc(source="gmail", outcome="ignored")
+            return False
+        PUSH_NOTIFICATIONS.inc(source="gmail", outcome="accepted")
+        self._schedule_refresh("gmail", watch.user_id, data.get("historyId"))
+        return True
+
+    def handle_calendar(self, channel_id: str, token: str, state: str) -> bool:
+        """
+        Handle a Calendar channel notification (from its X-Goog-* headers).
+
+        Args:
+            channel_id: X-Goog-Channel-ID
+            token: X-Goog-Channel-Token
+            state: X-Goog-Resource-State: "sync" when the channel opens,
+                "exists" or "not_exists" on changes
+
+        Returns:
+            Whether a refresh was scheduled
+
+        Raises:
+            PermissionError: If the token does not match the channel's
+        """
+        with self._lock:
+            watch = next(
+                (w for w in self._watches.values() if w.source == "calendar" and w.channel_id == channel_id),
+                None
+            )
+        if watch is None:
+            # A channel from before a restart, or one that was replaced
+            PUSH_NOTIFICATIONS.inc(source="calendar", outcome="ignored")
+            return False
+        if not hmac.compare_digest(token or "", watch.token):
+            PUSH_NOTIFICATIONS.inc(source="calendar", outcome="rejected")
+            raise PermissionError("Invalid channel token")
+        if state == "sync":
+            PUSH_NOTIFICATIONS.inc(source="calendar", outcome="sync")
+            return False
+        PUSH_NOTIFICATIONS.inc(source="calendar", outcome="accepted")
+        self._schedule_refresh("calendar", watch.user_id)
+        return True
+
+    def _schedule_refresh(self, source: str, user_id: str | None, history_id: str | None = None):
+        """Refresh in the background; coalesce with a refresh already running."""
+        key = (source, user_id)
+        pending = self._dirty.get(key)
+        # Pub/Sub does not preserve order
+        if pending is not None and history_id is not None and int(pending) > int(history_id):
+            history_id = pending
+        self._dirty[key] = history_id
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                while key in self._dirty:
+                    latest = self._dirty.pop(key)
+                    try:
+                        await run_google_io(self._refresh, source, user_id, latest)
+                    except Exception as e:
+                        self.failures += 1
+                        print(f"[WARN] Push refresh of {source} failed: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.get_running_loop().create_task(refresh())
+
+    def _refresh(self, source: str, user_id: str | None, history_id: str | None):
+        """Incrementally sync one source of one account and drop its cached results."""
+        account = self.account_lookup(user_id)
+        if account is None:
+            return
+        if source == "gmail":
+            mirror = account.mirror
+            # Gmail may notify about changes the mirror has already applied
+            if mirror is not None and mirror.history_id is not None and (
+                history_id is None or int(history_id) > int(mirror.history_id)
+            ):
+                mirror.sync()
+        else:
+            store = account.event_store
+            # A store that has never synced will fetch everything on first use
+            if store is not None and store.last_sync:
+                store.sync()
+        for name in CACHED_BY_SOURCE[source]:
+            invalidate_tool_cache(name, user_id)
+
+    def stats(self) -> dict:
+        """Watch and renewal counters, for the health endpoint."""
+        with self._lock:
+            watches = list(self._watches.values())
+        return {
+            "mode": self.mode,
+            "sources": self.sources,
+            "gmail_watches": sum(w.source == "gmail" for w in watches),
+            "calendar_channels": sum(w.source == "calendar" for w in watches),
+            "refreshing": len(self._refreshing),
+            "renewals": self.renewals,
+            "failures": self.failures,
+        }
+
+
+def create_push_manager(registry=None) -> PushManager | None:
+    """
+    PushManager configured from the environment, or None unless
+    PUSH_NOTIFICATIONS is set.
+
+    Args:
+        registry: AccountRegistry in multi-account mode; otherwise watches
+            are for the default account
+    """
+    if not env_bool("PUSH_NOTIFICATIONS", False):
+        return None
+    if env_int("WEB_CONCURRENCY", 1) > 1:
+        # Each worker would register its own watches, and a notification
+        # reaching another worker would find no matching channel
+        print("[WARN] PUSH_NOTIFICATIONS is disabled: it requires WEB_CONCURRENCY=1")
+        return None
+
+    def account_lookup(user_id: str | None) -> GoogleAccount | None:
+        if registry is None:
+            return current_account()
+        return registry.peek(user_id)
+
+    mode = os.getenv("PUSH_MODE", "google").lower()
+    push_token = os.getenv("PUSH_TOKEN", "")
+    pubsub_topic = os.getenv("GMAIL_PUBSUB_TOPIC", "")
+    if mode == "local" and not push_token:
+        push_token = secrets.token_urlsafe(24)
+    elif pubsub_topic and not push_token:
+        # Every Pub/Sub push would be rejected while polling is relaxed
+        print("[WARN] Gmail push notifications are disabled: GMAIL_PUBSUB_TOPIC requires PUSH_TOKEN")
+        pubsub_topic = ""
+    manager = PushManager(
+        account_lookup,
+        mode=mode,
+        base_url=os.getenv("PUSH_BASE_URL", ""),
+        pubsub_topic=pubsub_topic,
+        push_token=push_token,
+        channel_ttl=env_float("CALENDAR_CHANNEL_TTL", 7 * 86400.0),
+        renew_margin=env_float("PUSH_RENEW_MARGIN", 3600.0),
+        renew_interval=env_float("PUSH_RENEW_INTERVAL", 86400.0),
+        fallback_max_age=env_float("PUSH_FALLBACK_MAX_AGE", 600.0)
+    )
+    if not manager.sources:
+        print("[WARN] PUSH_NOTIFICATIONS needs GMAIL_PUBSUB_TOPIC and/or an https PUSH_BASE_URL")
+        return None
+    if registry is not None:
+        # Evicted accounts stop being watched, rather than being rebuilt to renew or refresh
+        registry.on_evict(manager.release)
+    return manager
@@ -0,0 +1,393 @@
+"""
+Quota - Rate limiting and retries for Google API requests.
+
+Every Gmail and Calendar request passes through `call` (see
+clients.ManagedHttpRequest). Before it is sent, a request takes its cost in
+quota units from two token buckets: the user's bucket for that API and the
+API's shared bucket (the project quota). Callers waiting on a bucket are
+served first come, first served, so under load concurrent requests queue
+in order instead of racing each other into 429s, and throughput levels off
+at the quota rather than collapsing.
+
+Rate-limit responses (429, or 403 rateLimitExceeded) and transient failures
+(5xx, dropped connections) are retried with jittered exponential backoff,
+honoring Retry-After. A rate-limit response also pauses the user's bucket,
+so the user's other in-flight requests back off with it.
+
+Buckets live in this process; with several workers, divide the project
+rates between them.
+"""
+
+import email.utils
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from utils.config import env_int, env_float
+from utils.metrics import GOOGLE_RETRIES, QUOTA_WAIT, google_api_span, record_timing
+
+# Gmail quota units per method; Calendar quotas count requests, so every
+# Calendar method (and any method not listed) costs DEFAULT_UNITS
+QUOTA_UNITS = {
+    "gmail.users.getProfile": 1,
+    "gmail.users.labels.list": 1,
+    "gmail.users.history.list": 2,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.modify": 5,
+    "gmail.users.threads.get": 10,
+    "gmail.users.threads.list": 10,
+    "gmail.users.stop": 50,
+    "gmail.users.watch": 100,
+    "gmail.users.messages.send": 100,
+}
+DEFAULT_UNITS = 1
+
+# Default rates in units per second (0 = unlimited). Gmail allows 250 units
+# per user per second and 1,200,000 per project per minute; Calendar allows
+# about 600 requests per user per minute.
+DEFAULT_RATES = {
+    ("gmail", "user"): 250.0,
+    ("gmail", "project"): 20000.0,
+    ("calendar", "user"): 10.0,
+    ("calendar", "project"): 0.0,
+}
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+
+
+class QuotaExceededError(HttpError):
+    """
+    The local quota could not be acquired in time.
+
+    Raised as a 429 HttpError so tools report it like a rate-limit
+    response from Google.
+    """
+
+    def __init__(self, api: str, waited: float):
+        content = (
+            '{"error": {"code": 429, "message": "%s API quota exhausted after waiting %.0fs; '
+            'try again in a minute"}}' % (api, waited)
+        ).encode()
+        super().__init__(httplib2.Response({"status": 429}), content)
+
+
+class TokenBucket:
+    """
+    Token bucket with first-come, first-served waiting.
+
+    Holds up to `capacity` units and refills at `rate` units per second. A
+    request costing more than the capacity waits for a full bucket.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: deque[object] = deque()
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, units: float, timeout: float) -> float:
+        """
+        Take `units`, waiting behind earlier callers if needed.
+
+        Args:
+            units: Quota cost of the request
+            timeout: Longest time to wait, in seconds
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            TimeoutError: If the units cannot be taken within `timeout`
+        """
+        units = min(units, self.capacity)
+        started = time.monotonic()
+        deadline = started + timeout
+        ticket = object()
+        with self._cond:
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] is not ticket:
+                        # Woken when the caller ahead of us leaves the queue
+                        if now >= deadline:
+                            raise TimeoutError
+                        self._cond.wait(deadline - now)
+                        continue
+                    delay = max(self._paused_until - now, (units - self._tokens) / self.rate)
+                    if delay <= 0:
+                        self._tokens -= units
+                        return now - started
+                    if now + delay > deadline:
+                        raise TimeoutError
+                    self._cond.wait(delay)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Hand out no units for the next `seconds`."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class QuotaLimiter:
+    """Token buckets per (API, user) and per API, created on first use."""
+
+    def __init__(self, rates: dict[tuple[str, str], float], burst: float, max_wait: float):
+        """
+        Args:
+            rates: Units per second by (api, "user" | "project"); 0 = unlimited
+            burst: Seconds of quota a bucket can accumulate while idle
+            max_wait: Longest time a request waits for quota
+        """
+        self.rates = rates
+        self.burst = burst
+        self.max_wait = max_wait
+        self._buckets: dict[tuple[str, str | None], TokenBucket | None] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, api: str, scope: str, key: str | None) -> TokenBucket | None:
+        with self._lock:
+            if (api, key) not in self._buckets:
+                rate = self.rates.get((api, scope), 0.0)
+                self._buckets[(api, key)] = TokenBucket(rate, max(rate * self.burst, 1.0)) if rate > 0 else None
+            return self._buckets[(api, key)]
+
+    def user_bucket(self, api: str, user: str | None) -> TokenBucket | None:
+        return self._bucket(api, "user", f"user:{user or ''}")
+
+    def project_bucket(self, api: str) -> TokenBucket | None:
+        return self._bucket(api, "project", None)
+
+    def acquire(self, api: str, user: str | None, units: float):
+        """
+        Take `units` from the user's and the project's bucket.
+
+        Raises:
+            QuotaExceededError: If either bucket stays empty for max_wait
+        """
+        waited = 0.0
+        for bucket in (self.user_bucket(api, user), self.project_bucket(api)):
+            if bucket is None:
+                continue
+            try:
+                waited += bucket.acquire(units, self.max_wait - waited)
+            except TimeoutError:
+                raise QuotaExceededError(api, self.max_wait) from None
+        QUOTA_WAIT.observe(waited, api=api)
+        if waited > 0:
+            record_timing("quota", waited)
+
+    def pause(self, api: str, user: str | None, seconds: float) -> bool:
+        """Pause the user's bucket; False if the user is not rate-limited (rate 0)."""
+        bucket = self.user_bucket(api, user)
+        if bucket is None:
+            return False
+        bucket.pause(seconds)
+        return True
+
+
+_limiter: QuotaLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def _quota_limiter() -> QuotaLimiter:
+    """The process-wide limiter, configured from the environment on first use."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            rates = {
+                (api, scope): env_float(f"QUOTA_{api.upper()}_{scope.upper()}_RATE", default)
+                for (api, scope), default in DEFAULT_RATES.items()
+            }
+            _limiter = QuotaLimiter(
+                rates,
+                burst=env_float("QUOTA_BURST_SECONDS", 1.0),
+                max_wait=env_float("QUOTA_MAX_WAIT", 30.0)
+            )
+        return _limiter
+
+
+def method_units(method_id: str | None) -> int:
+    """Quota cost of one call to an API method."""
+    return QUOTA_UNITS.get(method_id, DEFAULT_UNITS)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether Google rejected the request for exceeding a rate limit."""
+    if not isinstance(error, HttpError) or isinstance(error, QuotaExceededError):
+        return False
+    status = error.resp.status
+    return status == 429 or (status == 403 and any(reason in error.content for reason in RATE_LIMIT_REASONS))
+
+
+def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    """
+    Whether a failed request is worth sending again.
+
+    Rate-limited requests were not processed, so they are always safe to
+    retry; server errors and dropped connections only for idempotent ones.
+    """
+    if is_rate_limited(error):
+        return True
+    if not idempotent or isinstance(error, QuotaExceededError):
+        return False
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds requested by the response's Retry-After header, if any."""
+    resp = getattr(error, "resp", None)
+    value = resp.get("retry-after") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff_delay(attempt: int, requested: float | None = None) -> float:
+    """
+    Jittered exponential backoff before retry number `attempt` (from 0).
+
+    The delay is drawn between half and all of GOOGLE_BACKOFF_BASE * 2^attempt
+    (capped at GOOGLE_BACKOFF_MAX), so requests that failed together do not
+    retry together; a Retry-After value is used as the lower bound.
+    """
+    ceiling = min(env_float("GOOGLE_BACKOFF_MAX", 32.0), env_float("GOOGLE_BACKOFF_BASE", 0.5) * 2 ** attempt)
+    delay = random.uniform(ceiling / 2, ceiling)
+    return max(delay, requested) if requested is not None else delay
+
+
+def _status(error: Exception) -> str:
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return str(status) if status else type(error).__name__
+
+
+def _back_off(api: str, user: str | None, attempt: int, error: Exception, max_wait: float) -> bool:
+    """
+    Wait before retrying after `error`.
+
+    Rate limits pause the user's bucket, so the retry (and the user's other
+    requests) queue behind the pause; other failures, and users without a
+    bucket (rate 0), just sleep.
+
+    Returns:
+        False if the backoff would exceed max_wait, i.e. give up instead
+    """
+    delay = backoff_delay(attempt, retry_after(error))
+    if delay > max_wait:
+        return False
+    if not (is_rate_limited(error) and _quota_limiter().pause(api, user, delay)):
+        time.sleep(delay)
+    return True
+
+
+def call(method_id: str, send, user: str | None, units: int | None = None, idempotent: bool = True):
+    """
+    Send a Google API request within quota, retrying transient failures.
+
+    Args:
+        method_id: API method ID, e.g. "gmail.users.messages.get"
+        send: Callable that sends the request once and returns the response
+        user: Quota owner (None for the single-user default account)
+        units: Quota cost (defaults to the method's cost)
+        idempotent: Whether server errors may be retried
+
+    Returns:
+        The response of the first successful attempt
+
+    Raises:
+        HttpError: If the request fails for good, or retries run out
+        QuotaExceededError: If quota did not free up within QUOTA_MAX_WAIT
+    """
+    limiter = _quota_limiter()
+    api = method_id.split(".", 1)[0]
+    cost = method_units(method_id) if units is None else units
+    max_retries = env_int("GOOGLE_MAX_RETRIES", 4)
+    for attempt in itertools.count():
+        limiter.acquire(api, user, cost)
+        try:
+            with google_api_span(method_id):
+                return send()
+        except Exception as error:
+            if attempt >= max_retries or not is_retryable(error, idempotent):
+                raise
+            if not _back_off(api, user, attempt, error, limiter.max_wait):
+                raise
+            GOOGLE_RETRIES.inc(method=method_id, status=_status(error))
+
+
+def execute_batch(service, method_id: str, requests: dict[str, object]) -> dict[str, tuple]:
+    """
+    Send requests as one batch, resending the parts that were rate limited.
+
+    Google rate-limits batch parts individually, so a batch can come back
+    with some parts answered and others rejected with 429. Those parts are
+    retried in a smaller batch after backing off, and the batch as a whole
+    is retried like any request. Each part costs its own method's units.
+
+    Args:
+        service: API service that creates the batch
+        method_id: Name the batch is timed under, e.g. "gmail.users.messages.batchGet"
+        requests: Request ID -> request built by `service`
+
+    Returns:
+        Request ID -> (response, exception) for every request
+    """
+    first = next(iter(requests.values()), None)
+    user = getattr(first, "quota_user", None)
+    api = method_id.split(".", 1)[0]
+    max_retries = env_int("GOOGLE_MAX_RETRIES", 4)
+
+    results: dict[str, tuple] = {}
+    pending = dict(requests)
+    for attempt in itertools.count():
+        if not pending:
+            break
+
+        def on_response(request_id, response, exception):
+            results[request_id] = (response, exception)
+
+        batch = service.new_batch_http_request(callback=on_response)
+        for request_id, request in pending.items():
+            batch.add(request, request_id=request_id)
+        cost = sum(method_units(getattr(request, "methodId", None)) for request in pending.values())
+        call(method_id, batch.execute, user, units=cost)
+
+        limited = [request_id for request_id in pending if is_rate_limited(results[request_id][1])]
+        if not limited or attempt >= max_retries:
+            break
+        error = results[limited[0]][1]
+        if not _back_off(api, user, attempt, error, _quota_limiter().max_wait):
+            break
+        GOOGLE_RETRIES.inc(len(limited), method=method_id, status=_status(error))
+        pending = {request_id: pending[request_id] for request_id in limited}
+    return results
@@ -0,0 +1,180 @@
+"""
+Schedule Analysis - Conflicts and free time computed from event intervals.
+
+Works on raw start/end timestamps rather than formatted event listings:
+overlapping meetings come from one sweep over the events sorted by start
+time, and free slots from the gaps between merged busy intervals inside
+working hours, both in O(n log n).
+"""
+
+import heapq
+import os
+from datetime import date, datetime, time, timedelta, tzinfo
+
+from .event_store import parse_event_time
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+class ScheduleConfigError(ValueError):
+    """WORKING_HOURS or WORKING_DAYS is malformed."""
+
+
+class Busy:
+    """Time an event blocks, as aware datetimes."""
+
+    __slots__ = ("start", "end", "summary")
+
+    def __init__(self, start: datetime, end: datetime, summary: str):
+        self.start = start
+        self.end = end
+        self.summary = summary
+
+
+def busy_intervals(events: list[dict]) -> list[Busy]:
+    """
+    Timed events that block the user's time, sorted by start.
+
+    All-day events, events marked "free" (transparent), working-location
+    entries and invitations the user declined do not block time.
+    """
+    intervals = []
+    for event in events:
+        start, end = event.get("start", {}), event.get("end", {})
+        if "dateTime" not in start or "dateTime" not in end:
+            continue
+        if event.get("transparency") == "transparent" or event.get("eventType") == "workingLocation":
+            continue
+        if any(a.get("self") and a.get("responseStatus") == "declined" for a in event.get("attendees", [])):
+            continue
+        busy = Busy(parse_event_time(start), parse_event_time(end), event.get("summary", "No title"))
+        if busy.end > busy.start:
+            intervals.append(busy)
+    intervals.sort(key=lambda busy: (busy.start, busy.end))
+    return intervals
+
+
+def find_conflicts(intervals: list[Busy]) -> list[tuple[Busy, Busy, datetime, datetime]]:
+    """
+    Every pair of overlapping intervals, with the overlap.
+
+    Sweeps the intervals in start order, keeping the ones still running in
+    a heap keyed by end time: each interval overlaps exactly the intervals
+    left in the heap when it starts.
+
+    Args:
+        intervals: Intervals sorted by start (as from busy_intervals)
+
+    Returns:
+        (earlier, later, overlap start, overlap end) in order of overlap start
+    """
+    conflicts = []
+    active: list[tuple[datetime, int, Busy]] = []
+    for index, busy in enumerate(intervals):
+        while active and active[0][0] <= busy.start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            conflicts.append((other, busy, busy.start, min(other.end, busy.end)))
+        heapq.heappush(active, (busy.end, index, busy))
+    conflicts.sort(key=lambda conflict: (conflict[2], conflict[3]))
+    return conflicts
+
+
+def free_slots(
+    intervals: list[Busy],
+    windows: list[tuple[datetime, datetime]],
+    min_duration: timedelta
+) -> list[tuple[datetime, datetime]]:
+    """
+    Gaps of at least `min_duration` between busy intervals, inside windows.
+
+    Args:
+        intervals: Busy intervals sorted by start
+        windows: Non-overlapping (start, end) windows in order, e.g. working hours
+        min_duration: Shortest gap worth reporting
+
+    Returns:
+        (start, end) free slots in order
+    """
+    slots = []
+    position = 0
+    for window_start, window_end in windows:
+        # Intervals that ended before this window cannot affect it (or later ones)
+        while position < len(intervals) and intervals[position].end <= window_start:
+            position += 1
+        cursor = window_start
+        for busy in intervals[position:]:
+            if busy.start >= window_end:
+                break
+            if busy.start - cursor >= min_duration:
+                slots.append((cursor, busy.start))
+            cursor = max(cursor, busy.end)
+        if window_end - cursor >= min_duration:
+            slots.append((cursor, window_end))
+    return slots
+
+
+def working_windows(
+    first_day: date,
+    last_day: date,
+    zone: tzinfo,
+    not_before: datetime | None = None
+) -> list[tuple[datetime, datetime]]:
+    """
+    Working hours (WORKING_HOURS on WORKING_DAYS) for each day in a range.
+
+    Args:
+        first_day: First day, in the user's time zone
+        last_day: Last day (inclusive)
+        zone: The user's time zone
+        not_before: Cut windows off before this time (e.g. now)
+    """
+    day_start, day_end = working_hours()
+    days = working_days()
+    windows = []
+    day = first_day
+    while day <= last_day:
+        if WEEKDAYS[day.weekday()] in days:
+            start = datetime.combine(day, day_start, zone)
+            end = datetime.combine(day, day_end, zone)
+            if not_before is not None:
+                start = max(start, not_before)
+            if end > start:
+                windows.append((start, end))
+        day += timedelta(days=1)
+    return windows
+
+
+def working_hours() -> tuple[time, time]:
+    """
+    WORKING_HOURS as (start, end), e.g. "09:00-17:00".
+
+    Raises:
+        ScheduleConfigError: If the setting is not two HH:MM times in order
+    """
+    configured = os.getenv("WORKING_HOURS", "09:00-17:00")
+    start, _, end = configured.partition("-")
+    try:
+        hours = time.fromisoformat(start.strip()), time.fromisoformat(end.strip())
+    except ValueError:
+        raise ScheduleConfigError(f"WORKING_HOURS must look like 09:00-17:00, got {configured!r}") from None
+    if hours[0] >= hours[1]:
+        raise ScheduleConfigError(f"WORKING_HOURS must end after it starts, got {configured!r}")
+    return hours
+
+
+def working_days() -> set[str]:
+    """
+    WORKING_DAYS as weekday abbreviations, e.g. "mon,tue,wed,thu,fri".
+
+    Raises:
+        ScheduleConfigError: If the setting is empty or names an unknown day
+    """
+    configured = os.getenv("WORKING_DAYS", "mon,tue,wed,thu,fri")
+    days = {day.strip().lower()[:3] for day in configured.split(",") if day.strip()}
+    unknown = sorted(days - set(WEEKDAYS))
+    if unknown or not days:
+        raise ScheduleConfigError(
+            f"WORKING_DAYS must list days such as mon,tue,wed,thu,fri, got {configured!r}"
+        )
+    return days
@@ -0,0 +1,154 @@
+"""
+Urgency - Local scoring and ranking of emails by urgency.
+
+Text features (urgent wording, deadlines, direct requests, bulk-mail
+senders) depend only on a message's content, so they are scored once,
+when the mailbox mirror stores the message. Ranking adds the features
+that change over time in one pass over all unread messages: recency,
+labels, VIP senders, how often the user writes to the sender and whether
+the user already replied in the thread. Only the top K reach the model.
+"""
+
+import heapq
+import math
+import os
+import re
+import time
+from email.utils import getaddresses, parseaddr
+
+# (pattern, weight, reason); matched against subject and snippet, with
+# matches in the subject counting in full and in the snippet at SNIPPET_WEIGHT
+TEXT_FEATURES = [
+    (re.compile(r"\b(urgent|asap|immediately|emergency|critical)\b", re.I), 3.0, "urgent"),
+    (re.compile(
+        r"\b(action (required|needed)|response (required|needed)|please (respond|reply|confirm)"
+        r"|approval (needed|required)|needs? your (approval|review|sign-?off|input)|block(er|ing))\b", re.I
+    ), 2.5, "action"),
+    (re.compile(
+        r"\b(deadline|due (today|tomorrow|by|on)|overdue|past due|expir(es|ing)|final (notice|reminder))\b", re.I
+    ), 2.0, "deadline"),
+    (re.compile(
+        r"\b(today|tonight|eod|end of (the )?day|by tomorrow|this (morning|afternoon)"
+        r"|by (mon|tues|wednes|thurs|fri)day)\b", re.I
+    ), 1.5, "time-sensitive"),
+    (re.compile(r"\b(outage|incident|security alert|breach|failed|is down)\b", re.I), 2.0, "incident"),
+    (re.compile(r"\?|\b(can|could|would) you\b", re.I), 0.5, "question"),
+]
+SNIPPET_WEIGHT = 0.6
+
+# Automated senders rarely need a reply
+BULK_SENDER = re.compile(
+    r"^(no-?reply|do-?not-?reply|notifications?|newsletters?|mailer(-daemon)?|marketing|digest|info|news)"
+    r"([+.-][^@]*)?@", re.I
+)
+BULK_WEIGHT = -3.0
+
+LABEL_WEIGHTS = {
+    "STARRED": (2.0, "starred"),
+    "IMPORTANT": (1.5, "important"),
+    "CATEGORY_PROMOTIONS": (-3.0, "promotion"),
+    "CATEGORY_SOCIAL": (-2.0, "social"),
+    "CATEGORY_FORUMS": (-1.5, "forum"),
+    "CATEGORY_UPDATES": (-1.0, "update"),
+}
+VIP_WEIGHT = 3.0
+REPLIED_WEIGHT = -2.5
+# Up to this much for senders the user writes to often (log2 of sent count)
+CORRESPONDENT_MAX = 3.0
+# Bonus for a brand-new message, halving every RECENCY_HALF_LIFE hours
+RECENCY_WEIGHT = 2.0
+RECENCY_HALF_LIFE = 24.0
+
+
+def sender_address(sender: str) -> str:
+    """Lower-case email address from a From header."""
+    return parseaddr(sender)[1].lower()
+
+
+def recipient_addresses(recipients: str) -> list[str]:
+    """Lower-case email addresses from To/Cc header values."""
+    return [address.lower() for _, address in getaddresses([recipients]) if address]
+
+
+def text_score(sender: str, subject: str, snippet: str) -> tuple[float, str]:
+    """
+    Content-only urgency score, computed once per message.
+
+    Returns:
+        (score, comma-separated reasons)
+    """
+    score = 0.0
+    reasons = []
+    for pattern, weight, reason in TEXT_FEATURES:
+        if pattern.search(subject or ""):
+            score += weight
+        elif pattern.search(snippet or ""):
+            score += weight * SNIPPET_WEIGHT
+        else:
+            continue
+        reasons.append(reason)
+    if BULK_SENDER.search(sender_address(sender)):
+        score += BULK_WEIGHT
+        reasons.append("automated")
+    return score, ",".join(reasons)
+
+
+def vip_senders() -> set[str]:
+    """VIP_SENDERS: addresses or @domains whose mail is always ranked up."""
+    return {entry.strip().lower() for entry in os.getenv("VIP_SENDERS", "").split(",") if entry.strip()}
+
+
+def rank(
+    candidates: list[dict],
+    k: int,
+    sent_counts: dict[str, int],
+    reply_times: dict[str, int],
+    now: float | None = None
+) -> list[dict]:
+    """
+    The K most urgent candidates, highest score first.
+
+    Args:
+        candidates: Emails with id, from, subject, date, snippet, labels,
+            thread_id, internal_date (ms), text_score and text_reasons
+        k: Number of emails to return
+        sent_counts: Messages the user sent per recipient address
+        reply_times: Latest time (ms) the user sent a message, per thread
+        now: Current time in epoch seconds
+
+    Returns:
+        Candidate emails with "score" and "why" (reasons) added
+    """
+    now_ms = (time.time() if now is None else now) * 1000
+    vips = vip_senders()
+    scored = []
+    for candidate in candidates:
+        score = candidate.get("text_score", 0.0)
+        reasons = [r for r in candidate.get("text_reasons", "").split(",") if r]
+
+        address = sender_address(candidate.get("from", ""))
+        if address and (address in vips or "@" + address.partition("@")[2] in vips):
+            score += VIP_WEIGHT
+            reasons.append("vip")
+        sent = sent_counts.get(address, 0)
+        if sent:
+            score += min(math.log2(1 + sent), CORRESPONDENT_MAX)
+            reasons.append("correspondent")
+        for label in candidate.get("labels", []):
+            if label in LABEL_WEIGHTS:
+                weight, reason = LABEL_WEIGHTS[label]
+                score += weight
+                reasons.append(reason)
+        if reply_times.get(candidate.get("thread_id"), 0) > candidate.get("internal_date", 0):
+            score += REPLIED_WEIGHT
+            reasons.append("replied")
+        age_hours = max(now_ms - candidate.get("internal_date", 0), 0) / 3_600_000
+        score += RECENCY_WEIGHT * 0.5 ** (age_hours / RECENCY_HALF_LIFE)
+
+        scored.append((score, candidate.get("internal_date", 0), candidate, reasons))
+
+    top = heapq.nlargest(k, scored, key=lambda entry: (entry[0], entry[1]))
+    return [
+        {**candidate, "score": round(score, 1), "why": ",".join(reasons)}
+        for score, _, candidate, reasons in top
+    ]
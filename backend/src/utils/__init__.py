@@ -1,2 +1,10 @@
 # Utils module - Helper functions
-from .auth import authenticate_google
+# authenticate_google is loaded on first use: google-auth is slow to import
+# and the server only needs it once the agent is being initialized
+
+
+def __getattr__(name):
+    if name == "authenticate_google":
+        from .auth import authenticate_google
+        return authenticate_google
+    raise AttributeError(f"module 'utils' has no attribute {name!r}")
@@ -3,7 +3,15 @@ Google OAuth Authentication Handler.
 Manages the OAuth2 flow for Gmail and Google Calendar access.
 """
 
+import asyncio
+import hashlib
+import json
 import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
 
 from google.auth.transport.requests import Request
@@ -77,10 +85,7 @@ def authenticate_google() -> Credentials | None:
         # Save the credentials for next run
         if creds:
             try:
-                # Ensure secrets directory exists
-                TOKEN_FILE.parent.mkdir(parents=True, exist_ok=True)
-                with open(TOKEN_FILE, "w") as token:
-                    token.write(creds.to_json())
+                save_token(creds)
                 print(f"[OK] Token saved to: {TOKEN_FILE}")
             except Exception as e:
                 print(f"[WARN] Could not save token: {e}")
@@ -88,6 +93,281 @@ def authenticate_google() -> Credentials | None:
     return creds
 
 
+def save_token(creds: Credentials, token_file: Path = TOKEN_FILE):
+    """
+    Write credentials to token_file atomically.
+    
+    The JSON goes to a temporary file in the same directory which then
+    replaces the token file, so a crash or a concurrent reader never sees
+    a half-written token.
+    """
+    token_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=token_file.parent, prefix=".token-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as tmp:
+            tmp.write(creds.to_json())
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, token_file)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ManagedCredentials(Credentials):
+    """
+    OAuth credentials whose refreshes go through a CredentialManager.
+    
+    google-auth refreshes expired credentials inside whichever API request
+    notices first; routing that through the manager's lock means
+    concurrent requests wait for a single refresh instead of each
+    starting one. Each thread remembers the token its last request
+    carried, so a request rejected with a stale token does not refresh
+    again after another thread already has.
+    """
+    
+    _manager: "CredentialManager | None" = None
+    _applied: threading.local | None = None
+    
+    def apply(self, headers, token=None):
+        super().apply(headers, token)
+        if self._applied is not None:
+            self._applied.token = token or self.token
+    
+    def refresh(self, request):
+        if self._manager is None:
+            super().refresh(request)
+        else:
+            # Read before waiting for the manager's lock
+            token_seen = getattr(self._applied, "token", None) or self.token
+            self._manager.refresh(request=request, inline=True, token_seen=token_seen)
+
+
+class CredentialManager:
+    """Refreshes Google credentials ahead of expiry and persists them."""
+    
+    def __init__(self, credentials: Credentials, token_file: Path = TOKEN_FILE, refresh_margin: float = 600.0):
+        """
+        Args:
+            credentials: Credentials from authenticate_google
+            token_file: Where refreshed tokens are saved
+            refresh_margin: Refresh this many seconds before the token expires
+        """
+        self.credentials = ManagedCredentials.from_authorized_user_info(
+            json.loads(credentials.to_json()), credentials.scopes
+        )
+        self.credentials._manager = self
+        self.credentials._applied = threading.local()
+        self.token_file = token_file
+        self.refresh_margin = refresh_margin
+        
+        self._lock = threading.Lock()
+        
+        self.refreshes = 0
+        self.inline_refreshes = 0
+        self.failures = 0
+        self.last_latency = None
+        self.total_latency = 0.0
+        self.last_refresh: datetime | None = None
+        self.last_error: str | None = None
+    
+    def expires_in(self) -> float | None:
+        """Seconds until the access token expires (None if unknown)."""
+        if self.credentials.expiry is None:
+            return None
+        expiry = self.credentials.expiry.replace(tzinfo=timezone.utc)
+        return (expiry - datetime.now(timezone.utc)).total_seconds()
+    
+    def needs_refresh(self) -> bool:
+        """Whether the token is invalid or within refresh_margin of expiring."""
+        if not self.credentials.valid:
+            return True
+        expires_in = self.expires_in()
+        return expires_in is not None and expires_in < self.refresh_margin
+    
+    def refresh(
+        self,
+        request=None,
+        inline: bool = False,
+        force: bool = False,
+        token_seen: str | None = None
+    ) -> bool:
+        """
+        Refresh the access token unless another caller just did.
+        
+        Args:
+            request: google-auth transport request (defaults to requests)
+            inline: The refresh was triggered by an API call that found the
+                token expired (counted separately; ideally stays at zero)
+            force: Refresh even if the token is still fresh
+            token_seen: Token the inline caller found expired or rejected
+                (defaults to the current token, read before locking)
+            
+        Returns:
+            True if a refresh was performed
+        """
+        if token_seen is None:
+            token_seen = self.credentials.token
+        trigger = "inline" if inline else "scheduled"
+        with self._lock:
+            # Inline callers (expired token or a 401) skip the refresh only
+            # if another caller replaced the token with a valid one while
+            # they waited
+            if inline:
+                if self.credentials.token != token_seen and self.credentials.valid:
+                    return False
+            elif not force and not self.needs_refresh():
+                return False
+            
+            started = time.perf_counter()
+            try:
+                Credentials.refresh(self.credentials, request or Request())
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                _record_refresh(trigger, "error", time.perf_counter() - started)
+                print(f"[ERROR] Refreshing token: {e}")
+                raise
+            
+            self.last_latency = time.perf_counter() - started
+            _record_refresh(trigger, "ok", self.last_latency)
+            self.total_latency += self.last_latency
+            self.refreshes += 1
+            if inline:
+                self.inline_refreshes += 1
+            self.last_refresh = datetime.now(timezone.utc)
+            self.last_error = None
+        
+        try:
+            save_token(self.credentials, self.token_file)
+        except Exception as e:
+            print(f"[WARN] Could not save token: {e}")
+        return True
+    
+    def seconds_until_refresh(self) -> float:
+        """How long the background loop can sleep before the next refresh."""
+        expires_in = self.expires_in()
+        if expires_in is None:
+            # No expiry known; check back periodically
+            return 3600.0
+        return max(expires_in - self.refresh_margin, 0.0)
+    
+    async def run(self):
+        """Background loop that refreshes the token before it expires."""
+        backoff = 30.0
+        while True:
+            await asyncio.sleep(min(self.seconds_until_refresh(), 3600.0))
+            try:
+                if await asyncio.to_thread(self.refresh):
+                    print(f"[OK] Token refreshed in {self.last_latency * 1000:.0f} ms")
+                backoff = 30.0
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Retry with backoff; requests still refresh inline if it expires
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 600.0)
+    
+    def stats(self) -> dict:
+        """Refresh counters and latency, for the health endpoint."""
+        expires_in = self.expires_in()
+        return {
+            "valid": self.credentials.valid,
+            "expires_in": round(expires_in) if expires_in is not None else None,
+            "refreshes": self.refreshes,
+            "inline_refreshes": self.inline_refreshes,
+            "failures": self.failures,
+            "last_latency_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            "avg_latency_ms": round(self.total_latency / self.refreshes * 1000, 1) if self.refreshes else None,
+            "last_refresh": self.last_refresh.isoformat(timespec="seconds") if self.last_refresh else None,
+            "last_error": self.last_error
+        }
+
+
+def _record_refresh(trigger: str, outcome: str, seconds: float):
+    """Export one token refresh to /metrics."""
+    # Imported here: this module also runs as a script, outside the utils package
+    from utils.metrics import TOKEN_REFRESHES, TOKEN_REFRESH_DURATION
+    TOKEN_REFRESHES.inc(trigger=trigger, outcome=outcome)
+    TOKEN_REFRESH_DURATION.observe(seconds, trigger=trigger)
+
+
+def user_file_stem(user_id: str) -> str:
+    """
+    File name stem for a user's files (token, mailbox mirror).
+    
+    A hash rather than a sanitized ID, so that distinct IDs such as
+    "alice+work@x.com" and "alice_work@x.com" never share a file.
+    """
+    return hashlib.sha256(user_id.encode("utf-8")).hexdigest()
+
+
+class TokenStore:
+    """
+    OAuth tokens of several users, one file per user.
+    
+    Used in multi-account mode; tokens are added with
+    `python utils/auth.py add-account <user_id>`.
+    """
+    
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+    
+    def path(self, user_id: str) -> Path:
+        """Token file for a user."""
+        return self.directory / f"{user_file_stem(user_id)}.json"
+    
+    def load(self, user_id: str) -> Credentials | None:
+        """A user's stored credentials, or None if they have not connected."""
+        token_file = self.path(user_id)
+        if not token_file.exists():
+            # Files were once named after the sanitized ID, which is not
+            # unique, so they cannot be adopted safely
+            legacy_file = self.directory / f"{re.sub(r'[^A-Za-z0-9@._-]', '_', user_id)}.json"
+            if legacy_file.exists():
+                print(f"[WARN] Ignoring {legacy_file.name}; re-run add-account for '{user_id}'")
+            return None
+        return Credentials.from_authorized_user_file(str(token_file), SCOPES)
+    
+    def save(self, user_id: str, creds: Credentials):
+        """Store a user's credentials."""
+        save_token(creds, self.path(user_id))
+    
+    def users(self) -> list[str]:
+        """File stems (hashed user IDs, see user_file_stem) of every stored token."""
+        if not self.directory.exists():
+            return []
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+
+def add_account(user_id: str, store: TokenStore) -> bool:
+    """
+    Run the OAuth flow for a user and save their token to the store.
+    
+    Returns:
+        True if the account was connected
+    """
+    if not CREDENTIALS_FILE.exists():
+        print(f"[ERROR] credentials.json not found at: {CREDENTIALS_FILE}")
+        return False
+    
+    print(f"[INFO] Starting OAuth flow for '{user_id}'...")
+    try:
+        flow = InstalledAppFlow.from_client_secrets_file(str(CREDENTIALS_FILE), SCOPES)
+        creds = flow.run_local_server(port=0)
+    except Exception as e:
+        print(f"[ERROR] OAuth flow failed: {e}")
+        return False
+    
+    store.save(user_id, creds)
+    print(f"[OK] Token saved to: {store.path(user_id)}")
+    return True
+
+
 def revoke_credentials():
     """
     Revoke stored credentials and delete token file.
@@ -118,6 +398,13 @@ def revoke_credentials():
 
 
 if __name__ == "__main__":
+    import sys
+    
+    if len(sys.argv) == 3 and sys.argv[1] == "add-account":
+        # Multi-account mode: connect another user's Google account
+        from config import get_data_dir
+        sys.exit(0 if add_account(sys.argv[2], TokenStore(get_data_dir() / "tokens")) else 1)
+    
     print("[INFO] Testing Google Authentication...")
     creds = authenticate_google()
     
@@ -0,0 +1,72 @@
+"""
+Concurrency Limiter - Bounded admission for expensive async work.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class QueueFullError(Exception):
+    """Raised when every slot is busy and the wait queue is full."""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a request waited too long for a free slot."""
+
+
+class ConcurrencyLimiter:
+    """
+    Allows at most `max_concurrency` tasks to run at once.
+
+    Up to `max_queue` further tasks wait (in arrival order) for a slot;
+    anything beyond that is rejected immediately with QueueFullError.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        """
+        Args:
+            max_concurrency: Tasks allowed to run at the same time
+            max_queue: Tasks allowed to wait for a slot
+            queue_timeout: Seconds a task may wait before QueueTimeoutError
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a concurrency slot for the duration of the block."""
+        if self._active + self._waiting >= self.max_concurrency + self.max_queue:
+            self._rejected += 1
+            raise QueueFullError("Too many requests in progress")
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise QueueTimeoutError("Timed out waiting for a free slot")
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """Current load, for the health endpoint."""
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "rejected": self._rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue
+        }
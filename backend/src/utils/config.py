@@ -0,0 +1,47 @@
+"""
+Runtime configuration helpers.
+Settings come from environment variables (loaded from backend/.env).
+"""
+
+import os
+from pathlib import Path
+
+# Backend directory (contains src/, secrets/, .env)
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+
+def get_data_dir() -> Path:
+    """
+    Directory for local state such as the mailbox mirror.
+
+    Defaults to backend/secrets; override with DATA_DIR.
+    """
+    data_dir = Path(os.getenv("DATA_DIR", str(PROJECT_ROOT / "secrets")))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return data_dir
+
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting, falling back to default if unset or invalid."""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        print(f"[WARN] Invalid integer for {name}, using {default}")
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """Read a float setting, falling back to default if unset or invalid."""
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        print(f"[WARN] Invalid number for {name}, using {default}")
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting ("1", "true", "yes", "on" are true)."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,280 @@
+"""
+Metrics - Latency histograms and counters in the Prometheus text format.
+
+Spans around LLM calls, tool calls and Google API requests feed the
+histograms below, which /metrics exposes. The same spans add up a
+per-request breakdown (time in LLM, tools and Google per request) that
+the server can return in a Server-Timing header.
+
+Standard library only, so it can be imported on the startup path.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; LLM calls and agent turns run far longer than API requests
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{self._label_text(key)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Observations bucketed by upper bound, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., overflow count, sum]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            counts = self._values.get(self._key(labels))
+            return int(sum(counts[:-1])) if counts else 0
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = self._label_text(key, 'le="%s"' % _number(bound))
+                    lines.append(f"{self.name}_bucket{labels} {_number(cumulative)}")
+                total = cumulative + counts[len(self.buckets)]
+                labels = self._label_text(key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {_number(total)}")
+                lines.append(f"{self.name}_sum{self._label_text(key)} {counts[-1]:.6f}")
+                lines.append(f"{self.name}_count{self._label_text(key)} {_number(total)}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+# ----------------------------------------------------------------------
+# Metrics
+# ----------------------------------------------------------------------
+
+HTTP_DURATION = Histogram(
+    "assistant_http_request_duration_seconds", "HTTP request latency.",
+    ("method", "route", "status")
+)
+TURNS = Counter(
+    "assistant_turns_total", "Chat turns by how they were answered (router, cache or agent).",
+    ("path",)
+)
+TURN_LLM_CALLS = Histogram(
+    "assistant_turn_llm_calls", "Model calls (ReAct steps) per agent turn.",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15)
+)
+TURN_TOOL_CALLS = Histogram(
+    "assistant_turn_tool_calls", "Tool calls per agent turn.",
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12)
+)
+LLM_DURATION = Histogram(
+    "assistant_llm_call_duration_seconds", "Latency of one model call.",
+    ("model", "purpose")
+)
+LLM_TOKENS = Counter(
+    "assistant_llm_tokens_total", "Model tokens, by direction (input or output).",
+    ("model", "direction")
+)
+TOOL_DURATION = Histogram(
+    "assistant_tool_duration_seconds", "Latency of one tool call.",
+    ("tool",)
+)
+TOOL_CALLS = Counter(
+    "assistant_tool_calls_total", "Tool calls by outcome (ok or error).",
+    ("tool", "status")
+)
+GOOGLE_DURATION = Histogram(
+    "assistant_google_api_duration_seconds", "Latency of one Google API request or batch.",
+    ("method",)
+)
+GOOGLE_ERRORS = Counter(
+    "assistant_google_api_errors_total", "Failed Google API requests by HTTP status.",
+    ("method", "status")
+)
+GOOGLE_RETRIES = Counter(
+    "assistant_google_api_retries_total", "Google API retries by cause (HTTP status or error type).",
+    ("method", "status")
+)
+QUOTA_WAIT = Histogram(
+    "assistant_google_quota_wait_seconds", "Time a Google API request waited for rate-limit quota.",
+    ("api",)
+)
+EMAIL_SEARCHES = Counter(
+    "assistant_email_searches_total", "Email searches by where they were answered (local or gmail).",
+    ("source",)
+)
+PUSH_NOTIFICATIONS = Counter(
+    "assistant_push_notifications_total",
+    "Gmail and Calendar change notifications by outcome (accepted, ignored, rejected, ...).",
+    ("source", "outcome")
+)
+TOKEN_REFRESHES = Counter(
+    "assistant_token_refreshes_total",
+    "Google OAuth token refreshes by trigger (scheduled or inline) and outcome (ok or error).",
+    ("trigger", "outcome")
+)
+TOKEN_REFRESH_DURATION = Histogram(
+    "assistant_token_refresh_duration_seconds", "Latency of one Google OAuth token refresh.",
+    ("trigger",)
+)
+ERRORS = Counter(
+    "assistant_errors_total", "Errors by component.",
+    ("component",)
+)
+
+
+# ----------------------------------------------------------------------
+# Per-request breakdown
+# ----------------------------------------------------------------------
+
+class RequestTimings:
+    """Time spent per category (llm, tool, google) during one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._totals: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, category: str, seconds: float):
+        with self._lock:
+            total = self._totals.setdefault(category, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value, e.g. `llm;dur=812.4;desc="2 calls"`.
+
+        Durations are summed per category, so calls that ran concurrently
+        can add up to more than the request's wall time (`total`).
+        """
+        with self._lock:
+            parts = [
+                f'{category};dur={seconds * 1000:.1f};desc="{count} calls"'
+                for category, (seconds, count) in sorted(self._totals.items())
+            ]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_request_timings: contextvars.ContextVar[RequestTimings | None] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_request_timings() -> RequestTimings:
+    """Collect a timing breakdown for the request running in this context."""
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def record_timing(category: str, seconds: float):
+    """Add to the current request's breakdown, if one is being collected."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(category, seconds)
+
+
+@contextmanager
+def google_api_span(method: str):
+    """Time a Google API request (`method` is the API method ID)."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        status = getattr(getattr(e, "resp", None), "status", None)
+        GOOGLE_ERRORS.inc(method=method, status=status or type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        GOOGLE_DURATION.observe(elapsed, method=method)
+        record_timing("google", elapsed)
+
+
+def observe_tool(tool: str, seconds: float, error: bool):
+    """Record one finished tool call."""
+    TOOL_DURATION.observe(seconds, tool=tool)
+    TOOL_CALLS.inc(tool=tool, status="error" if error else "ok")
+    record_timing("tool", seconds)
@@ -0,0 +1,124 @@
+"""
+Local Notifier - Stand-in for Google push notifications in development.
+
+Gmail and Calendar can only push to a public HTTPS endpoint. With
+PUSH_NOTIFICATIONS=true and PUSH_MODE=local the server records its
+watches in DATA_DIR/push-local.json instead of registering them, and
+this tool sends the notifications Google would send for them:
+
+    python src/utils/notifier.py gmail [--user alice] [--history-id 12345]
+    python src/utils/notifier.py calendar [--user alice] [--state exists]
+"""
+
+import argparse
+import base64
+import json
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.config import get_data_dir
+
+
+class LocalNotifier:
+    """POSTs Google-shaped change notifications to the server's webhooks."""
+
+    def __init__(self, base_url: str = "http://localhost:8000", state_file: Path | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.state_file = state_file or get_data_dir() / "push-local.json"
+
+    def _state(self) -> dict:
+        if not self.state_file.exists():
+            raise RuntimeError(f"No local watches in {self.state_file}; is the server running with PUSH_MODE=local?")
+        return json.loads(self.state_file.read_text())
+
+    def _watch(self, state: dict, source: str, user_id: str | None) -> dict:
+        for watch in state["watches"]:
+            if watch["source"] == source and watch["user_id"] == user_id:
+                return watch
+        raise RuntimeError(f"No {source} watch for {user_id or 'the default account'}")
+
+    def gmail(self, user_id: str | None = None, history_id: int | None = None) -> int:
+        """
+        Send a Pub/Sub push of a Gmail change.
+
+        Args:
+            user_id: Account (None for the default account)
+            history_id: historyId to report (default: a current timestamp,
+                newer than any real mailbox's)
+
+        Returns:
+            HTTP status of the webhook's response
+        """
+        state = self._state()
+        watch = self._watch(state, "gmail", user_id)
+        data = {"emailAddress": watch["email"], "historyId": history_id or int(time.time() * 1000)}
+        body = {
+            "message": {
+                "data": base64.b64encode(json.dumps(data).encode()).decode(),
+                "messageId": str(time.time_ns()),
+                "publishTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            },
+            "subscription": "projects/local/subscriptions/gmail-push"
+        }
+        url = f"{self.base_url}/webhooks/gmail?" + urllib.parse.urlencode({"token": state["push_token"]})
+        return self._post(url, json.dumps(body).encode(), {"Content-Type": "application/json"})
+
+    def calendar(self, user_id: str | None = None, state: str = "exists") -> int:
+        """
+        Send a Calendar channel notification.
+
+        Args:
+            user_id: Account (None for the default account)
+            state: X-Goog-Resource-State ("exists", "not_exists" or "sync")
+
+        Returns:
+            HTTP status of the webhook's response
+        """
+        watch = self._watch(self._state(), "calendar", user_id)
+        headers = {
+            "X-Goog-Channel-ID": watch["channel_id"],
+            "X-Goog-Channel-Token": watch["token"],
+            "X-Goog-Resource-ID": watch["resource_id"],
+            "X-Goog-Resource-State": state,
+            "X-Goog-Message-Number": str(time.time_ns()),
+        }
+        return self._post(f"{self.base_url}/webhooks/calendar", b"", headers)
+
+    def _post(self, url: str, body: bytes, headers: dict) -> int:
+        request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", choices=["gmail", "calendar"])
+    parser.add_argument("--user", help="Account in multi-account mode")
+    parser.add_argument("--history-id", type=int, help="historyId to report (gmail)")
+    parser.add_argument("--state", default="exists", help="Resource state to report (calendar)")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server base URL")
+    args = parser.parse_args()
+
+    notifier = LocalNotifier(args.url)
+    try:
+        if args.source == "gmail":
+            status = notifier.gmail(args.user, args.history_id)
+        else:
+            status = notifier.calendar(args.user, args.state)
+    except (RuntimeError, urllib.error.URLError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    print(f"[OK] {args.source} notification sent ({status})" if status < 300 else f"[WARN] Server answered {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+Test setup - import the server modules and the benchmark fakes.
+"""
+
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+for path in (BACKEND_DIR / "src", BACKEND_DIR / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,141 @@
+"""
+Tests for Gmail query translation and the mirror-backed email search.
+"""
+
+import functools
+from datetime import datetime
+
+import pytest
+
+from fakes import FakeGmail
+from tools.gmail import _batch_get_messages
+from tools.gmail_query import DAY_MS, translate
+from tools.mailbox import MailboxMirror
+
+NOW = 1_800_000_000.0
+NOW_MS = int(NOW * 1000)
+
+
+def test_header_label_and_state_operators():
+    query = translate('from:boss@company.com subject:"q3 report" to:me is:unread is:starred in:inbox category:social')
+    assert query.match == [
+        'sender : "boss@company.com"',
+        'subject : "q3 report"',
+        'recipients : "me"',
+    ]
+    assert query.unread is True
+    assert query.labels == ["STARRED", "INBOX", "CATEGORY_SOCIAL"]
+    assert translate("is:read").unread is False
+
+
+def test_user_labels_use_query_names():
+    assert translate("label:Projects/Launch").user_labels == ["projects-launch"]
+    assert translate('label:"Client Work"').user_labels == ["client-work"]
+
+
+def test_explicit_and_is_ignored():
+    assert translate("from:alice AND is:unread").match == ['sender : "alice"']
+
+
+@pytest.mark.parametrize("query", [
+    "-from:alice",
+    "from:alice -is:unread",
+    "from:alice OR from:bob",
+    "from:alice | from:bob",
+    "(from:alice is:unread)",
+    "{from:alice from:bob}",
+])
+def test_negation_or_and_grouping_go_to_gmail(query):
+    assert translate(query) is None
+
+
+@pytest.mark.parametrize("query", [
+    "has:attachment",
+    "in:anywhere from:alice",
+    "in:trash",
+    "label:spam",
+    "is:muted",
+    "category:reservations",
+    "after:yesterday",
+    "after:2026/13/01",
+    "newer_than:2w",
+])
+def test_unsupported_operators_go_to_gmail(query):
+    assert translate(query) is None
+
+
+@pytest.mark.parametrize("query", ["invoice", '"quarterly planning"', "from:alice invoice"])
+def test_free_text_goes_to_gmail(query):
+    # Gmail also matches the message body, which the mirror does not store
+    assert translate(query) is None
+
+
+def test_newer_than_and_older_than_bounds():
+    query = translate("newer_than:2d older_than:1m", now=NOW)
+    assert query.after == NOW_MS - 2 * DAY_MS
+    assert query.before == NOW_MS - 30 * DAY_MS
+
+    assert translate("newer_than:1y", now=NOW).after == NOW_MS - 365 * DAY_MS
+    assert translate("older_than:3d", now=NOW).before == NOW_MS - 3 * DAY_MS
+
+
+def test_repeated_bounds_keep_the_narrowest():
+    query = translate("newer_than:5d newer_than:2d older_than:1d older_than:3d", now=NOW)
+    assert query.after == NOW_MS - 2 * DAY_MS
+    assert query.before == NOW_MS - 3 * DAY_MS
+
+
+def test_after_and_before_dates():
+    query = translate("after:2026/10/01 before:2026-10-15")
+    assert query.after == int(datetime(2026, 10, 1).timestamp() * 1000)
+    assert query.before == int(datetime(2026, 10, 15).timestamp() * 1000)
+    # Epoch seconds are accepted too
+    assert translate("after:1790000000").after == 1_790_000_000_000
+
+
+# ----------------------------------------------------------------------
+# Mirror-backed search
+# ----------------------------------------------------------------------
+
+def make_mirror(tmp_path, messages: int, seed_limit: int) -> tuple[FakeGmail, MailboxMirror]:
+    gmail = FakeGmail(messages=messages, latency=0)
+    mirror = MailboxMirror(
+        tmp_path / "mailbox.db",
+        gmail,
+        functools.partial(_batch_get_messages, service=gmail),
+        seed_limit=seed_limit
+    )
+    mirror.sync()
+    return gmail, mirror
+
+
+@pytest.mark.parametrize("query", [
+    "is:unread",
+    "from:alice@example.com",
+    "from:billing@example.com is:unread",
+])
+def test_search_matches_gmail(tmp_path, query):
+    gmail, mirror = make_mirror(tmp_path, messages=300, seed_limit=500)
+
+    results = mirror.search(translate(query), 20)
+
+    assert [email["id"] for email in results] == [m["id"] for m in gmail._matching(query)[:20]]
+
+
+def test_search_falls_back_beyond_the_mirrored_range(tmp_path):
+    gmail, mirror = make_mirror(tmp_path, messages=600, seed_limit=100)
+
+    # A full page within the seeded messages is complete...
+    results = mirror.search(translate("from:alice@example.com"), 3)
+    assert [email["id"] for email in results] == [m["id"] for m in gmail._matching("from:alice@example.com")[:3]]
+    # ...but more hits than the seed holds may be missing older messages
+    assert mirror.search(translate("from:alice@example.com"), 200) is None
+
+
+def test_search_unread_is_complete_beyond_the_seed(tmp_path):
+    # About 120 unread messages: all seeded, though most are older than the 200 newest
+    gmail, mirror = make_mirror(tmp_path, messages=600, seed_limit=200)
+
+    results = mirror.search(translate("is:unread"), 500)
+
+    assert [email["id"] for email in results] == [m["id"] for m in gmail._matching("is:unread")]
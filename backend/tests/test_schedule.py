@@ -0,0 +1,153 @@
+"""
+Tests for schedule analysis against brute-force oracles on random schedules.
+"""
+
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from tools.schedule import (
+    Busy, ScheduleConfigError, busy_intervals, find_conflicts, free_slots, working_days, working_hours,
+    working_windows
+)
+
+BASE = datetime(2026, 10, 19, tzinfo=timezone.utc)
+
+
+def at(minute: int) -> datetime:
+    return BASE + timedelta(minutes=minute)
+
+
+def random_schedule(rng: random.Random, count: int, horizon: int) -> list[Busy]:
+    intervals = []
+    for index in range(count):
+        start = rng.randrange(horizon)
+        end = start + rng.choice([5, 15, 30, 45, 60, 90, 240])
+        intervals.append(Busy(at(start), at(end), f"event {index}"))
+    intervals.sort(key=lambda busy: (busy.start, busy.end))
+    return intervals
+
+
+def brute_force_conflicts(intervals: list[Busy]) -> set:
+    """Every overlapping pair, checked pair by pair."""
+    conflicts = set()
+    for i, first in enumerate(intervals):
+        for second in intervals[i + 1:]:
+            start, end = max(first.start, second.start), min(first.end, second.end)
+            if start < end:
+                conflicts.add((frozenset((first.summary, second.summary)), start, end))
+    return conflicts
+
+
+def brute_force_free(intervals: list[Busy], windows: list[tuple[int, int]], min_minutes: int) -> list:
+    """Maximal runs of unbooked minutes inside each window."""
+    busy = set()
+    for interval in intervals:
+        start = int((interval.start - BASE).total_seconds() // 60)
+        end = int((interval.end - BASE).total_seconds() // 60)
+        busy.update(range(start, end))
+    slots = []
+    for window_start, window_end in windows:
+        run_start = None
+        for minute in range(window_start, window_end + 1):
+            free = minute < window_end and minute not in busy
+            if free and run_start is None:
+                run_start = minute
+            elif not free and run_start is not None:
+                if minute - run_start >= min_minutes:
+                    slots.append((at(run_start), at(minute)))
+                run_start = None
+    return slots
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_find_conflicts_matches_brute_force(seed):
+    rng = random.Random(seed)
+    intervals = random_schedule(rng, rng.randrange(0, 25), horizon=600)
+
+    conflicts = find_conflicts(intervals)
+
+    found = {(frozenset((a.summary, b.summary)), start, end) for a, b, start, end in conflicts}
+    assert found == brute_force_conflicts(intervals)
+    assert len(conflicts) == len(found)
+    # Earlier interval first, in order of overlap start
+    assert all(a.start <= b.start for a, b, _, _ in conflicts)
+    assert [c[2] for c in conflicts] == sorted(c[2] for c in conflicts)
+
+
+def test_back_to_back_meetings_do_not_conflict():
+    intervals = [Busy(at(0), at(30), "a"), Busy(at(30), at(60), "b")]
+    assert find_conflicts(intervals) == []
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_free_slots_match_brute_force(seed):
+    rng = random.Random(seed)
+    intervals = random_schedule(rng, rng.randrange(0, 20), horizon=3 * 1440)
+    # Working hours on three consecutive days
+    windows = [(day * 1440 + 540, day * 1440 + 1020) for day in range(3)]
+    min_minutes = rng.choice([1, 15, 30, 60])
+
+    slots = free_slots(intervals, [(at(s), at(e)) for s, e in windows], timedelta(minutes=min_minutes))
+
+    assert slots == brute_force_free(intervals, windows, min_minutes)
+
+
+def test_busy_intervals_skip_events_that_do_not_block_time():
+    def event(summary, **fields):
+        return {
+            "summary": summary,
+            "start": {"dateTime": "2026-10-19T10:00:00Z"},
+            "end": {"dateTime": "2026-10-19T11:00:00Z"},
+            **fields
+        }
+
+    events = [
+        event("meeting"),
+        event("all day", start={"date": "2026-10-19"}, end={"date": "2026-10-20"}),
+        event("free", transparency="transparent"),
+        event("office", eventType="workingLocation"),
+        event("declined", attendees=[{"self": True, "responseStatus": "declined"}]),
+        event("zero length", end={"dateTime": "2026-10-19T10:00:00Z"}),
+    ]
+
+    assert [busy.summary for busy in busy_intervals(events)] == ["meeting"]
+
+
+def test_working_windows_follow_hours_days_and_now(monkeypatch):
+    monkeypatch.setenv("WORKING_HOURS", "09:00-17:00")
+    monkeypatch.setenv("WORKING_DAYS", "mon,tue,wed,thu,fri")
+    zone = timezone(timedelta(hours=2))
+    now = datetime(2026, 10, 19, 12, 0, tzinfo=zone)
+
+    # Monday Oct 19 to Monday Oct 26: the weekend has no windows
+    windows = working_windows(date(2026, 10, 19), date(2026, 10, 26), zone, not_before=now)
+
+    assert [start.date() for start, _ in windows] == [
+        date(2026, 10, day) for day in (19, 20, 21, 22, 23, 26)
+    ]
+    assert windows[0] == (now, datetime(2026, 10, 19, 17, 0, tzinfo=zone))
+    assert windows[1] == (datetime(2026, 10, 20, 9, 0, tzinfo=zone), datetime(2026, 10, 20, 17, 0, tzinfo=zone))
+
+
+@pytest.mark.parametrize("hours", ["9-5", "09:00", "17:00-09:00", "25:00-26:00"])
+def test_malformed_working_hours_are_a_config_error(monkeypatch, hours):
+    monkeypatch.setenv("WORKING_HOURS", hours)
+
+    with pytest.raises(ScheduleConfigError, match="WORKING_HOURS"):
+        working_hours()
+
+
+@pytest.mark.parametrize("days", ["", "mon,funday", " , "])
+def test_malformed_working_days_are_a_config_error(monkeypatch, days):
+    monkeypatch.setenv("WORKING_DAYS", days)
+
+    with pytest.raises(ScheduleConfigError, match="WORKING_DAYS"):
+        working_days()
+
+
+def test_working_days_accept_full_names(monkeypatch):
+    monkeypatch.setenv("WORKING_DAYS", "Monday, Tuesday,sat")
+
+    assert working_days() == {"mon", "tue", "sat"}
@@ -4,7 +4,7 @@ const BACKEND_URL = process.env.BACKEND_URL || "http://localhost:8000";
 
 export async function POST(request: NextRequest) {
     try {
-        const { message } = await request.json();
+        const { message, session_id } = await request.json();
 
         if (!message) {
             return NextResponse.json(
@@ -17,7 +17,7 @@ export async function POST(request: NextRequest) {
         const response = await fetch(`${BACKEND_URL}/chat`, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ message }),
+            body: JSON.stringify({ message, session_id }),
         });
 
         if (!response.ok) {
@@ -35,3 +35,22 @@ export async function POST(request: NextRequest) {
         );
     }
 }
+
+export async function DELETE(request: NextRequest) {
+    try {
+        const { session_id } = await request.json().catch(() => ({}));
+
+        // Forward reset to Python backend
+        const response = await fetch(`${BACKEND_URL}/reset`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ session_id }),
+        });
+
+        return NextResponse.json(await response.json(), { status: response.status });
+
+    } catch (error) {
+        console.error("[API] Reset error:", error);
+        return NextResponse.json({ error: "Failed to reset conversation" }, { status: 502 });
+    }
+}
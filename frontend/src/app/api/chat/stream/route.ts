@@ -0,0 +1,42 @@
+import { NextRequest, NextResponse } from "next/server";
+
+const BACKEND_URL = process.env.BACKEND_URL || "http://localhost:8000";
+
+export async function POST(request: NextRequest) {
+    try {
+        const { message, session_id } = await request.json();
+
+        if (!message) {
+            return NextResponse.json(
+                { error: "Message is required" },
+                { status: 400 }
+            );
+        }
+
+        // Forward request to Python backend and pass the SSE stream through
+        const response = await fetch(`${BACKEND_URL}/chat/stream`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ message, session_id }),
+        });
+
+        if (!response.ok || !response.body) {
+            throw new Error(`Backend returned ${response.status}`);
+        }
+
+        return new Response(response.body, {
+            headers: {
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+            },
+        });
+
+    } catch (error) {
+        console.error("[API] Chat stream error:", error);
+        return NextResponse.json(
+            { error: "Failed to process request", response: "Backend unavailable. Ensure the Python server is running." },
+            { status: 502 }
+        );
+    }
+}
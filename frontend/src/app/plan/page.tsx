@@ -13,12 +13,14 @@ interface Message {
     role: "user" | "assistant";
     content: string;
     timestamp: Date;
+    status?: string;
 }
 
 export default function PlanPage() {
     const router = useRouter();
     const [messages, setMessages] = useState<Message[]>([]);
     const [isLoading, setIsLoading] = useState(false);
+    const [sessionId, setSessionId] = useState(() => crypto.randomUUID());
 
     const handleSendMessage = async (content: string) => {
         const userMessage: Message = {
@@ -31,23 +33,54 @@ export default function PlanPage() {
         setMessages((prev) => [...prev, userMessage]);
         setIsLoading(true);
 
+        const assistantId = crypto.randomUUID();
+        const updateAssistant = (update: (msg: Message) => Message) =>
+            setMessages((prev) => prev.map((msg) => (msg.id === assistantId ? update(msg) : msg)));
+
         try {
-            const response = await fetch("/api/chat", {
+            const response = await fetch("/api/chat/stream", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ message: content }),
+                body: JSON.stringify({ message: content, session_id: sessionId }),
             });
 
-            const data = await response.json();
+            if (!response.ok || !response.body) {
+                throw new Error(`Stream returned ${response.status}`);
+            }
 
-            const assistantMessage: Message = {
-                id: crypto.randomUUID(),
-                role: "assistant",
-                content: data.response || "No response received.",
-                timestamp: new Date(),
-            };
+            setMessages((prev) => [
+                ...prev,
+                { id: assistantId, role: "assistant", content: "", timestamp: new Date() },
+            ]);
+
+            // Parse Server-Sent Events: "data: {...}" lines separated by blank lines
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
 
-            setMessages((prev) => [...prev, assistantMessage]);
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                const events = buffer.split("\n\n");
+                buffer = events.pop() ?? "";
+
+                for (const raw of events) {
+                    if (!raw.startsWith("data: ")) continue;
+                    const event = JSON.parse(raw.slice(6));
+
+                    if (event.type === "token") {
+                        updateAssistant((msg) => ({ ...msg, content: msg.content + event.content, status: undefined }));
+                    } else if (event.type === "tool_start") {
+                        updateAssistant((msg) => ({ ...msg, status: event.label }));
+                    } else if (event.type === "done") {
+                        updateAssistant((msg) => ({ ...msg, content: event.response || "No response received.", status: undefined }));
+                    } else if (event.type === "error") {
+                        updateAssistant((msg) => ({ ...msg, content: event.message, status: undefined }));
+                    }
+                }
+            }
         } catch {
             const errorMessage: Message = {
                 id: crypto.randomUUID(),
@@ -55,7 +88,7 @@ export default function PlanPage() {
                 content: "Failed to connect to the assistant. Is the backend running?",
                 timestamp: new Date(),
             };
-            setMessages((prev) => [...prev, errorMessage]);
+            setMessages((prev) => [...prev.filter((msg) => msg.id !== assistantId), errorMessage]);
         } finally {
             setIsLoading(false);
         }
@@ -63,8 +96,13 @@ export default function PlanPage() {
 
     const handleReset = async () => {
         try {
-            await fetch("/api/chat", { method: "DELETE" });
+            await fetch("/api/chat", {
+                method: "DELETE",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ session_id: sessionId }),
+            });
         } catch { /* ignore */ }
+        setSessionId(crypto.randomUUID());
         setMessages([]);
     };
 
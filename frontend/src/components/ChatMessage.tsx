@@ -3,6 +3,7 @@ interface Message {
     role: "user" | "assistant";
     content: string;
     timestamp: Date;
+    status?: string;
 }
 
 interface ChatMessageProps {
@@ -24,6 +25,11 @@ export default function ChatMessage({ message }: ChatMessageProps) {
                     }`}
             >
                 {message.content}
+                {message.status && (
+                    <div className="text-xs text-muted-foreground italic mt-1">
+                        {message.status}
+                    </div>
+                )}
             </div>
         </div>
     );